@@ -22,11 +22,17 @@ import sys
 import warnings
 import numpy as np
 import logging
-from itertools import groupby, product
+from itertools import chain, groupby, islice
 from scipy.special import erfcinv
 from scipy.spatial import cKDTree
-from .seeds import SeedIndex, SeedIndexMultiple
-from .kmers import as_kmer_seq
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from .seeds import SeedIndex, SeedIndexMultiple, SeedHitLists, RectangleCounter
+from .seeds import seed_volume, split_seed_runs, run_seed_counts
+from .seeds import sort_diagonal_coordinates
+from .seeds import BYTES_PER_SEED
+from .kmers import as_kmer_seq, as_kmer_arrays, CompressedPostings
+from .fmindex import FMIndex
 from .util import Logger
 
 
@@ -34,6 +40,21 @@ from .util import Logger
 warnings.filterwarnings('error')
 
 
+# number of segments whose seeds are counted at once by similar_segments();
+# segments are yielded once their batch is counted.
+SEGMENT_BATCH = 64
+
+
+def _batches(items, size):
+    # consecutive lists of up to size items of an iterable, consumed lazily
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
 # A band (i-r, i+r) is considered of interest if xs[i] >threshold. This
 # function returns a maximal (disjoint) set of bands of interest (i.e if two
 # bands overlap they are reported as one bigger band).
@@ -111,6 +132,25 @@ def expected_overlap_len(len0, len1, diag, gap_prob):
     return int(np.ceil(expected_len))
 
 
+def expected_overlap_lens(len0, len1, diags, gap_prob):
+    """Same as :func:`expected_overlap_len` but for bulk calculations (e.g.
+    scoring all diagonals at once).
+
+    Args:
+        len0 (int): As in :func:`expected_overlap_len`.
+        len1 (int): As in :func:`expected_overlap_len`.
+        diags (list): Starting diagonals of alignments to consider.
+        gap_prob (float): As in :func:`expected_overlap_len`.
+    Returns:
+        numpy.ndarray: Expected length of overlap alignments, one per diagonal.
+    """
+    diags = np.asarray(diags, dtype=np.int64)
+    L = np.minimum(len0 - diags, len1) + np.minimum(diags, 0)
+    expected_lens = (2. / (2 - gap_prob)) * L
+    assert np.all(expected_lens >= 0)
+    return np.ceil(expected_lens).astype(np.int64)
+
+
 # band radius for edit path of length K
 def band_radius(expected_len, gap_prob, sensitivity):
     """Calculates the smallest band radius in the dynamic programming table
@@ -156,8 +196,8 @@ def band_radii(expected_lens, gap_prob, sensitivity):
     assert 0 < gap_prob < 1 and 0 < sensitivity < 1
     epsilon = 1. - sensitivity
     C = erfcinv(epsilon) * np.sqrt(2 * gap_prob)
-    return np.array([max(1, int(np.ceil(C * np.sqrt(K))))
-                     for K in expected_lens])
+    radii = np.ceil(C * np.sqrt(np.asarray(expected_lens, dtype=float)))
+    return np.maximum(1, radii).astype(np.int64)
 
 
 def H0_moments(alphabet_len, wordlen, area):
@@ -218,11 +258,244 @@ def H1_moments(alphabet_len, wordlen, area, seglen, p_match):
     return mu_H1, sd_H1
 
 
+def _detectable(alphabet_len, wordlen, K_min, p_min, g_max, sensitivity,
+                min_z, power):
+    # whether a similarity of length K_min and match probability p_min is
+    # detectable with the given word length, cf. plan_wordlen().
+    seg_area = 2 * band_radius(K_min, g_max, sensitivity) * K_min
+    mu_H0, sd_H0 = H0_moments(alphabet_len, wordlen, seg_area)
+    mu_H1, sd_H1 = H1_moments(alphabet_len, wordlen, seg_area, K_min, p_min)
+    z_power = -np.sqrt(2) * erfcinv(2 * power)  # standard normal quantile
+    return mu_H1 - mu_H0 >= mu_H0 and \
+        mu_H1 - z_power * sd_H1 >= mu_H0 + min_z * sd_H0
+
+
+def plan_wordlen(len0, len1, alphabet_len, K_min, p_min, g_max, sensitivity,
+                 max_seeds=10 ** 7, min_z=3., power=.9):
+    """Chooses the smallest word length for which the expected number of
+    seeds between two unrelated sequences stays within budget while a
+    similarity of interest remains detectable. The latter is decided by the
+    limiting normal distributions of the number of seeds in the segment of a
+    similarity of length :math:`K` and match probability :math:`p` (cf.
+    :func:`H0_moments` and :func:`H1_moments`): the segment must have a
+    z-score of at least :math:`z` with respect to :math:`H_0` with
+    probability :math:`\\beta` (the power), i.e:
+
+    .. math::
+        \\mu_1 + \\Phi^{-1}(1 - \\beta)\\sigma_1 \\ge \\mu_0 + z\\sigma_0
+
+    and the similarity must be expected to contribute at least as many seeds
+    to its segment as are expected by chance (:math:`\\mu_1 - \\mu_0 \\ge
+    \\mu_0`) such that its match probability can be reliably estimated (cf.
+    :func:`WordBlot.estimate_match_probability`) and seeds have few spurious
+    neighbors. This fails for small word lengths where the :math:`H_0` noise
+    drowns the signal, and for large word lengths where the similarity has
+    too few seeds.
+
+    Args:
+        len0 (int): Length of the 1st sequence.
+        len1 (int): Length of the 2nd sequence.
+        alphabet_len (int): Size of the alphabet.
+        K_min (int): Minimum length of similarities of interest.
+        p_min (float): Minimum match probability of similarities of
+            interest.
+        g_max (float): Upper bound for indel probabilities.
+        sensitivity (float): Desired sensitivity of bands, cf.
+            :func:`band_radius`.
+
+    Keyword Args:
+        max_seeds (int): Maximum expected number of seeds between unrelated
+            sequences of the given lengths; default is :math:`10^7`.
+        min_z (float): Required z-score of similarities with respect to
+            :math:`H_0`; default is 3.
+        power (float): Required probability of a similarity reaching
+            :attr:`min_z`; default is 0.9.
+
+    Returns:
+        int: the chosen word length.
+
+    Raises:
+        MemoryError: If no word length satisfies both requirements.
+    """
+    assert 0 < p_min <= 1 and K_min > 0
+    wordlen = 1
+    while alphabet_len ** wordlen <= 2 ** 63:
+        num_seeds = 1. * len0 * len1 / alphabet_len ** wordlen
+        if num_seeds <= max_seeds and _detectable(
+                alphabet_len, wordlen, K_min, p_min, g_max, sensitivity,
+                min_z, power):
+            return wordlen
+        wordlen += 1
+    msg = 'no word length gives at most %d seeds ' % max_seeds
+    msg += 'for sequences of length %d and %d ' % (len0, len1)
+    msg += 'while detecting similarities of length %d ' % K_min
+    msg += 'and match probability %.2f' % p_min
+    raise MemoryError(msg)
+
+
+def plan_word_blot(S, T, K_min, p_min, allowed_memory=1, max_seeds=None,
+                   min_z=3., power=.9, **kw):
+    """Builds a :class:`WordBlot` whose word length and seed storage are
+    chosen automatically for the given sequences, similarities of interest,
+    and memory budget:
+
+    * The word length is chosen by :func:`plan_wordlen` and then increased,
+      as long as similarities remain detectable, until the exact number of
+      seeds (cf. :func:`biseqt.seeds.seed_volume`) is within budget; this
+      accommodates repetitive sequences.
+    * Seeds are kept in memory if they fit in half the memory budget along
+      with their :class:`biseqt.seeds.RectangleCounter`. Otherwise they are
+      stored in SQLite which is memory-mapped (cf. ``mmap_size`` of
+      :class:`biseqt.kmers.KmerDBWrapper`) if the seeds table fits in the
+      memory budget.
+
+    Args:
+        S (sequence.Sequence): The 1st sequence.
+        T (sequence.Sequence): The 2nd sequence.
+        K_min (int): Minimum length of similarities of interest.
+        p_min (float): Minimum match probability of similarities of
+            interest.
+
+    Keyword Args:
+        allowed_memory (int|float): allocatable memory in GB; default is 1.
+        max_seeds (int|None): Maximum number of seeds; default is as many as
+            can be found within the memory budget.
+        min_z (float): cf. :func:`plan_wordlen`.
+        power (float): cf. :func:`plan_wordlen`.
+        alphabet (sequence.Alphabet): The alphabet of sequences.
+        g_max (float): Upper bound for indel probabilities.
+        sensitivity (float): Desired sensitivity of bands.
+        mask (list): kmers to mask, cf. :func:`biseqt.kmers.as_kmer_seq`.
+
+        Any other keyword arguments are passed on to :class:`WordBlot`.
+
+    Returns:
+        WordBlot: configured for the given comparison.
+
+    Raises:
+        MemoryError: If no word length keeps the number of seeds within
+            budget while similarities remain detectable.
+    """
+    assert allowed_memory > 0, 'allowed memory must be positive'
+    budget = allowed_memory * 2 ** 30
+    if max_seeds is None:
+        max_seeds = int(budget / BYTES_PER_SEED['indexing'])
+    alphabet_len = len(kw['alphabet'])
+    model = {'g_max': kw['g_max'], 'sensitivity': kw['sensitivity']}
+    wordlen = plan_wordlen(len(S), len(T), alphabet_len, K_min, p_min,
+                           max_seeds=max_seeds, min_z=min_z, power=power,
+                           **model)
+    self_comp = S == T
+    while True:
+        kmers = [as_kmer_arrays(seq, [wordlen], mask=kw.get('mask', []))
+                 [wordlen] for seq in [S, T]]
+        volume = seed_volume(kmers[0], None if self_comp else kmers[1],
+                             rtree=kw.get('rtree', False))
+        if volume['seeds'] <= max_seeds:
+            break
+        wordlen += 1
+        if not _detectable(alphabet_len, wordlen, K_min, p_min,
+                           min_z=min_z, power=power, **model):
+            msg = 'too many seeds (max = %d) ' % max_seeds
+            msg += 'for %s and %s ' % (S.content_id[:8], T.content_id[:8])
+            msg += 'with any word length detecting similarities of length '
+            msg += '%d and match probability %.2f' % (K_min, p_min)
+            raise MemoryError(msg)
+
+    if volume['memory_bytes'] <= budget / 2:
+        kw['backend'] = 'memory'
+    else:
+        kw['backend'] = 'sqlite'
+        if volume['sqlite_bytes'] <= budget:
+            kw['mmap_size'] = volume['sqlite_bytes']
+    kw['wordlen'] = wordlen
+    return WordBlot(S, T, max_seeds=max_seeds, **kw)
+
+
 # FIXME the fact that we have organized our data as self.S and self.T is the
 # main blocker for merging pairwise and multiple sequence implementations.
 # Also involved: SeedIndexMultiple
+def _neighbor_lists(num, idx, other):
+    # neighbors of num points from all (idx, other) pairs of neighbors in
+    # compressed sparse row form, cf. WordBlot.find_all_neighbors().
+    order = np.argsort(idx, kind='mergesort')
+    indptr = np.append(0, np.cumsum(np.bincount(idx, minlength=num)))
+    return indptr.astype(np.int64), other[order]
+
+
+class ScoredSeeds(object):
+    """Seeds, or runs of seeds, scored by :func:`WordBlot.score_seeds` and
+    kept in NumPy arrays. Indexing gives the record of a seed as a
+    dictionary, built upon access, with keys: ``seed`` (diagonal coordinates
+    of the seed or the center of the run), ``neighs`` (list of indices of
+    its neighbors), ``mirror_neighs`` (list of indices of seeds whose mirror
+    images are its neighbors), ``p`` (estimated match probability of a
+    segment centered at it) and, for runs, ``run`` (antidiagonal coordinates
+    of the first and last seeds) and ``n`` (number of seeds in the run).
+
+    Attributes:
+        d (numpy.ndarray): diagonal coordinates of seeds.
+        a (numpy.ndarray): antidiagonal coordinates of seeds, or of the
+            centers of runs.
+        n (numpy.ndarray|None): number of seeds in each run, None for seeds.
+        p (numpy.ndarray): estimated match probabilities.
+        neighbors (tuple): ``(indptr, indices)`` arrays as in
+            :func:`WordBlot.find_all_neighbors`; indices beyond the number of
+            seeds refer to mirror images of seeds.
+        sources (numpy.ndarray): the index of the seed of each mirror image,
+            cf. :func:`WordBlot.mirror_images`.
+    """
+    def __init__(self, d, a, p, neighbors, sources, n=None):
+        self.d, self.a, self.p, self.n = d, a, p, n
+        self.neighbors, self.sources = neighbors, sources
+
+    def __len__(self):
+        return len(self.d)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def neighbor_pairs(self):
+        """Returns all pairs of seeds that are neighbors, including pairs of
+        seeds whose mirror images are neighbors.
+
+        Returns:
+            tuple: ``(idx, other, mirror)`` arrays, the last indicating
+            whether the mirror image of ``other`` is the neighbor of ``idx``.
+        """
+        indptr, indices = self.neighbors
+        num = len(self)
+        idx = np.repeat(np.arange(num, dtype=np.int64),
+                        np.diff(indptr[:num + 1]))
+        other = indices[:len(idx)]
+        mirror = other >= num
+        other = other.copy()
+        other[mirror] = self.sources[other[mirror] - num]
+        return idx, other, mirror
+
+    def __getitem__(self, idx):
+        indptr, indices = self.neighbors
+        neighs = indices[indptr[idx]:indptr[idx + 1]]
+        num = len(self)
+        rec = {
+            'seed': (int(self.d[idx]), int(self.a[idx])),
+            'neighs': neighs[neighs < num].tolist(),
+            'mirror_neighs':
+                self.sources[neighs[neighs >= num] - num].tolist(),
+            'p': float(self.p[idx]),
+        }
+        if self.n is not None:
+            n, a = int(self.n[idx]), int(self.a[idx])
+            rec.update({'n': n, 'run': (a - n + 1, a + n - 1)})
+        return rec
+
+
 class WordBlot(SeedIndex):
-    """A similarity finder based on m-dependent CLT statistics.
+    """A similarity finder based on m-dependent CLT statistics. Seeds are
+    stored as in :class:`biseqt.seeds.SeedIndex`; pass ``backend='auto'`` (or
+    use :func:`plan_word_blot`) to keep them in memory if there are not too
+    many of them.
 
     Attributes:
         g_max (float):
@@ -347,29 +620,158 @@ class WordBlot(SeedIndex):
             U_{(d, a)} = \\{(d', a'): |d - d'| < r_d,  |a - a'| < r_a \\}
 
         This is done using a Quad-Tree in :math:`O(m lg m)` time where m is the
-        number of seeds.
+        number of seeds. Seeds and their neighbors are kept in NumPy arrays
+        throughout.
+
+        Args:
+            seeds (tuple): ``(d, a)`` arrays of diagonal coordinates of seeds,
+                cf. :func:`biseqt.seeds.SeedIndex.seed_arrays`.
+            d_radius (int): the diagonal radius of neighborhoods.
+            a_radius (int): the antidiagonal radius of neighborhoods.
 
         Returns:
-            list: tuples ``((d, a), neighs)`` where ``neighs`` is a list of
-                  neighbor indices.
+            tuple: ``(indptr, indices)`` arrays such that the neighbors of the
+            k-th seed, excluding itself, are ``indices[indptr[k]:indptr[k +
+            1]]``.
         """
         # normalize the two diameters so we can use a standard L∞ neighborhood.
         # typically a_diam is larger, so scale up d values proportionally
         d_coeff = 1. * a_radius / d_radius
         radius = a_radius
 
-        all_seeds = list(cls.to_diagonal_coordinates(i, j) for i, j in seeds)
-        if not all_seeds:
-            return []
-        all_seeds_scaled = np.array([(d * d_coeff, a) for d, a in all_seeds])
-        quad_tree = cKDTree(all_seeds_scaled)
-        all_neighs = quad_tree.query_ball_tree(quad_tree, radius,
-                                               p=float('inf'))
-        # all_neighs[i] is the indices of the neighbors of all_seeds[i]; this
-        # always contains the seed itself (i.e always: i in neighs[i])
-        for idx, _ in enumerate(all_neighs):
-            all_neighs[idx].remove(idx)
-        return zip(all_seeds, all_neighs)
+        ds, as_ = seeds
+        if not len(ds):
+            return _neighbor_lists(0, np.zeros(0, dtype=np.int64),
+                                   np.zeros(0, dtype=np.int64))
+        quad_tree = cKDTree(np.column_stack([ds * d_coeff, as_]))
+        # each pair of distinct neighbors is reported once
+        pairs = quad_tree.query_pairs(radius, p=float('inf'),
+                                      output_type='ndarray')
+        pairs = pairs.astype(np.int64).reshape(-1, 2)
+        return _neighbor_lists(len(ds), pairs.ravel(), pairs[:, ::-1].ravel())
+
+    @classmethod
+    def find_all_run_neighbors(cls, runs, d_radius, a_radius):
+        """Generalizes :func:`find_all_neighbors` to runs of seeds (cf.
+        :func:`biseqt.seeds.seed_runs`): two runs are neighbors if any of
+        their seeds are. Each run is represented by its center
+        :math:`(d, a + n - 1)` and its antidiagonal extent such that the
+        number of points in the Quad-Tree is the number of runs. Additionally,
+        the number of seeds in the neighborhood of the center of each run is
+        counted analytically from the neighboring runs.
+
+        Args:
+            runs (tuple): ``(d, a, n)`` arrays of runs of seeds; for
+                efficiency runs should not be longer than neighborhoods, cf.
+                :func:`biseqt.seeds.split_seed_runs`.
+            d_radius (int): the diagonal radius of neighborhoods.
+            a_radius (int): the antidiagonal radius of neighborhoods.
+
+        Returns:
+            tuple: ``(indptr, indices, counts)`` where ``indptr`` and
+            ``indices`` hold the neighbors of runs as in
+            :func:`find_all_neighbors` and ``counts`` is an array holding the
+            number of seeds, including those of the run itself, in the
+            neighborhood of the center of each run.
+        """
+        d_coeff = 1. * a_radius / d_radius
+        radius = a_radius
+
+        ds, as_, ns = runs
+        if not len(ds):
+            empty = np.zeros(0, dtype=np.int64)
+            return np.zeros(1, dtype=np.int64), empty, empty
+        extents = ns - 1  # half of the antidiagonal length of runs
+        centers = as_ + extents
+        quad_tree = cKDTree(np.column_stack([ds * d_coeff, centers]))
+        # candidates are all runs whose extents may be within radius,
+        # including each run itself
+        pairs = quad_tree.query_pairs(radius + 2 * extents.max(),
+                                      p=float('inf'), output_type='ndarray')
+        pairs = pairs.astype(np.int64).reshape(-1, 2)
+        itself = np.arange(len(ds), dtype=np.int64)
+        idx = np.concatenate([pairs[:, 0], pairs[:, 1], itself])
+        other = np.concatenate([pairs[:, 1], pairs[:, 0], itself])
+        order = np.argsort(idx, kind='mergesort')
+        idx, other = idx[order], other[order]
+        keep = np.abs(ds[idx] - ds[other]) * d_coeff <= radius
+        idx, other = idx[keep], other[keep]
+
+        counts = run_seed_counts(as_[other], ns[other],
+                                 centers[idx] - a_radius,
+                                 centers[idx] + a_radius)
+        counts = np.bincount(idx, weights=counts, minlength=len(ds))
+
+        gaps = np.abs(centers[idx] - centers[other]) - extents[idx] - \
+            extents[other]
+        keep = (gaps <= radius) & (idx != other)
+        idx, other = idx[keep], other[keep]
+        indptr, indices = _neighbor_lists(len(ds), idx, other)
+        return indptr, indices, counts.astype(np.int64)
+
+    def _reverse_strand_index(self, T, **kw):
+        # the reverse strand of the same type and parameters, cf.
+        # SeedIndex.reverse
+        return type(self)(self.S, T, g_max=self.g_max,
+                          sensitivity=self.sensitivity, **kw)
+
+    def diagonal_seeds(self, expand_runs=True, mirror=True):
+        """Collects all non-trivial seeds (cf. :func:`SeedIndex.seeds`) in
+        diagonal coordinates from the blocks of :func:`seed_arrays`.
+
+        Keyword Args:
+            expand_runs (bool): Whether runs of seeds are expanded, cf.
+                :func:`SeedIndex.seed_arrays`; default is True.
+            mirror (bool): Whether mirror images of seeds of self comparisons
+                are included, cf. :func:`SeedIndex.seed_arrays`; default is
+                True.
+
+        Returns:
+            tuple: ``(d, a)`` arrays (or ``(d, a, n)`` arrays of runs) of
+            type ``int64``.
+        """
+        kw = {}
+        if self.backend == 'memory':
+            # the store is read as a single block, no concatenation needed
+            kw['chunk_size'] = max(len(self._d), 1)
+        chunks = list(self.seed_arrays(exclude_trivial=True,
+                                       expand_runs=expand_runs,
+                                       mirror=mirror, **kw))
+        if len(chunks) == 1:
+            return chunks[0]
+        if not chunks:
+            num_cols = 3 if self.runs and not expand_runs else 2
+            return tuple(np.zeros(0, dtype=np.int64) for _ in range(num_cols))
+        return tuple(np.concatenate(coords) for coords in zip(*chunks))
+
+    def mirror_images(self, seeds, d_radius):
+        """For self comparisons, appends to the given stored seeds (or runs of
+        seeds) the mirror images :math:`(-d, a)` of those that are close
+        enough to the main diagonal, i.e :math:`-d \\le r_d`, to be neighbors
+        of stored seeds (cf. :func:`find_all_neighbors`). Other mirror images
+        are never neighbors of stored seeds and, since neighborhoods are
+        symmetric, the neighbors of mirror images are mirror images of the
+        neighbors of stored seeds. Hence it suffices to process the stored
+        half of seeds and reflect results.
+
+        Args:
+            seeds (tuple): ``(d, a)`` (or ``(d, a, n)``) arrays of stored
+                seeds (or runs), cf. :func:`diagonal_seeds`.
+            d_radius (int): the diagonal radius of neighborhoods.
+
+        Returns:
+            tuple: ``(seeds, sources)`` where ``seeds`` are the given arrays
+            with mirror images appended and ``sources`` is an array holding,
+            for each appended mirror image, the index of its seed. For non
+            self comparisons the given seeds are returned as is.
+        """
+        if not self.self_comp:
+            return seeds, np.zeros(0, dtype=np.int64)
+        sources = np.flatnonzero(seeds[0] >= -d_radius)
+        mirrors = [-seeds[0][sources]] + [col[sources] for col in seeds[1:]]
+        seeds = tuple(np.concatenate([col, mirror])
+                      for col, mirror in zip(seeds, mirrors))
+        return seeds, sources
 
     def score_seeds(self, K):
         """Find the neighbors of each seed in the sense of
@@ -380,29 +782,67 @@ class WordBlot(SeedIndex):
             K (int): the similarity legnth of interest that dictates
                 neighborhood shapes and estimated match probabilities.
 
+        If seeds are stored as runs (cf. :attr:`runs`), runs split into
+        pieces no longer than neighborhoods are scored instead of seeds (cf.
+        :func:`find_all_run_neighbors`), each at its center as if it were a
+        seed.
+
+        For self comparisons only stored seeds (i.e :math:`d < 0`) are scored
+        and mirror images of seeds are only considered, as neighbors, close
+        to the main diagonal (cf. :func:`mirror_images`); scores of mirror
+        images of seeds are the same as those of seeds.
+
         Returns:
-            list(dict): List of dictionaries with keys: ``seed`` (coordinates
-            of exactly matching kmer in diagonal coordinates), ``neighs`` (list
-            of indices of neighbors of this seed in the appropriate diagonal
-            strip), ``p`` the estimated match probability
-            of a segment centered at the seed.
+            ScoredSeeds: the scored seeds (or runs of seeds), indexing which
+            gives dictionaries with keys: ``seed`` (coordinates of exactly
+            matching kmer in diagonal coordinates), ``neighs`` (list of
+            indices of neighbors of this seed in the appropriate diagonal
+            strip), ``p`` the estimated match probability of a segment
+            centered at the seed, and ``mirror_neighs`` (list of indices of
+            seeds whose mirror images are neighbors of this seed; only
+            nonempty for self comparisons). For runs of seeds, ``seed`` is
+            the center of the run and additional keys ``run`` (the
+            antidiagonal coordinates of the first and last seeds) and ``n``
+            (number of seeds in the run) are present.
         """
         d_radius = int(np.ceil(self.band_radius(K)))
         a_radius = K
 
-        seeds_with_neighs = self.find_all_neighbors(
-            self.seeds(exclude_trivial=True), d_radius, a_radius
-        )
-
-        # n is the number of seeds in neighborhood excluding the center seed,
-        def _p(d, a, n):
-            d_band = (d - d_radius, d + d_radius)
-            a_band = (a - a_radius, a + a_radius)
-            return self.estimate_match_probability(n + 1, d_band=d_band,
-                                                   a_band=a_band)
-
-        return [{'seed': (d, a), 'neighs': neighs, 'p': _p(d, a, len(neighs))}
-                for (d, a), neighs in seeds_with_neighs]
+        # counts are the number of seeds in neighborhoods including the
+        # center seed, cf. estimate_match_probability()
+        def _p(counts):
+            K_, area = self.segment_dims(d_band=(-d_radius, d_radius),
+                                         a_band=(-a_radius, a_radius))
+            word_p_null = (1./len(self.alphabet)) ** self.wordlen
+            word_p = (counts - area * word_p_null) / K_
+            match_p = np.zeros(len(word_p))
+            # too small word_p is a match probability of zero
+            pos = word_p > 0
+            match_p[pos] = np.exp(np.log(word_p[pos]) / self.wordlen)
+            return np.minimum(match_p, 1)
+
+        mirror = not self.self_comp
+        if self.runs:
+            runs = split_seed_runs(
+                *self.diagonal_seeds(expand_runs=False, mirror=mirror),
+                max_len=a_radius // 2 + 1
+            )
+            num = len(runs[0])
+            runs, sources = self.mirror_images(runs, d_radius)
+            ds, as_, ns = runs
+            indptr, indices, counts = self.find_all_run_neighbors(
+                runs, d_radius, a_radius)
+            return ScoredSeeds(ds[:num], as_[:num] + ns[:num] - 1,
+                               _p(counts[:num]), (indptr, indices), sources,
+                               n=ns[:num])
+
+        seeds = self.diagonal_seeds(mirror=mirror)
+        num = len(seeds[0])
+        seeds, sources = self.mirror_images(seeds, d_radius)
+        indptr, indices = self.find_all_neighbors(seeds, d_radius, a_radius)
+        return ScoredSeeds(seeds[0][:num], seeds[1][:num],
+                           _p(np.diff(indptr[:num + 1]) + 1),
+                           (indptr, indices), sources)
 
     def similar_segments(self, K_min, p_min, at_least_one=False):
         """Find all maximal local similarities of given minium length and match
@@ -418,82 +858,203 @@ class WordBlot(SeedIndex):
                 Whether to score the segment against H1 by counting seeds
                 inside.
 
+        For self comparisons, segments are found among stored seeds (cf.
+        :func:`score_seeds`) and each is followed by its mirror image, unless
+        it contains seeds whose mirror images are its neighbors, in which case
+        it is a single segment symmetric around the main diagonal.
+
+        If seeds of both strands are indexed (cf.
+        :attr:`biseqt.seeds.SeedIndex.both_strands`), segments of the forward
+        strand are followed by those of the reverse strand, the latter in
+        diagonal coordinates of S and the reverse complement of T.
+
+        Segments are yielded as they are found, in batches of
+        :data:`SEGMENT_BATCH` whose seeds are counted at once (cf.
+        :func:`biseqt.seeds.SeedIndex.seed_count_many`). Seeds of each
+        strand are scored (cf. :func:`score_seeds`) before any of its
+        segments is found, and with ``at_least_one`` those of all strands
+        are.
+
         Yields:
             dict: dictionary with keys: ``segment`` (coordinates of similar
             region in diagonal coordinates ``((d_min, d_max), (a_min,
-            a_max))``)), ``p`` the estimated match probability, and ``score``
-            the H1 z-score if keyword argument ``score`` is true.
+            a_max))``)), ``p`` the estimated match probability, ``score``
+            the H1 z-score if keyword argument ``score`` is true, and
+            ``strand`` (1 for the forward and -1 for the reverse strand).
         """
+        strands = [(1, self)]
+        if self.reverse is not None:
+            strands.append((-1, self.reverse))
+        # seeds of a strand are only scored once it is reached, unless
+        # obliged to return something in which case only the strand with
+        # the highest probability seed is.
+        scored = ((strand, index, index.score_seeds(K_min))
+                  for strand, index in strands)
+        forced = None
+        if at_least_one:
+            scored = list(scored)
+            best_ps = [scored_seeds.p.max() if len(scored_seeds) else -1
+                       for _, _, scored_seeds in scored]
+            if max(best_ps) < p_min:
+                forced = strands[int(np.argmax(best_ps))][0]
+        for strand, index, scored_seeds in scored:
+            for res in index._similar_segments(
+                    scored_seeds, K_min, p_min,
+                    at_least_one=strand == forced):
+                res['strand'] = strand
+                yield res
+
+    def _similar_segments(self, scored_seeds, K_min, p_min,
+                          at_least_one=False):
+        # segments of one strand from the given output of score_seeds()
         self.log('finding local similarities between %s and %s' %
                  (self.S.content_id[:8], self.T.content_id[:8]))
         d_radius = int(np.ceil(self.band_radius(K_min)))
         a_radius = K_min
-        scored_seeds = self.score_seeds(K_min)
-
-        def _update_seg(seg, seed):
-            d, a = seed
-            if seg is None:
-                d_min, d_max = d - d_radius, d + d_radius
-                a_min, a_max = a - a_radius, a + a_radius
-            else:
-                (d_min, d_max), (a_min, a_max) = seg
-                d_min = min(d - d_radius, d_min)
-                d_max = max(d + d_radius, d_max)
-                a_min = min(a - a_radius, a_min)
-                a_max = max(a + a_radius, a_max)
-            return (d_min, d_max), (a_min, a_max)
 
-        avail = [rec['p'] >= p_min for rec in scored_seeds]
-        if not any(avail) and at_least_one:
+        avail = scored_seeds.p >= p_min
+        if not avail.any() and at_least_one:
             # we're obliged to return something, let the highest probability
             # seed go through.
             assert len(scored_seeds), 'no seeds found while at_least_one=True'
-            avail[np.argmax([rec['p'] for rec in scored_seeds])] = True
-        while True:
-            try:
-                seed_idx = avail.index(True)
-            except ValueError:
-                break
-            stack = [seed_idx]
-            avail[seed_idx] = False
-            ps_in_seg = [scored_seeds[seed_idx]['p']]
-            seg = None
-            while stack:
-                idx = stack.pop()
-                ps_in_seg.append(scored_seeds[idx]['p'])
-                seg = _update_seg(seg, scored_seeds[idx]['seed'])
-                for neigh in scored_seeds[idx]['neighs']:
-                    if avail[neigh]:
-                        stack.append(neigh)
-                        avail[neigh] = False
-            if seg is None:
-                break
-            else:
-                (d_min, d_max), (a_min, a_max) = seg
-                d_min = min(len(self.S), max(d_min, -len(self.T)))
-                d_max = min(len(self.S), max(d_max, -len(self.T)))
-                a_min = max(a_min, 0)
-                a_max = min(a_max, len(self.S) + len(self.T))
-                seg = (d_min, d_max), (a_min, a_max)
-            # NOTE the following is more justifiable but it matches the
-            # average. TODO turn this in into an experiment to justify
-            # p_hat = self.estimate_match_probability(
-            #   n, d_band=seg[0], a_band=seg[1])
-            p_hat = sum(ps_in_seg) / len(ps_in_seg)
-            res = {'segment': seg, 'p': p_hat}
-            n = self.seed_count(d_band=seg[0], a_band=seg[1])
-            K_hat, area_hat = self.segment_dims(d_band=seg[0],
-                                                a_band=seg[1])
-            scores = self.score_num_seeds(num_seeds=n, area=area_hat,
-                                          seglen=K_hat, p_match=p_hat)
-            res['scores'] = scores
-            yield res
+            avail[np.argmax(scored_seeds.p)] = True
+        if not avail.any():
+            return
+
+        # segments are connected components of available seeds, where seeds
+        # whose mirror images are neighbors are connected too
+        num = len(scored_seeds)
+        idx, other, mirror = scored_seeds.neighbor_pairs()
+        keep = avail[idx] & avail[other]
+        idx, other, mirror = idx[keep], other[keep], mirror[keep]
+        graph = csr_matrix((np.ones(len(idx), dtype=bool), (idx, other)),
+                           shape=(num, num))
+        num_comps, labels = connected_components(graph, directed=False)
+
+        # segments in order of their first available seed
+        members = np.flatnonzero(avail)
+        uniq, firsts = np.unique(labels[members], return_index=True)
+        ranks = np.zeros(num_comps, dtype=np.int64)
+        ranks[uniq[np.argsort(firsts)]] = np.arange(len(uniq))
+        comps = ranks[labels[members]]
+        order = np.argsort(comps, kind='mergesort')
+        members, comps = members[order], comps[order]
+        starts = np.flatnonzero(np.concatenate([[1], np.diff(comps)]))
+
+        ds, as_ = scored_seeds.d[members], scored_seeds.a[members]
+        # runs of seeds extend the segment by their neighborhoods and weigh
+        # as much as the seeds they contain
+        ns = np.ones(len(members), dtype=np.int64) \
+            if scored_seeds.n is None else scored_seeds.n[members]
+        ps = scored_seeds.p[members]
+        d_mins = np.minimum.reduceat(ds - d_radius, starts)
+        d_maxs = np.maximum.reduceat(ds + d_radius, starts)
+        a_mins = np.minimum.reduceat(as_ - (ns - 1) - a_radius, starts)
+        a_maxs = np.maximum.reduceat(as_ + (ns - 1) + a_radius, starts)
+        p_sums = np.add.reduceat(ps * ns, starts)
+        n_sums = np.add.reduceat(ns, starts)
+        # a segment containing mirror images of its own seeds straddles the
+        # main diagonal
+        symmetric = np.zeros(len(starts), dtype=bool)
+        symmetric[ranks[labels[idx[mirror]]]] = True
+        # mirror images of seeds weigh as much as seeds and the first seed of
+        # each segment weighs twice.
+        # NOTE the following is more justifiable but it matches the
+        # average. TODO turn this in into an experiment to justify
+        # p_hat = self.estimate_match_probability(
+        #   n, d_band=seg[0], a_band=seg[1])
+        weights = np.where(symmetric, 2, 1)
+        p_hats = (ps[starts] * ns[starts] + weights * p_sums) / \
+            (ns[starts] + weights * n_sums)
+        d_mins, d_maxs = (
+            np.where(symmetric, np.minimum(d_mins, -d_maxs), d_mins),
+            np.where(symmetric, np.maximum(d_maxs, -d_mins), d_maxs))
+        d_mins = np.clip(d_mins, -len(self.T), len(self.S))
+        d_maxs = np.clip(d_maxs, -len(self.T), len(self.S))
+        a_mins = np.maximum(a_mins, 0)
+        a_maxs = np.minimum(a_maxs, len(self.S) + len(self.T))
+
+        def _segments():
+            for d_min, d_max, a_min, a_max, p_hat, sym in zip(
+                    d_mins.tolist(), d_maxs.tolist(), a_mins.tolist(),
+                    a_maxs.tolist(), p_hats.tolist(), symmetric.tolist()):
+                yield {'segment': ((d_min, d_max), (a_min, a_max)),
+                       'p': p_hat, 'mirror': self.self_comp and not sym}
+
+        for batch in _batches(_segments(), SEGMENT_BATCH):
+            # count seeds in all segments of a batch at once
+            counts = self.seed_count_many(
+                d_bands=[res['segment'][0] for res in batch],
+                a_bands=[res['segment'][1] for res in batch])
+            for res, n in zip(batch, counts.tolist()):
+                seg, p_hat = res['segment'], res['p']
+                K_hat, area_hat = self.segment_dims(d_band=seg[0],
+                                                    a_band=seg[1])
+                scores = self.score_num_seeds(num_seeds=n, area=area_hat,
+                                              seglen=K_hat, p_match=p_hat)
+                mirror = res.pop('mirror')
+                res['scores'] = scores
+                yield res
+                if mirror:
+                    (d_min, d_max), a_band = seg
+                    yield {'segment': ((-d_max, -d_min), a_band),
+                           'p': p_hat, 'scores': scores}
 
 
 class WordBlotOverlap(WordBlot):
     """A specialized version of WordBlot for detecting overlap
     (suffix-prefix) similarities between sequences (e.g. in a sequencing
     context)."""
+    def score_diagonals(self):
+        """Estimates, for each diagonal containing a seed, the match
+        probability of an overlap alignment in the diagonal band around it
+        (cf. :func:`score_seeds`). Since the neighborhood of a seed is the
+        entire diagonal band containing it, scores only depend on the number
+        of seeds on each diagonal (cf. :func:`SeedIndex.diagonal_counts`) and
+        the number of neighbors of all diagonals are found from prefix sums
+        in :math:`O(|S|+|T|)` time regardless of the number of seeds.
+
+        Returns:
+            tuple: ``(d, r, L, p)`` arrays with one entry per diagonal
+            containing at least one seed in increasing order of diagonals:
+            the diagonal, band radius, length of an alignment through the
+            band according to sequence lengths, and the estimated match
+            probability.
+        """
+        counts = self.diagonal_counts(exclude_trivial=True)
+        ds_all = np.arange(-len(self.T), len(self.S) + 1)
+        lens = expected_overlap_lens(len(self.S), len(self.T), ds_all,
+                                     self.g_max)
+        radii = band_radii(lens, self.g_max, self.sensitivity)
+
+        # two diagonals are neighbors if their scaled diagonals are no more
+        # than 1 apart; the number of seeds on neighbors of each diagonal
+        # (including itself) is a difference of prefix sums of diagonal
+        # counts in order of scaled diagonals. Distinct scaled diagonals
+        # differ by at least 1 / r^2, a tolerance makes the (frequent) exact
+        # distances of 1 robust to rounding.
+        scaled = 1. * ds_all / radii
+        order = np.argsort(scaled, kind='mergesort')
+        scaled_sorted = scaled[order]
+        cum_counts = np.append(0, np.cumsum(counts[order]))
+        has_seeds = np.flatnonzero(counts)
+        reach = 1 + 1e-9
+        start = np.searchsorted(scaled_sorted, scaled[has_seeds] - reach,
+                                side='left')
+        end = np.searchsorted(scaled_sorted, scaled[has_seeds] + reach,
+                              side='right')
+        num_seeds = cum_counts[end] - cum_counts[start]
+
+        ds, lens, radii = ds_all[has_seeds], lens[has_seeds], radii[has_seeds]
+        area = 2 * radii * lens
+        word_p_null = (1./len(self.alphabet)) ** self.wordlen
+        word_p = (num_seeds - area * word_p_null) / lens
+        # word_p may be too small for log
+        match_p = np.zeros(len(ds))
+        positive = word_p > 0
+        match_p[positive] = np.exp(np.log(word_p[positive]) / self.wordlen)
+        return ds, radii, lens, np.minimum(match_p, 1)
+
     def score_seeds(self):
         """For each seed finds all seeds in its neighborhood defined by:
 
@@ -503,72 +1064,60 @@ class WordBlotOverlap(WordBlot):
 
         in such a way that each seed's neighborhood is the entire diagonal band
         containing it. Each seed recieves an estimated match probability for a
-        similarity on its diagonal band and a z-score with respect to the H1
-        model.
+        similarity on its diagonal band, cf. :func:`score_diagonals`.
 
         Returns:
             list: dicts with keys ``seed`` (diagonal coordinates of seed),
                   ``p`` (estimated match probability of overlap alignment),
                   ``L`` (the length of an alignment through the seed's band
-                  according to sequence lengths), ``score`` (the z-score with
-                  respect to H1), and ``r`` (band radius at the seed's
-                  coordinates).
+                  according to sequence lengths), and ``r`` (band radius at
+                  the seed's coordinates).
         """
-        def _len(d):
-            return expected_overlap_len(
-                len(self.S), len(self.T), d, self.g_max
-            )
-
-        def _rad(d):
-            return np.ceil(self.band_radius(_len(d)))
-
-        all_seeds = list(self.to_diagonal_coordinates(i, j)
-                         for i, j in self.seeds(exclude_trivial=True))
-        if not all_seeds:
+        ds, as_ = self.diagonal_seeds()
+        if not len(ds):
             return []
-        all_seeds_scaled = np.array([(d / _rad(d), ) for d, a in all_seeds])
-        quad_tree = cKDTree(all_seeds_scaled)
-        all_neighs = quad_tree.query_ball_tree(quad_tree, 1, p=float('inf'))
-        # all_neighs[i] is the indices of the neighbors of all_seeds[i]; this
-        # always contains the seed itself (i.e always: i in neighs[i])
-        for idx, _ in enumerate(all_neighs):
-            all_neighs[idx].remove(idx)
-        seeds_with_neighs = zip(all_seeds, all_neighs)
-
-        # n excludes the center seed itself
-        def _p(d, n):
-            L = _len(d)
-            d_radius = int(np.ceil(self.band_radius(L)))
-            area = 2 * d_radius * L
-            word_p_null = (1./len(self.alphabet)) ** self.wordlen
-            word_p = (n + 1 - area * word_p_null) / L
-            try:
-                match_p = np.exp(np.log(word_p) / self.wordlen)
-            except Warning:
-                # presumably this happened because word_p was too small for log
-                match_p = 0
-            return min(match_p, 1)
-
-        return [{'seed': (d, a), 'r': _rad(d), 'L': _len(d),
-                 'p': _p(d, len(neighs))}
-                for (d, a), neighs in seeds_with_neighs]
+        diags, radii, lens, ps = self.score_diagonals()
+        idx = np.searchsorted(diags, ds)
+        return [{'seed': (d, a), 'r': float(r), 'L': L, 'p': p}
+                for d, a, r, L, p in zip(ds.tolist(), as_.tolist(),
+                                         radii[idx].tolist(),
+                                         lens[idx].tolist(),
+                                         ps[idx].tolist())]
 
     def highest_scoring_overlap_band(self):
         """Finds the highest scoring diagonal band according to probabiliy
-        estimations of :func:`score_seeds`.
+        estimations of :func:`score_diagonals`. If seeds of both strands are
+        indexed (cf. :attr:`biseqt.seeds.SeedIndex.both_strands`) the band
+        with the highest estimated match probability among both strands is
+        reported, for the reverse strand in diagonal coordinates of S and the
+        reverse complement of T.
 
         Returns:
-            dict: with same keys ``p, score, d_band`` consistent with the
-                  output of :func:`score_seeds` for the highest scoring
-                  diagonal band.
+            dict: with keys ``p, len, score, d_band`` for the estimated match
+                  probability, alignment length, z-score with respect to H1,
+                  and diagonal band of the highest scoring diagonal band, and
+                  ``strand`` (1 for the forward and -1 for the reverse
+                  strand).
         """
-        scored_seeds = self.score_seeds()
-        if not scored_seeds:
+        strands = [(1, self)]
+        if self.reverse is not None:
+            strands.append((-1, self.reverse))
+        best = None
+        for strand, index in strands:
+            res = index._highest_scoring_overlap_band()
+            if res is not None and (best is None or res['p'] > best['p']):
+                res['strand'] = strand
+                best = res
+        return best
+
+    def _highest_scoring_overlap_band(self):
+        # the highest scoring diagonal band of one strand
+        ds, radii, lens, ps = self.score_diagonals()
+        if not len(ds):
             return None
-        idx = max(range(len(scored_seeds)), key=lambda i: scored_seeds[i]['p'])
-        seed, rad = scored_seeds[idx]['seed'], scored_seeds[idx]['r']
-        p_hat, overlap_len = scored_seeds[idx]['p'], scored_seeds[idx]['L']
-        d_band = seed[0] - rad, seed[0] + rad
+        idx = np.argmax(ps)
+        rad, p_hat, overlap_len = float(radii[idx]), ps[idx], int(lens[idx])
+        d_band = ds[idx] - rad, ds[idx] + rad
         res = {'d_band': d_band, 'p': p_hat, 'len': overlap_len}
         area = 2 * rad * overlap_len
         mu_H1, sd_H1 = H1_moments(len(self.alphabet), self.wordlen, area,
@@ -579,139 +1128,217 @@ class WordBlotOverlap(WordBlot):
         return res
 
 
-class WordBlotOverlapRef(WordBlotOverlap):
-    """An in-memory, SQL-free version of :class:`WordBlotOverlap` for faster
-    comparisons.  Due to implementation details the word length is constrained
-    above by the available memory.
+def ref_kmer_hits(ref, wordlen, alphabet, allowed_memory, compressed=False,
+                  fm_index=False):
+    """Builds an in-memory index of the positions of kmers in a reference
+    sequence. By default this is a list of lists of positions indexed by all
+    possible kmers and hence its size grows exponentially with the word
+    length. Compressed postings, instead, use a few bytes per kmer occurrence
+    (cf. :class:`biseqt.kmers.CompressedPostings`) which allows for much
+    larger references and word lengths. Alternatively, an FM-index of the
+    reference (cf. :class:`biseqt.fmindex.FMIndex`) uses less than 2 bytes
+    per base regardless of word length and finds the kmer hits of all
+    positions of a query at once. In all cases the size of the index is
+    estimated, and checked against the allowed memory, before it is built.
 
-    Attributes:
-        allowed_memory (int|float): allocatable memory in GB for kmers index.
+    Args:
+        ref (biseqt.sequence.Sequence): The reference sequence.
+        wordlen (int): Word length.
+        alphabet (biseqt.sequence.Alphabet): Alphabet of the reference.
+        allowed_memory (int|float): allocatable memory in GB.
+
+    Keyword Args:
+        compressed (bool): Whether to use compressed postings; default is
+            False.
+        fm_index (bool): Whether to use an FM-index; default is False.
+
+    Returns:
+        list|biseqt.kmers.CompressedPostings|biseqt.fmindex.FMIndex:
+        Positions of each kmer, subscriptable by kmers in integer
+        representation, or the FM-index of the reference.
+
+    Raises:
+        MemoryError: If the index would need more than the allowed memory.
     """
-    def __init__(self, ref, allowed_memory=1, **kw):
-        self.wordlen = kw['wordlen']
-        self.alphabet = kw['alphabet']
-        self.g_max = kw['g_max']
-        self.sensitivity = kw['sensitivity']
-        self.log_level = kw.get('log_level', logging.INFO)
-        self.S = ref
-        num_kmers = len(self.alphabet) ** self.wordlen
-        mem_needed = sys.getsizeof(num_kmers) * num_kmers
-        mem_needed_gb = np.power(2, np.log2(mem_needed) - 30)
-        assert allowed_memory > 0, 'allowed memory must be positive'
-        self.allowed_memory = allowed_memory
-        if mem_needed_gb > self.allowed_memory:
+    def _check(mem_needed):
+        mem_needed_gb = np.power(2, np.log2(max(mem_needed, 1)) - 30)
+        if mem_needed_gb > allowed_memory:
             msg = 'not enough memory (max = %.2f GB) ' % allowed_memory
-            msg += 'to store %d-mers ' % self.wordlen
+            msg += 'to store %d-mers ' % wordlen
             msg += '(%.2f GB needed)' % mem_needed_gb
             raise MemoryError(msg)
-        self.kmer_hits = [[] for _ in range(num_kmers)]
-        for pos, kmer in enumerate(as_kmer_seq(ref, self.wordlen)):
-            self.kmer_hits[kmer].append(pos)
-        self.T = None
-        relpath = 'python-object'
-        log_header = '%d-mer cache (%s)' % (self.wordlen, relpath)
-        self._logger = Logger(log_level=self.log_level, header=log_header)
-        self._seeds = {}
 
-    def seeds(self, exclude_trivial=True):
-        assert self.T is not None
-        if self.T.content_id not in self._seeds:
-            self._seeds = {self.T.content_id: []}
-            for pos, kmer in enumerate(as_kmer_seq(self.T, self.wordlen)):
-                for pos_ref in self.kmer_hits[kmer]:
-                    if self.S == self.T and exclude_trivial and pos == pos_ref:
-                        continue
-                    self._seeds[self.T.content_id].append((pos_ref, pos))
-        return self._seeds[self.T.content_id]
+    if fm_index:
+        _check(FMIndex.estimate_nbytes(len(ref), len(alphabet)))
+        return FMIndex(ref)
 
-    def seed_count(self, d_band=None, a_band=None):
-        assert self.T is not None
-        seeds = self.seeds()
-        cnt = 0
-        if d_band:
-            d_min, d_max = d_band
-        if a_band:
-            a_min, a_max = a_band
-        for i, j in seeds:
-            d, a = self.to_diagonal_coordinates(i, j)
-            if d_band and not d_min <= d <= d_max:
-                continue
-            if a_band and not a_min <= a <= a_max:
-                continue
-            cnt += 1
-        return cnt
+    if compressed:
+        kmer_seq = as_kmer_seq(ref, wordlen)
+        _check(CompressedPostings.estimate_nbytes(
+            len(kmer_seq), len(np.unique(kmer_seq)), len(ref),
+            len(alphabet) ** wordlen - 1))
+        return CompressedPostings(kmer_seq)
 
-    def score_seeds_(self, seq):
-        self.T = seq
-        return super(WordBlotOverlapRef, self).score_seeds()
+    num_kmers = len(alphabet) ** wordlen
+    _check(sys.getsizeof(num_kmers) * num_kmers)
+    kmer_hits = [[] for _ in range(num_kmers)]
+    for pos, kmer in enumerate(as_kmer_seq(ref, wordlen)):
+        kmer_hits[kmer].append(pos)
+    return kmer_hits
 
-    def highest_scoring_overlap_band(self, seq):
-        self.T = seq
-        return super(WordBlotOverlapRef, self).highest_scoring_overlap_band()
 
+def ref_seed_positions(kmer_hits, ref, seq, wordlen, exclude_trivial=True):
+    """Finds the seeds of a sequence against an index of a reference built by
+    :func:`ref_kmer_hits`, without creating any per-seed Python objects.
 
-class WordBlotLocalRef(WordBlot):
-    """An in-memory, SQL-free version of :class:`WordBlot` for faster
-    comparisons. Due to implementation details the word length is constrained
-    above by the available memory.
+    Args:
+        kmer_hits (list|biseqt.kmers.CompressedPostings|
+            biseqt.fmindex.FMIndex): The index of the reference.
+        ref (biseqt.sequence.Sequence): The reference sequence.
+        seq (biseqt.sequence.Sequence): The query sequence.
+        wordlen (int): Word length.
+
+    Keyword Args:
+        exclude_trivial (bool): Whether seeds at equal positions are excluded
+            if the query is the reference; default is True.
+
+    Returns:
+        tuple: ``(pos_ref, pos)`` arrays of type ``int64`` holding the
+        positions of seeds in the reference and the query.
+    """
+    if isinstance(kmer_hits, FMIndex):
+        pos_ref, pos = kmer_hits.matches(seq, wordlen)
+    else:
+        lookup = kmer_hits.hits if isinstance(kmer_hits, CompressedPostings) \
+            else kmer_hits.__getitem__
+        hits = [lookup(kmer) for kmer in as_kmer_seq(seq, wordlen)]
+        counts = np.array([len(pos_hits) for pos_hits in hits],
+                          dtype=np.int64)
+        pos_ref = np.fromiter(chain.from_iterable(hits), dtype=np.int64,
+                              count=int(counts.sum()))
+        pos = np.repeat(np.arange(len(hits), dtype=np.int64), counts)
+    if ref == seq and exclude_trivial:
+        keep = pos_ref != pos
+        pos_ref, pos = pos_ref[keep], pos[keep]
+    return pos_ref, pos
+
+
+class WordBlotRef(object):
+    """Seeds of query sequences against an in-memory, SQL-free index of a
+    reference, shared by :class:`WordBlotOverlapRef` and
+    :class:`WordBlotLocalRef` which mix it in before their respective
+    :class:`WordBlot` base. The query is set as :attr:`T` by each
+    comparison; seeds against it are found as position arrays (cf.
+    :func:`ref_seed_positions`) and kept, along with their
+    :class:`biseqt.seeds.RectangleCounter` and diagonal prefix sums, until
+    the query changes. Due to implementation details the word length is
+    constrained above by the available memory.
 
     Attributes:
         allowed_memory (int|float): allocatable memory in GB for kmers index.
+        compressed (bool): whether kmer hits of the reference are kept in
+            :class:`biseqt.kmers.CompressedPostings`, cf.
+            :func:`ref_kmer_hits`; default is False.
+        fm_index (bool): whether seeds are found using an FM-index of the
+            reference (cf. :class:`biseqt.fmindex.FMIndex`) instead of a kmer
+            index; default is False.
     """
-    def __init__(self, ref, allowed_memory=1, **kw):
+    def __init__(self, ref, allowed_memory=1, compressed=False,
+                 fm_index=False, **kw):
         self.wordlen = kw['wordlen']
         self.alphabet = kw['alphabet']
         self.g_max = kw['g_max']
         self.sensitivity = kw['sensitivity']
         self.log_level = kw.get('log_level', logging.INFO)
         self.S = ref
-        num_kmers = len(self.alphabet) ** self.wordlen
-        mem_needed = sys.getsizeof(num_kmers) * num_kmers
-        mem_needed_gb = np.power(2, np.log2(mem_needed) - 30)
         assert allowed_memory > 0, 'allowed memory must be positive'
         self.allowed_memory = allowed_memory
-        if mem_needed_gb > self.allowed_memory:
-            msg = 'not enough memory (max = %.2f GB) ' % allowed_memory
-            msg += 'to store %d-mers ' % self.wordlen
-            msg += '(%.2f GB needed)' % mem_needed_gb
-            raise MemoryError(msg)
-        self.kmer_hits = [[] for _ in range(num_kmers)]
-        for pos, kmer in enumerate(as_kmer_seq(ref, self.wordlen)):
-            self.kmer_hits[kmer].append(pos)
+        self.compressed, self.fm_index = compressed, fm_index
+        self.kmer_hits = ref_kmer_hits(ref, self.wordlen, self.alphabet,
+                                       allowed_memory, compressed=compressed,
+                                       fm_index=fm_index)
         self.T = None
         relpath = 'python-object'
         log_header = '%d-mer cache (%s)' % (self.wordlen, relpath)
         self._logger = Logger(log_level=self.log_level, header=log_header)
         self._seeds = {}
+        self._counter = None  # (content id of T, RectangleCounter)
+        self._diag_cumsum = None  # (content id of T, prefix sums)
+        self.runs = False
+        self.self_comp = False  # all seeds are found even if ref is query
+        self.reverse = None
+
+    def _seed_positions(self, exclude_trivial=True):
+        assert self.T is not None
+        key = (self.T.content_id, exclude_trivial)
+        if key not in self._seeds:
+            self._seeds = {key: ref_seed_positions(
+                self.kmer_hits, self.S, self.T, self.wordlen,
+                exclude_trivial=exclude_trivial)}
+        return self._seeds[key]
 
     def seeds(self, exclude_trivial=True):
+        pos_ref, pos = self._seed_positions(exclude_trivial=exclude_trivial)
+        return zip(pos_ref.tolist(), pos.tolist())
+
+    def seed_arrays(self, exclude_trivial=True, expand_runs=True,
+                    mirror=True):
+        # seeds against the reference are never stored as runs or mirrored
+        pos_ref, pos = self._seed_positions(exclude_trivial=exclude_trivial)
+        yield self.to_diagonal_coordinates(pos_ref, pos)
+
+    def diagonal_seeds(self, expand_runs=True, mirror=True):
+        return next(self.seed_arrays())
+
+    def _seed_counter(self):
+        assert self.T is not None
+        if self._counter is None or self._counter[0] != self.T.content_id:
+            pos_ref, pos = self._seed_positions()
+            counter = RectangleCounter(
+                *sort_diagonal_coordinates(pos_ref - pos, pos_ref + pos))
+            self._counter = (self.T.content_id, counter)
+        return self._counter[1]
+
+    def _diagonal_cumsum(self):
         assert self.T is not None
-        if self.T.content_id not in self._seeds:
-            self._seeds = {self.T.content_id: []}
-            for pos, kmer in enumerate(as_kmer_seq(self.T, self.wordlen)):
-                for pos_ref in self.kmer_hits[kmer]:
-                    if self.S == self.T and exclude_trivial and pos == pos_ref:
-                        continue
-                    self._seeds[self.T.content_id].append((pos_ref, pos))
-        return self._seeds[self.T.content_id]
+        if self._diag_cumsum is None or \
+                self._diag_cumsum[0] != self.T.content_id:
+            pos_ref, pos = self._seed_positions()
+            cumsum = self._cumsum_diagonals(pos_ref - pos)
+            self._diag_cumsum = (self.T.content_id, cumsum)
+        return self._diag_cumsum[1]
+
+    def diagonal_counts(self, exclude_trivial=True):
+        # seeds against the reference are not mirrored
+        return np.diff(self._diagonal_cumsum())
 
     def seed_count(self, d_band=None, a_band=None):
-        assert self.T is not None
-        seeds = self.seeds()
-        cnt = 0
-        if d_band:
-            d_min, d_max = d_band
-        if a_band:
-            a_min, a_max = a_band
-        for i, j in seeds:
-            d, a = self.to_diagonal_coordinates(i, j)
-            if d_band and not d_min <= d <= d_max:
-                continue
-            if a_band and not a_min <= a <= a_max:
-                continue
-            cnt += 1
-        return cnt
+        if a_band is None:
+            return super(WordBlotRef, self).seed_count(d_band=d_band)
+        return self._seed_counter().count(d_band=d_band, a_band=a_band)
+
+    def seed_count_many(self, d_bands=None, a_bands=None):
+        if a_bands is None:
+            return super(WordBlotRef, self).seed_count_many(d_bands=d_bands)
+        return self._seed_counter().count_many(d_bands=d_bands,
+                                               a_bands=a_bands)
 
+
+class WordBlotOverlapRef(WordBlotRef, WordBlotOverlap):
+    """An in-memory, SQL-free version of :class:`WordBlotOverlap` for faster
+    comparisons against a reference, cf. :class:`WordBlotRef`."""
+    def score_seeds_(self, seq):
+        self.T = seq
+        return super(WordBlotOverlapRef, self).score_seeds()
+
+    def highest_scoring_overlap_band(self, seq):
+        self.T = seq
+        return super(WordBlotOverlapRef, self).highest_scoring_overlap_band()
+
+
+class WordBlotLocalRef(WordBlotRef, WordBlot):
+    """An in-memory, SQL-free version of :class:`WordBlot` for faster
+    comparisons against a reference, cf. :class:`WordBlotRef`."""
     def score_seeds_(self, seq, K):
         self.T = seq
         return super(WordBlotLocalRef, self).score_seeds(K)
@@ -965,13 +1592,20 @@ class WordBlotMultiple(SeedIndexMultiple):
             # seed go through.
             assert len(scored_seeds), 'no seeds found while at_least_one=True'
             avail[np.argmax([rec['p'] for rec in scored_seeds])] = True
-        while True:
-            try:
-                # TODO grab the highest probability so we yield in decreasing
-                # order of quality
-                seed_idx = avail.index(True)
-            except ValueError:
-                break
+
+        def _segments():
+            # segments in order of their first available seed
+            seed_idx = 0
+            while True:
+                try:
+                    # TODO grab the highest probability so we yield in
+                    # decreasing order of quality
+                    seed_idx = avail.index(True, seed_idx)
+                except ValueError:
+                    return
+                yield _segment(seed_idx)
+
+        def _segment(seed_idx):
             stack = [seed_idx]
             avail[seed_idx] = False
             ps_in_seg = [scored_seeds[seed_idx]['p']]
@@ -984,43 +1618,46 @@ class WordBlotMultiple(SeedIndexMultiple):
                     if avail[neigh]:
                         stack.append(neigh)
                         avail[neigh] = False
-            if seg is None:
-                break
-            else:
-                # clip overflowing values so translating back to standard
-                # coordinates gives meaningful numbers.
-                ds_range, a_range = seg
-                for idx in range(len(self.seqs) - 1):
-                    d_min, d_max = ds_range[idx]
-                    d_min = min(
-                        len(self.seqs[0]),
-                        max(d_min, -len(self.seqs[idx + 1]))
-                    )
-                    d_max = min(
-                        len(self.seqs[0]),
-                        max(d_max, -len(self.seqs[idx + 1]))
-                    )
-                    ds_range[idx] = d_min, d_max
-                a_min, a_max = a_range
-                a_min = max(a_min, 0)
-                a_max = min(a_max, sum(len(seq) for seq in self.seqs))
-                seg = ds_range, (a_min, a_max)
+            # clip overflowing values so translating back to standard
+            # coordinates gives meaningful numbers.
+            ds_range, a_range = seg
+            for idx in range(len(self.seqs) - 1):
+                d_min, d_max = ds_range[idx]
+                d_min = min(
+                    len(self.seqs[0]),
+                    max(d_min, -len(self.seqs[idx + 1]))
+                )
+                d_max = min(
+                    len(self.seqs[0]),
+                    max(d_max, -len(self.seqs[idx + 1]))
+                )
+                ds_range[idx] = d_min, d_max
+            a_min, a_max = a_range
+            a_min = max(a_min, 0)
+            a_max = min(a_max, sum(len(seq) for seq in self.seqs))
+            seg = ds_range, (a_min, a_max)
             # NOTE the following is more justifiable but it matches the
             # average. TODO turn this in into an experiment to justify
             # p_hat = self.estimate_match_probability(
             #   n, d_band=seg[0], a_band=seg[1])
             p_hat = sum(ps_in_seg) / len(ps_in_seg)
-            res = {'segment': seg, 'p': p_hat}
-            ds_band, a_band = seg
-            n = self.seed_count(ds_band=ds_band, a_band=a_band)
-            K_hat = np.ceil((a_band[1] - a_band[0]) / len(self.seqs))
-            volume = a_band[1] - a_band[0]
-            for d_band in ds_band:
-                volume *= d_band[1] - d_band[0]
-            scores = self.score_num_seeds(num_seeds=n, volume=volume,
-                                          seglen=K_hat, p_match=p_hat)
-            res['scores'] = scores
-            yield res
+            return {'segment': seg, 'p': p_hat}
+
+        for batch in _batches(_segments(), SEGMENT_BATCH):
+            # count seeds in all segments of a batch at once
+            counts = self.seed_count_many(
+                [res['segment'][0] for res in batch],
+                [res['segment'][1] for res in batch])
+            for res, n in zip(batch, counts.tolist()):
+                (ds_band, a_band), p_hat = res['segment'], res['p']
+                K_hat = np.ceil((a_band[1] - a_band[0]) / len(self.seqs))
+                volume = a_band[1] - a_band[0]
+                for d_band in ds_band:
+                    volume *= d_band[1] - d_band[0]
+                scores = self.score_num_seeds(num_seeds=n, volume=volume,
+                                              seglen=K_hat, p_match=p_hat)
+                res['scores'] = scores
+                yield res
 
 
 class WordBlotMultipleFast(WordBlotMultiple):
@@ -1058,26 +1695,17 @@ class WordBlotMultipleFast(WordBlotMultiple):
         log_header = '%d-mer word-blot (python-object)' % self.wordlen
         self._logger = Logger(log_level=self.log_level, header=log_header)
 
-    def seeds(self):
-        for hits in self.kmer_hits:
-            hits = {seqid: [c[1] for c in seq_hits]
-                    for seqid, seq_hits in groupby(hits,
-                                                   key=lambda c: c[0])}
-            # only consider kmers present in all sequences
-            if len(hits) < len(self.seqs):
-                continue
-            for idxs in product(*hits.values()):
-                ds, a = self.to_diagonal_coordinates(*idxs)
-                yield list(ds), a
-
-    def seed_count(self, ds_band=None, a_band=None):
-        cnt = 0
-        for ds, a in self.seeds():
-            if ds_band:
-                if not all(ds_band[i][0] <= d <= ds_band[i][1]
-                           for i, d in enumerate(ds)):
+        def _hit_lists():
+            for hits in self.kmer_hits:
+                hits = {seqid: [c[1] for c in seq_hits]
+                        for seqid, seq_hits in groupby(hits,
+                                                       key=lambda c: c[0])}
+                # only consider kmers present in all sequences
+                if len(hits) < len(self.seqs):
                     continue
-            if a_band and not a_band[0] <= a <= a_band[1]:
-                continue
-            cnt += 1
-        return cnt
+                yield [hits[idx] for idx in range(len(self.seqs))]
+
+        # seeds are never materialized, cf. SeedIndexMultiple
+        self.backend = 'memory'
+        self._seed_hits = SeedHitLists.from_hit_lists(_hit_lists(),
+                                                      len(self.seqs))
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+.. wikisection:: overview
+    :title: (8) Suffix Arrays and FM-Indices
+
+    The :mod:`biseqt.fmindex` module provides an FM-index of a reference
+    sequence: a compressed full-text index that finds exact matches of any
+    length between the reference and query sequences. Unlike kmer indices
+    (cf. :mod:`biseqt.kmers`), the word length is not fixed when the index is
+    built and the index only needs a couple of bytes per reference base.
+
+    >>> from biseqt.sequence import Alphabet
+    >>> from biseqt.fmindex import FMIndex
+    >>> A = Alphabet('ACGT')
+    >>> fm_index = FMIndex(A.parse('TAAGCGTAAGC'))
+    >>> fm_index.count(A.parse('AAGC'))
+    2
+    >>> fm_index.locate(*fm_index.interval(A.parse('AAGC'))).tolist()
+    [1, 7]
+
+.. wikisection:: dev
+    :title: FM-Index
+
+    The suffix array of a sequence :math:`S` of length :math:`n` is the
+    permutation :math:`SA` of :math:`0, \\ldots, n` that sorts the suffixes
+    of :math:`S\\$` where :math:`\\$` is a sentinel smaller than all letters.
+    It is built by prefix doubling: after round :math:`k` suffixes are ranked
+    by their first :math:`2^k` letters, and the ranks of round :math:`k+1`
+    are obtained by sorting pairs of ranks of round :math:`k`, all in NumPy.
+
+    The Burrows-Wheeler transform is :math:`B[r] = S[SA[r] - 1]`. All
+    suffixes starting with a string :math:`P` form an interval of rows of
+    :math:`SA` which is found by *backward search* in :math:`|P|` steps:
+
+    .. math::
+        \\begin{aligned}
+            lo & \\leftarrow C[c] + \\mathrm{Occ}(c, lo) \\\\
+            hi & \\leftarrow C[c] + \\mathrm{Occ}(c, hi)
+        \\end{aligned}
+
+    where :math:`c` goes over letters of :math:`P` from last to first,
+    :math:`C[c]` is the number of letters smaller than :math:`c` in
+    :math:`S` and :math:`\\mathrm{Occ}(c, r)` is the number of occurrences
+    of :math:`c` in :math:`B[0:r]`. Occurrence counts are stored every few
+    rows and completed by scanning :math:`B`. Only the suffix array entries
+    of every few positions of :math:`S` are stored; others are recovered by
+    walking backwards along :math:`S` using the *LF-mapping*
+    :math:`LF(r) = C[B[r]] + \\mathrm{Occ}(B[r], r)` until a sampled
+    position is reached. All queries are vectorized over many patterns or
+    rows at once.
+"""
+import numpy as np
+
+from .sequence import Sequence
+from .seeds import sort_diagonal_coordinates, seed_runs
+
+# number of rows (or query windows) processed at once, which bounds the
+# working memory of queries regardless of their size.
+CHUNK_SIZE = 2 ** 14
+
+
+def suffix_array(text):
+    """Builds the suffix array of a sequence of integers by prefix doubling
+    in :math:`O(n \\log^2 n)` time using NumPy sorts. A suffix that is a
+    prefix of another suffix is the smaller of the two.
+
+    Args:
+        text (array-like): the sequence of nonnegative integers.
+
+    Returns:
+        numpy.ndarray: the starting positions of suffixes in sorted order,
+        of type ``int64``.
+    """
+    text = np.asarray(text, dtype=np.int64)
+    n = len(text)
+    # ranks of suffixes by their first letter
+    _, rank = np.unique(text, return_inverse=True)
+    rank = rank.astype(np.int64)
+    k = 1
+    while n and rank.max() < n - 1:
+        # ranks by the first 2k letters are ranks of pairs of ranks by the
+        # first k letters, suffixes shorter than k+1 rank first.
+        second = np.zeros(n, dtype=np.int64)
+        second[:n - k] = rank[k:] + 1
+        keys = rank * (n + 1) + second
+        order = np.argsort(keys)
+        keys = keys[order]
+        rank[order] = np.cumsum(np.append(0, keys[1:] != keys[:-1]))
+        k *= 2
+    sa = np.empty(n, dtype=np.int64)
+    sa[rank] = np.arange(n, dtype=np.int64)
+    return sa
+
+
+class FMIndex(object):
+    """An FM-index of a sequence. Letters are stored shifted by one to make
+    room for the sentinel (letter 0) such that the index uses roughly
+    :math:`1 + 4(\\sigma + 1)/b_{occ} + 4/b_{sa} + 1/8 + 1/16` bytes per
+    base for an alphabet of size :math:`\\sigma`, i.e about 1.6 bytes for
+    nucleotides with default parameters. Building the index needs a few
+    tens of bytes per base of working memory, cf. :func:`suffix_array`.
+
+    Attributes:
+        length (int): length of the indexed sequence.
+        bwt (numpy.ndarray): the Burrows-Wheeler transform as ``uint8``.
+        C (numpy.ndarray): number of letters smaller than each letter.
+        occ (numpy.ndarray): occurrence counts of all letters in the first
+            :math:`k b_{occ}` rows of :attr:`bwt`, one row per :math:`k`.
+        sa_samples (numpy.ndarray): suffix array entries at rows of sampled
+            positions, in row order.
+        occ_sample (int): number of rows between occurrence counts.
+        sa_sample (int): distance between sampled positions.
+    """
+    def __init__(self, seq, occ_sample=64, sa_sample=32):
+        assert isinstance(seq, Sequence)
+        assert len(seq.alphabet) < 255, 'alphabet too large for FM-index'
+        assert occ_sample > 0 and sa_sample > 0
+        self.occ_sample, self.sa_sample = occ_sample, sa_sample
+        self.length = len(seq)
+        num_letters = len(seq.alphabet) + 1
+        text = np.append(np.array(seq.contents, dtype=np.int64) + 1, 0)
+        sa = suffix_array(text)
+        # text[-1] is the sentinel
+        self.bwt = text[sa - 1].astype(np.uint8)
+        counts = np.bincount(text, minlength=num_letters)
+        self.C = np.append(0, np.cumsum(counts)).astype(np.int64)
+
+        rows = np.arange(0, len(text) + 1, occ_sample)
+        self.occ = np.zeros((len(rows), num_letters), dtype=np.uint32)
+        for letter in range(num_letters):
+            cum = np.append(0, np.cumsum(self.bwt == letter))
+            self.occ[:, letter] = cum[rows]
+
+        marked = sa % sa_sample == 0
+        self.sa_samples = sa[marked].astype(np.uint32)
+        self._marks = np.packbits(marked)
+        # number of marked rows before each block of 64 rows
+        mark_rows = np.arange(0, len(text) + 1, 64)
+        self._mark_occ = np.append(0, np.cumsum(marked))[mark_rows] \
+            .astype(np.uint32)
+
+    @property
+    def nbytes(self):
+        """Total number of bytes used by the index."""
+        return sum(arr.nbytes for arr in [self.bwt, self.C, self.occ,
+                                          self.sa_samples, self._marks,
+                                          self._mark_occ])
+
+    @staticmethod
+    def estimate_nbytes(length, alphabet_len, occ_sample=64, sa_sample=32):
+        """Computes :attr:`nbytes` of the index of a sequence without
+        building it.
+
+        Args:
+            length (int): length of the indexed sequence.
+            alphabet_len (int): size of the alphabet of the sequence.
+
+        Keyword Args:
+            occ_sample (int): as in :class:`FMIndex`; default is 64.
+            sa_sample (int): as in :class:`FMIndex`; default is 32.
+
+        Returns:
+            int: number of bytes.
+        """
+        num_rows, num_letters = length + 1, alphabet_len + 1
+        bwt = num_rows
+        C = 8 * (num_letters + 1)
+        occ = 4 * num_letters * ((num_rows + occ_sample) // occ_sample)
+        sa_samples = 4 * ((num_rows - 1) // sa_sample + 1)
+        marks = (num_rows + 7) // 8
+        mark_occ = 4 * ((num_rows + 64) // 64)
+        return bwt + C + occ + sa_samples + marks + mark_occ
+
+    def _rank(self, letters, rows):
+        # Occ(letter, row) for arrays of letters and rows, in chunks of rows
+        ranks = np.zeros(len(rows), dtype=np.int64)
+        offsets = np.arange(self.occ_sample)
+        for start in range(0, len(rows), CHUNK_SIZE):
+            chunk = slice(start, start + CHUNK_SIZE)
+            blocks = rows[chunk] // self.occ_sample
+            starts = blocks * self.occ_sample
+            idx = np.minimum(starts[:, None] + offsets, len(self.bwt) - 1)
+            window = (self.bwt[idx] == letters[chunk, None]) & \
+                (offsets < (rows[chunk] - starts)[:, None])
+            ranks[chunk] = self.occ[blocks, letters[chunk]] + \
+                window.sum(axis=1)
+        return ranks
+
+    def _lf(self, rows):
+        # the row of the suffix starting one position before that of rows
+        letters = self.bwt[rows].astype(np.int64)
+        return self.C[letters] + self._rank(letters, rows)
+
+    def _is_marked(self, rows):
+        return (self._marks[rows >> 3] >> (7 - (rows & 7))) & 1 == 1
+
+    def _mark_rank(self, rows):
+        # number of marked rows before each row
+        blocks = rows // 64
+        idx = np.minimum(blocks[:, None] * 8 + np.arange(8),
+                         len(self._marks) - 1)
+        bits = np.unpackbits(self._marks[idx], axis=1)
+        before = bits & (np.arange(64) < (rows - blocks * 64)[:, None])
+        return self._mark_occ[blocks].astype(np.int64) + \
+            before.sum(axis=1, dtype=np.int64)
+
+    def _as_letters(self, seq):
+        # contents of a sequence in the shifted letters of the index
+        if isinstance(seq, Sequence):
+            seq = seq.contents
+        return np.array(seq, dtype=np.int64) + 1
+
+    def backward_search(self, patterns):
+        """Finds the suffix array intervals of many patterns of the same
+        length at once.
+
+        Args:
+            patterns (array-like): 2D array with one pattern per row, each
+                a sequence of letters in integer representation (cf.
+                :attr:`biseqt.sequence.Sequence.contents`).
+
+        Returns:
+            tuple: ``(lo, hi)`` arrays such that rows :math:`lo \\le r < hi`
+            of the suffix array are occurrences of each pattern.
+        """
+        patterns = np.asarray(patterns, dtype=np.int64) + 1
+        assert patterns.ndim == 2, 'need a 2D array of patterns'
+        lo = np.zeros(len(patterns), dtype=np.int64)
+        hi = np.full(len(patterns), len(self.bwt), dtype=np.int64)
+        for col in range(patterns.shape[1] - 1, -1, -1):
+            letters = patterns[:, col]
+            lo = self.C[letters] + self._rank(letters, lo)
+            hi = self.C[letters] + self._rank(letters, hi)
+        return lo, np.maximum(lo, hi)
+
+    def interval(self, pattern):
+        """Finds the suffix array interval of a pattern, cf.
+        :func:`backward_search`.
+
+        Args:
+            pattern (sequence.Sequence|list): the pattern.
+
+        Returns:
+            tuple: ``(lo, hi)`` bounds of the interval.
+        """
+        contents = pattern.contents if isinstance(pattern, Sequence) \
+            else pattern
+        lo, hi = self.backward_search([contents])
+        return int(lo[0]), int(hi[0])
+
+    def count(self, pattern):
+        """Counts the occurrences of a pattern in the indexed sequence.
+
+        Args:
+            pattern (sequence.Sequence|list): the pattern.
+
+        Returns:
+            int: number of occurrences.
+        """
+        lo, hi = self.interval(pattern)
+        return hi - lo
+
+    def locate_rows(self, rows):
+        """Recovers the suffix array entries of many rows at once by walking
+        along the LF-mapping to sampled positions.
+
+        Args:
+            rows (array-like): rows of the suffix array.
+
+        Returns:
+            numpy.ndarray: the positions of the suffixes at these rows.
+        """
+        rows = np.array(rows, dtype=np.int64)
+        positions = np.zeros(len(rows), dtype=np.int64)
+        steps = 0
+        todo = np.arange(len(rows))
+        while len(todo):
+            marked = self._is_marked(rows[todo])
+            done = todo[marked]
+            positions[done] = self.sa_samples[self._mark_rank(rows[done])] + \
+                steps
+            todo = todo[~marked]
+            rows[todo] = self._lf(rows[todo])
+            steps += 1
+        return positions
+
+    def locate(self, lo, hi):
+        """Finds all positions of the suffixes in a suffix array interval,
+        i.e all occurrences of a pattern.
+
+        Args:
+            lo (int): start of the interval.
+            hi (int): end of the interval (exclusive).
+
+        Returns:
+            numpy.ndarray: sorted positions of type ``int64``.
+        """
+        return np.sort(self.locate_rows(np.arange(lo, hi)))
+
+    def matches(self, seq, length):
+        """Finds all exact matches of a given length between a query
+        sequence and the indexed sequence, i.e the seeds of the two for word
+        length ``length``.
+
+        Args:
+            seq (sequence.Sequence): the query sequence.
+            length (int): length of matches.
+
+        Returns:
+            tuple: ``(pos_ref, pos_query)`` arrays of starting positions in
+            the indexed and the query sequences, sorted by query position
+            and then by reference position.
+        """
+        assert length > 0, 'matches must have positive length'
+        contents = np.array(seq.contents, dtype=np.int64)
+        num_windows = max(len(contents) - length + 1, 0)
+        lo = np.zeros(num_windows, dtype=np.int64)
+        hi = np.zeros(num_windows, dtype=np.int64)
+        # windows are searched in chunks of fixed size
+        for start in range(0, num_windows, CHUNK_SIZE):
+            end = min(start + CHUNK_SIZE, num_windows)
+            windows = np.arange(start, end)[:, None] + np.arange(length)
+            lo[start:end], hi[start:end] = self.backward_search(
+                contents[windows])
+        sizes = hi - lo
+        pos_query = np.repeat(np.arange(num_windows), sizes)
+        rows = np.arange(int(sizes.sum())) - \
+            np.repeat(np.cumsum(sizes) - sizes, sizes) + \
+            np.repeat(lo, sizes)
+        pos_ref = self.locate_rows(rows)
+        order = np.lexsort((pos_ref, pos_query))
+        return pos_ref[order], pos_query[order]
+
+    def mems(self, seq, min_len):
+        """Finds all maximal exact matches (MEMs), i.e exact matches that can
+        be extended neither to the left nor to the right, of at least a given
+        length between a query sequence and the indexed sequence. These are
+        maximal runs of matches of length ``min_len`` on the same diagonal
+        (cf. :func:`matches` and :func:`biseqt.seeds.seed_runs`).
+
+        Args:
+            seq (sequence.Sequence): the query sequence.
+            min_len (int): minimum length of MEMs.
+
+        Returns:
+            tuple: ``(pos_ref, pos_query, length)`` arrays of type ``int64``.
+        """
+        pos_ref, pos_query = self.matches(seq, min_len)
+        d, a = sort_diagonal_coordinates(pos_ref - pos_query,
+                                         pos_ref + pos_query)
+        d, a, n = seed_runs(d, a)
+        return (a + d) // 2, (a - d) // 2, n + min_len - 1
+
+    def smems(self, seq, min_len=1):
+        """Finds all super-maximal exact matches (SMEMs) of a query sequence,
+        i.e substrings of the query that occur in the indexed sequence and
+        are not contained in any longer substring of the query that does.
+        For each end position in the query the longest matching substring
+        ending there is found by backward search, all end positions being
+        extended at once; such a substring is an SMEM if the longest match
+        ending one position later starts later.
+
+        Args:
+            seq (sequence.Sequence): the query sequence.
+
+        Keyword Args:
+            min_len (int): minimum length of reported SMEMs; default is 1.
+
+        Returns:
+            list: ``(start, end, positions)`` tuples, one per SMEM in order
+            of query position, where ``positions`` is a sorted array of
+            occurrences in the indexed sequence.
+        """
+        letters = self._as_letters(seq)
+        num_ends = len(letters)
+        ends = np.arange(1, num_ends + 1)
+        best_lo = np.zeros(num_ends, dtype=np.int64)
+        best_hi = np.zeros(num_ends, dtype=np.int64)
+        lengths = np.zeros(num_ends, dtype=np.int64)
+        lo = np.zeros(num_ends, dtype=np.int64)
+        hi = np.full(num_ends, len(self.bwt), dtype=np.int64)
+        active = np.arange(num_ends)
+        step = 0
+        while len(active):
+            # extend the match ending at each active end one letter left
+            active = active[ends[active] - step - 1 >= 0]
+            chars = letters[ends[active] - step - 1]
+            new_lo = self.C[chars] + self._rank(chars, lo[active])
+            new_hi = self.C[chars] + self._rank(chars, hi[active])
+            found = new_lo < new_hi
+            active, new_lo, new_hi = \
+                active[found], new_lo[found], new_hi[found]
+            lo[active], hi[active] = new_lo, new_hi
+            best_lo[active], best_hi[active] = new_lo, new_hi
+            lengths[active] = step + 1
+            step += 1
+
+        starts = ends - lengths
+        is_smem = (lengths >= max(min_len, 1))
+        is_smem[:-1] &= starts[:-1] < starts[1:]
+        return [(int(starts[idx]), int(ends[idx]),
+                 self.locate(best_lo[idx], best_hi[idx]))
+                for idx in np.flatnonzero(is_smem)]
@@ -118,6 +118,24 @@
         | rollback journal is ever created and hence there is never a rollback
         | journal to delete. The OFF journaling mode disables the atomic commit
         | and rollback capabilities of SQLite.
+    * If many readers need to query the database while a writer is ingesting
+      data, use `write-ahead logging <wal_docs>`_ and give each thread (or
+      process) its own connection; in WAL mode readers do not block the
+      writer and the writer does not block readers. This is what
+      :func:`KmerDBWrapper.connection` does for on-disk databases:
+
+      .. code-block:: sql
+
+        PRAGMA journal_mode = WAL
+
+      Read-only workloads further benefit from memory-mapped I/O and a
+      larger page cache, both configured per connection (cf. ``mmap_size``
+      and ``cache_size`` of :class:`KmerDBWrapper`):
+
+      .. code-block:: sql
+
+        PRAGMA mmap_size = 268435456
+        PRAGMA cache_size = -65536
     * When a table has a unique integer key it should be declared as ``INTEGER
       PRIMARY KEY`` so that it would take over the default ``rowid`` field.
       This saves space (and thus a small amount of time) on both the field and
@@ -143,6 +161,7 @@
         PRAGMA page_size = 65536
 
     .. _journaling_docs: https://www.sqlite.org/pragma.html#pragma_journal_mode
+    .. _wal_docs: https://www.sqlite.org/wal.html
     .. _pagesize_docs: https://www.sqlite.org/pragma.html#pragma_page_size
     .. _foreign key checks: https://www.sqlite.org/foreignkeys.html#fk_enable
     .. _deferring: https://www.sqlite.org/foreignkeys.html#fk_deferred
@@ -154,9 +173,13 @@
 """
 
 import struct
+import sys
 import os
 import apsw
 import logging
+import threading
+import numpy as np
+from itertools import chain, combinations, groupby, product
 
 from .util import Logger
 from .sequence import Alphabet, Sequence
@@ -212,7 +235,114 @@ def kmer_as_int(contents, alphabet):
     return int(as_str, len(alphabet))
 
 
-def as_kmer_seq(seq, wordlen, mask=[]):
+def _fits_int64(wordlen, alphabet_len):
+    return alphabet_len ** wordlen <= 2 ** 63
+
+
+def kmers_as_ints(kmers, alphabet_len):
+    """Batch version of :func:`kmer_as_int`: calculates the integer
+    representation of many kmers of the same word length at once.
+
+    Args:
+        kmers (array-like): 2D array of shape ``(num_kmers, wordlen)``
+            containing letter indices (as in :attr:`Sequence.contents`).
+        alphabet_len (int): size of the alphabet.
+
+    Returns:
+        numpy.ndarray: integer kmers of type ``int64``.
+    """
+    kmers = np.asarray(kmers, dtype=np.int64)
+    assert kmers.ndim == 2, 'need a 2D array of kmers'
+    assert _fits_int64(kmers.shape[1], alphabet_len), \
+        'kmers do not fit in 64-bit integers'
+    codes = np.zeros(len(kmers), dtype=np.int64)
+    for col in range(kmers.shape[1]):
+        codes = codes * alphabet_len + kmers[:, col]
+    return codes
+
+
+def ints_as_kmers(codes, wordlen, alphabet_len):
+    """Inverse of :func:`kmers_as_ints`: recovers the letter indices of many
+    kmers from their integer representation.
+
+    Args:
+        codes (array-like): integer kmers.
+        wordlen (int): word length of the kmers.
+        alphabet_len (int): size of the alphabet.
+
+    Returns:
+        numpy.ndarray: 2D array of shape ``(num_kmers, wordlen)`` containing
+        letter indices.
+    """
+    codes = np.asarray(codes, dtype=np.int64).reshape(-1)
+    powers = alphabet_len ** np.arange(wordlen - 1, -1, -1, dtype=np.int64)
+    return (codes[:, None] // powers[None, :]) % alphabet_len
+
+
+def ints_as_strs(codes, wordlen, alphabet):
+    """Translates integer kmers to their string representation, e.g for
+    reporting kmer spectra.
+
+    Args:
+        codes (array-like): integer kmers.
+        wordlen (int): word length of the kmers.
+        alphabet (sequence.Alphabet): The alphabet of the kmers.
+
+    Returns:
+        list: the kmers as strings of letters.
+    """
+    letters = np.array(alphabet[:])
+    rows = letters[ints_as_kmers(codes, wordlen, len(alphabet))]
+    return [''.join(row) for row in rows]
+
+
+def sliding_min(values, width):
+    """Computes the minimum of all windows of given width in an array in
+    linear time, regardless of the width, using the van Herk/Gil-Werman
+    algorithm: the array is split into blocks of the window width and the
+    minimum of a window is the smaller of the suffix minimum of the block in
+    which it starts and the prefix minimum of the block in which it ends.
+
+    Args:
+        values (array-like): The 1D array of values.
+        width (int): The window width.
+
+    Returns:
+        numpy.ndarray: minimum of the window starting at each position, of
+        length ``len(values) - width + 1``.
+    """
+    values = np.asarray(values)
+    assert width > 0
+    num_windows = len(values) - width + 1
+    if num_windows <= 0:
+        return values[:0]
+    num_blocks = (len(values) + width - 1) // width
+    padded = np.empty(num_blocks * width, dtype=values.dtype)
+    padded[:len(values)] = values
+    padded[len(values):] = values.max()
+    blocks = padded.reshape(num_blocks, width)
+    prefix = np.minimum.accumulate(blocks, axis=1).ravel()
+    suffix = np.minimum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.minimum(suffix[:num_windows],
+                      prefix[width - 1: width - 1 + num_windows])
+
+
+def low_quality_kmers(quals, wordlen, min_qual):
+    """Determines kmers which cover a base with quality below a threshold.
+
+    Args:
+        quals (array-like): Per-base quality scores of a sequence.
+        wordlen (int): Size of kmers.
+        min_qual (int): Minimum acceptable quality for all bases of a kmer.
+
+    Returns:
+        numpy.ndarray: boolean array which is True for each low quality kmer
+        position.
+    """
+    return sliding_min(quals, wordlen) < min_qual
+
+
+def as_kmer_seq(seq, wordlen, mask=[], quals=None, min_qual=None):
     """A generator for kmer hit tuples of the form ``(kmer, pos)``. Kmers
     are represented in integer form (cf. :func:`kmer_as_int`).
 
@@ -223,12 +353,26 @@ def as_kmer_seq(seq, wordlen, mask=[]):
             kmers (represented by ``None``) if the kmer content (set of letters
             appearing in the kmer, represented as integers as in
             :attr:`Sequence.contents`) matches the set.
+        quals (array-like|None): Per-base quality scores of the sequence
+            (e.g as given by :func:`biseqt.sequence.read_fastq`).
+        min_qual (int|None): If specified along with ``quals``, kmers
+            covering a base of lower quality are masked, cf.
+            :func:`low_quality_kmers`.
 
     Returns:
         list: of integers representing kmers.
     """
     assert isinstance(seq, Sequence)
     assert all(isinstance(lets, set) for lets in mask)
+    if quals is not None and min_qual is not None:
+        assert len(quals) == len(seq), 'need one quality score per base'
+        low_quality = low_quality_kmers(quals, wordlen, min_qual)
+        kmers = as_kmer_seq(seq, wordlen, mask=mask)
+        return [None if low else kmer
+                for kmer, low in zip(kmers, low_quality)]
+    if _fits_int64(wordlen, len(seq.alphabet)):
+        kmers = as_kmer_arrays(seq, [wordlen], mask=mask)[wordlen].tolist()
+        return [None if kmer < 0 else kmer for kmer in kmers]
     kmers = []
     for pos in range(len(seq) - wordlen + 1):
         if mask:
@@ -241,6 +385,353 @@ def as_kmer_seq(seq, wordlen, mask=[]):
     return kmers
 
 
+def as_kmer_arrays(seq, wordlens, mask=[]):
+    """Computes the kmer sequences of several word lengths in one rolling
+    pass over a sequence. The integer representation of the
+    :math:`(w+1)`-mer at a position is derived from that of the
+    :math:`w`-mer at the same position by one multiplication and one
+    addition (cf. :func:`kmer_as_int`), all positions being processed at
+    once using NumPy.
+
+    Args:
+        seq (sequence.Sequence): The sequence to be scanned.
+        wordlens (list): Word lengths of interest.
+        mask (list): A list of sets of integers which mask kmers, cf.
+            :func:`as_kmer_seq`.
+
+    Returns:
+        dict: kmer sequences keyed by word length, each a NumPy array of type
+        ``int64`` with one element per kmer position, masked kmers being
+        represented by -1.
+    """
+    assert isinstance(seq, Sequence)
+    assert all(isinstance(lets, set) for lets in mask)
+    assert all(isinstance(w, int) and w > 0 for w in wordlens)
+    base = len(seq.alphabet)
+    assert all(_fits_int64(w, base) for w in wordlens if w <= len(seq)), \
+        'kmers do not fit in 64-bit integers'
+    contents = np.array(seq.contents, dtype=np.int64)
+    num_letters = len(contents)
+    if mask:
+        # running counts of each letter, for letter contents of windows
+        letter_counts = np.zeros((base, num_letters + 1), dtype=np.int64)
+        for letter in range(base):
+            np.cumsum(contents == letter, out=letter_counts[letter, 1:])
+
+    kmer_arrays = {}
+    kmers, wordlen = np.zeros(num_letters, dtype=np.int64), 0
+    for target in sorted(set(wordlens)):
+        while wordlen < target and wordlen < num_letters:
+            kmers = kmers[:num_letters - wordlen] * base + contents[wordlen:]
+            wordlen += 1
+        if target > num_letters:
+            kmer_arrays[target] = np.zeros(0, dtype=np.int64)
+            continue
+        kmer_arrays[target] = kmers.copy()
+        if not mask:
+            continue
+        present = letter_counts[:, target:] - letter_counts[:, :-target] > 0
+        for lets in mask:
+            masked = np.ones(len(kmers), dtype=bool)
+            for letter in range(base):
+                masked &= present[letter] == (letter in lets)
+            kmer_arrays[target][masked] = -1
+    return kmer_arrays
+
+
+def kmer_neighbors(kmer, wordlen, alphabet_len, max_mismatches=1):
+    """Enumerates all kmers within the given Hamming distance of a kmer by
+    substituting digits of its integer representation (cf.
+    :func:`kmer_as_int`): replacing the letter :math:`c` at position
+    :math:`p` (counted from the right) by :math:`c'` amounts to adding
+    :math:`(c' - c)|\\Sigma|^p` to the integer representation.
+
+    Args:
+        kmer (int): kmer in integer representation.
+        wordlen (int): word length of the kmer.
+        alphabet_len (int): size of the alphabet.
+
+    Keyword Args:
+        max_mismatches (int): maximum Hamming distance; default is 1.
+
+    Returns:
+        list: distinct kmers in integer representation, starting with the
+        given kmer itself, in increasing order of Hamming distance.
+    """
+    assert 0 <= max_mismatches <= wordlen
+    powers = [alphabet_len ** p for p in range(wordlen)]
+    digits = [(kmer // power) % alphabet_len for power in powers]
+    # deltas[p] are the possible changes caused by a substitution at p
+    deltas = [[(c - digits[p]) * powers[p]
+               for c in range(alphabet_len) if c != digits[p]]
+              for p in range(wordlen)]
+    neighbors = [kmer]
+    for num_mismatches in range(1, max_mismatches + 1):
+        for positions in combinations(range(wordlen), num_mismatches):
+            for changes in product(*[deltas[p] for p in positions]):
+                neighbors.append(kmer + sum(changes))
+    return neighbors
+
+
+def kmer_shard(kmer, num_shards):
+    """Determines the shard responsible for a kmer in a sharded
+    :class:`KmerIndex` by Knuth's multiplicative hashing of its integer
+    representation (cf. :func:`kmer_as_int`) which spreads kmers evenly among
+    shards even for low complexity sequences.
+
+    Args:
+        kmer (int): kmer in integer representation.
+        num_shards (int): total number of shards.
+
+    Returns:
+        int: index of the shard between 0 and ``num_shards - 1``.
+    """
+    if num_shards == 1:
+        return 0
+    return ((kmer * 2654435761) % 2 ** 32 >> 16) % num_shards
+
+
+# constants of the splitmix64 finalizer, cf. http://xoshiro.di.unimi.it
+_MIX_SHIFTS = [np.uint64(30), np.uint64(27), np.uint64(31)]
+_MIX_MULTS = [np.uint64(0xbf58476d1ce4e5b9), np.uint64(0x94d049bb133111eb)]
+_GOLDEN = np.uint64(0x9e3779b97f4a7c15)
+
+
+def hash_kmers(kmers, seed=0):
+    """Maps kmers in integer representation (cf.
+    :func:`biseqt.kmers.kmer_as_int`) to pseudo-random 64-bit integers using
+    the finalizer of the splitmix64 generator.
+
+    Args:
+        kmers (iterable): integer kmers, must be non-negative.
+
+    Keyword Args:
+        seed (int): seed for the hash function; default is 0.
+
+    Returns:
+        numpy.ndarray: hash values of type ``uint64``, in the same order as
+        input kmers.
+    """
+    if not isinstance(kmers, np.ndarray):
+        kmers = list(kmers)
+    hashes = np.array(kmers, dtype=np.uint64).reshape(-1)
+    # wraparound of uint64 arithmetic is intended; arrays wrap silently but
+    # scalars warn, so the seed offset is reduced in Python integers
+    hashes += np.uint64(seed * int(_GOLDEN) % 2 ** 64)
+    hashes ^= hashes >> _MIX_SHIFTS[0]
+    hashes *= _MIX_MULTS[0]
+    hashes ^= hashes >> _MIX_SHIFTS[1]
+    hashes *= _MIX_MULTS[1]
+    hashes ^= hashes >> _MIX_SHIFTS[2]
+    return hashes
+
+
+class KmerBloomFilter(object):
+    """A Bloom filter for sets of kmers in integer representation. Membership
+    queries never give false negatives and give false positives with a
+    probability close to the one requested, provided that no more than the
+    given capacity of kmers are added. Bit positions of each kmer are given
+    by double hashing the 64-bit :func:`hash_kmers` of the kmer:
+    :math:`h_1 + ih_2 \\mod m` for :math:`i=0,\\ldots,k-1` where
+    :math:`h_1, h_2` are the lower and upper 32 bits of the hash.
+
+    The filter is either sized for a given ``capacity`` and ``fp_rate`` or
+    restored from its attributes (e.g as deserialized from a database).
+
+    Attributes:
+        num_bits (int): number of bits :math:`m` in the filter.
+        num_hashes (int): number of bits :math:`k` set for each kmer.
+        bits (numpy.ndarray): the bit array packed into ``uint8`` words.
+    """
+    def __init__(self, capacity=None, fp_rate=None, num_bits=None,
+                 num_hashes=None, bits=None):
+        if num_bits is None:
+            assert capacity is not None and 0 < fp_rate < 1
+            capacity = max(capacity, 1)
+            # optimal parameters for the given capacity and fp rate
+            num_bits = int(np.ceil(-capacity * np.log(fp_rate) /
+                                   np.log(2) ** 2))
+            num_hashes = int(round(np.log(2) * num_bits / capacity))
+        self.num_bits = max(num_bits, 8)
+        self.num_hashes = max(num_hashes, 1)
+        if bits is None:
+            bits = np.zeros((self.num_bits + 7) / 8, dtype=np.uint8)
+        assert len(bits) == (self.num_bits + 7) / 8
+        self.bits = bits
+
+    def _positions(self, kmers):
+        hashes = hash_kmers(kmers)
+        h1 = hashes & np.uint64(0xffffffff)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        positions = (h1[:, None] + steps[None, :] * h2[:, None]) % \
+            np.uint64(self.num_bits)
+        return positions >> np.uint64(3), \
+            (positions & np.uint64(7)).astype(np.uint8)
+
+    def add(self, kmers):
+        """Adds the given kmers to the filter.
+
+        Args:
+            kmers (iterable): integer kmers.
+        """
+        words, offsets = self._positions(kmers)
+        np.bitwise_or.at(self.bits, words.ravel(),
+                         np.left_shift(1, offsets.ravel()).astype(np.uint8))
+
+    def contains(self, kmers):
+        """Queries the filter for the given kmers.
+
+        Args:
+            kmers (iterable): integer kmers.
+
+        Returns:
+            numpy.ndarray: boolean array which is False for kmers that are
+            definitely not in the filter.
+        """
+        words, offsets = self._positions(kmers)
+        bits = np.right_shift(self.bits[words], offsets) & 1
+        return np.all(bits, axis=1)
+
+    def __contains__(self, kmer):
+        # a scalar pass through NumPy costs more than the query it saves,
+        # this is the same as contains() in plain Python integers.
+        mask = 2 ** 64 - 1
+        h = kmer & mask  # seed is 0, cf. hash_kmers()
+        h ^= h >> 30
+        h = (h * 0xbf58476d1ce4e5b9) & mask
+        h ^= h >> 27
+        h = (h * 0x94d049bb133111eb) & mask
+        h ^= h >> 31
+        h1, h2 = h & 0xffffffff, (h >> 32) | 1
+        bits, num_bits = self.bits, self.num_bits
+        for i in range(self.num_hashes):
+            pos = (h1 + i * h2) % num_bits
+            if not (bits.item(pos >> 3) >> (pos & 7)) & 1:
+                return False
+        return True
+
+
+class CompressedPostings(object):
+    """An in-memory, compressed, read-only map from kmers to the positions at
+    which they occur in a sequence. Positions of each kmer are sorted, delta
+    encoded, and stored as variable-byte integers (7 bits per byte, the high
+    bit marking continuation) in a single byte array. For a sequence of
+    length :math:`n` a kmer occurring on average every :math:`g` positions
+    costs roughly :math:`\\lceil \\log_2(g)/7 \\rceil` bytes per occurrence,
+    plus a constant number of bytes per distinct kmer for the directory.
+    Postings of a kmer are decoded in one vectorized pass into a NumPy array.
+
+    Attributes:
+        kmers (numpy.ndarray): sorted distinct kmers observed.
+        offsets (numpy.ndarray): offsets of the encoded postings of each kmer
+            in :attr:`data`; has one more element than :attr:`kmers`.
+        data (numpy.ndarray): the encoded postings as ``uint8`` words.
+        num_hits (int): total number of kmer occurrences.
+    """
+    def __init__(self, kmer_seq):
+        kmer_seq = np.array([-1 if kmer is None else kmer
+                             for kmer in kmer_seq], dtype=np.int64)
+        positions = np.flatnonzero(kmer_seq >= 0)
+        kmer_seq = kmer_seq[positions]
+        self.num_hits = len(positions)
+        # stable sort keeps positions of each kmer in increasing order
+        order = np.argsort(kmer_seq, kind='mergesort')
+        kmer_seq, positions = kmer_seq[order], positions[order]
+
+        kmers, starts = np.unique(kmer_seq, return_index=True)
+        kmer_dtype = np.uint32 if kmers.size and kmers[-1] < 2 ** 32 \
+            else np.uint64
+        self.kmers = kmers.astype(kmer_dtype)
+
+        deltas = positions.copy()
+        deltas[1:] -= positions[:-1]
+        deltas[starts] = positions[starts]  # the first position is absolute
+
+        # number of 7-bit groups needed by each delta
+        num_bytes = np.ones(len(deltas), dtype=np.int64)
+        for shift in range(7, 64, 7):
+            num_bytes += deltas >= (1 << shift)
+        max_bytes = num_bytes.max() if len(deltas) else 1
+        groups = np.arange(max_bytes)
+        words = (deltas[:, None] >> (7 * groups[None, :])) & 0x7f
+        words |= (groups[None, :] < num_bytes[:, None] - 1) * 0x80
+        self.data = words[groups[None, :] < num_bytes[:, None]] \
+            .astype(np.uint8)
+
+        byte_starts = np.append(0, np.cumsum(num_bytes))
+        offsets = byte_starts[np.append(starts, len(deltas))]
+        offsets_dtype = np.uint32 if offsets[-1] < 2 ** 32 else np.uint64
+        self.offsets = offsets.astype(offsets_dtype)
+
+    @property
+    def nbytes(self):
+        """Total number of bytes used by the compressed index."""
+        return self.kmers.nbytes + self.offsets.nbytes + self.data.nbytes
+
+    @staticmethod
+    def estimate_nbytes(num_hits, num_kmers, length, max_kmer):
+        """Estimates :attr:`nbytes` without building the index. The first
+        position of each kmer is modeled as uniform in the sequence and the
+        remaining deltas as geometric gaps with the average gap
+        :math:`\\bar{g}` between occurrences of the same kmer, i.e a delta
+        needs more than :math:`k` bytes with probability
+        :math:`\\exp(-2^{7k}/\\bar{g})`.
+
+        Args:
+            num_hits (int): total number of kmer occurrences.
+            num_kmers (int): number of distinct kmers.
+            length (int): length of the sequence.
+            max_kmer (int): largest possible kmer in integer representation.
+
+        Returns:
+            int: estimated number of bytes.
+        """
+        if num_hits == 0:
+            return 4
+        kmer_bytes = 4 if max_kmer < 2 ** 32 else 8
+        avg_gap = float(length) * num_kmers / num_hits
+        shifts = 7 * np.arange(1, 10)
+        first_bytes = 1 + np.sum(np.maximum(0, 1 - 2. ** shifts / length))
+        delta_bytes = 1 + np.sum(np.exp(-2. ** shifts / avg_gap))
+        data_bytes = int(num_kmers * first_bytes +
+                         (num_hits - num_kmers) * delta_bytes)
+        offset_bytes = 4 if data_bytes < 2 ** 32 else 8
+        return num_kmers * kmer_bytes + (num_kmers + 1) * offset_bytes + \
+            data_bytes
+
+    def _decode(self, start, end):
+        block = self.data[start:end].astype(np.int64)
+        # each value ends in the first byte without a continuation bit
+        ends = np.flatnonzero(block < 0x80)
+        value_starts = np.append(0, ends[:-1] + 1)
+        shifts = np.arange(len(block)) - np.repeat(value_starts,
+                                                   ends - value_starts + 1)
+        deltas = np.add.reduceat((block & 0x7f) << (7 * shifts),
+                                 value_starts)
+        return np.cumsum(deltas)
+
+    def hits(self, kmer):
+        """Returns all positions at which a kmer occurs.
+
+        Args:
+            kmer (int): kmer of interest.
+
+        Returns:
+            numpy.ndarray: sorted positions of type ``int64``.
+        """
+        idx = np.searchsorted(self.kmers, kmer)
+        if idx == len(self.kmers) or self.kmers[idx] != kmer:
+            return np.zeros(0, dtype=np.int64)
+        return self._decode(self.offsets[idx], self.offsets[idx + 1])
+
+    def __getitem__(self, kmer):
+        return self.hits(kmer).tolist()
+
+    def __len__(self):
+        return self.num_hits
+
+
 class KmerDBWrapper(object):
     """Generic wrapper for an SQLite database for Kmers.
 
@@ -254,9 +745,19 @@ class KmerDBWrapper(object):
             by ``None``), cf. :func:`as_kmer_seq`.
         init_script (str): SQL script to be executed upon initialization;
             typically creates tables needed by the class.
+        mmap_size (int|None): If specified, the maximum number of bytes of
+            the database file that each connection memory-maps, cf.
+            ``PRAGMA mmap_size``.
+        cache_size (int|None): If specified, the suggested maximum number of
+            database pages (or KiB if negative) held in memory by each
+            connection, cf. ``PRAGMA cache_size``.
+        busy_timeout (int): Number of milliseconds a connection waits for a
+            lock held by another connection before giving up; default is
+            60000.
     """
     def __init__(self, name='', path=':memory:', alphabet=None, wordlen=None,
-                 mask=[], log_level=logging.INFO, init_script=None):
+                 mask=[], log_level=logging.INFO, init_script=None,
+                 mmap_size=None, cache_size=None, busy_timeout=60000):
         self.name = name
         assert all(isinstance(lets, set) for lets in mask)
         self.mask = mask
@@ -284,27 +785,75 @@ class KmerDBWrapper(object):
         log_header = '%d-mer (%s)' % (self.wordlen, relpath)
         self._logger = Logger(log_level=log_level, header=log_header)
         self.log_level = log_level
-        self._connection = None
+
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.busy_timeout = busy_timeout
+        self._connection = None  # the only connection to in-memory databases
+        self._local = threading.local()  # per-thread connections otherwise
 
         self.init_script = init_script
         if self.init_script:
             with self.connection() as conn:
                 conn.cursor().execute(self.init_script)
-                conn.cursor().execute('PRAGMA journaling_mode = OFF;')
+
+    def _connect(self, readonly):
+        if self.path == ':memory:':
+            return apsw.Connection(self.path)
+
+        flags = apsw.SQLITE_OPEN_READWRITE | apsw.SQLITE_OPEN_CREATE
+        conn = apsw.Connection(self.path, flags=flags)
+        conn.setbusytimeout(self.busy_timeout)
+        cursor = conn.cursor()
+        # journaling mode is persistent in the database file.
+        cursor.execute('PRAGMA journal_mode = WAL;')
+        if readonly:
+            # NOTE the connection is not opened with SQLITE_OPEN_READONLY
+            # since then it could not checkpoint and remove the WAL file if
+            # it happens to be the last connection to be closed.
+            cursor.execute('PRAGMA query_only = ON;')
+        if self.mmap_size is not None:
+            cursor.execute('PRAGMA mmap_size = %d;' % self.mmap_size)
+        if self.cache_size is not None:
+            cursor.execute('PRAGMA cache_size = %d;' % self.cache_size)
+        return conn
 
     # FIXME compare with old-tip and figure out what the deal with resetting is
-    def connection(self, reset=False):
+    def connection(self, reset=False, readonly=False):
         """Provides a SQLite database connection that can be used as a context
-        manager. The returned object is always the same connection object
-        belonging to the :class:`KmerIndex` instance (otherwise in-memory
-        connections would reset the database contents upon every invocation).
+        manager. Connections are pooled per process and per thread such that
+        each thread gets its own connection to on-disk databases (and is thus
+        free to query the database concurrently with other threads). On-disk
+        databases are put in write-ahead logging (WAL) mode so that readers
+        do not block the writer and vice versa. In-memory databases
+        cannot be shared between connections and hence all threads receive
+        the same connection object belonging to the :class:`KmerDBWrapper`
+        instance (otherwise in-memory connections would reset the database
+        contents upon every invocation).
+
+        Keyword Args:
+            reset (bool): Whether to discard the pooled connection and open a
+                new one; default is False.
+            readonly (bool): Whether the connection is used only for queries,
+                in which case it is opened read-write but restricted to
+                queries by ``PRAGMA query_only`` (such that it can still
+                checkpoint the WAL file); default is False. Has no effect on
+                in-memory databases.
 
         Returns:
             apsw.Connection
         """
-        if reset or self._connection is None:
-            self._connection = apsw.Connection(self.path)
-        return self._connection
+        if self.path == ':memory:':
+            if reset or self._connection is None:
+                self._connection = self._connect(readonly=False)
+            return self._connection
+
+        # forked processes must not inherit their parent's connections
+        pool = self._local.__dict__.setdefault('connections', {})
+        key = (os.getpid(), readonly)
+        if reset or key not in pool:
+            pool[key] = self._connect(readonly)
+        return pool[key]
 
     def log(self, *args, **kwargs):
         """Wraps :class:`Logger.log`."""
@@ -348,7 +897,7 @@ class KmerCache(KmerDBWrapper):
 
     def cached_seqs(self):
         """Returns content identifiers for all cached sequences."""
-        with self.connection() as conn:
+        with self.connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT seq from %s' % self.kmers_table)
             return [x[0] for x in cursor]
@@ -364,7 +913,7 @@ class KmerCache(KmerDBWrapper):
                 input sequence represented as an integer, cf.
                 :func:`as_kmer_seq`.
         """
-        with self.connection() as conn:
+        with self.connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 'SELECT kmers from %s WHERE seq = ?' % self.kmers_table,
@@ -400,29 +949,120 @@ class KmerIndex(KmerDBWrapper):
           'seqid' INTEGER PRIMARY KEY AUTOINCREMENT -- integer id.
         );
 
+    If more than one shard is requested, the ``kmers_[name]`` table is split
+    among as many SQLite databases (files ``[path].shard[i]-[n]`` for on-disk
+    indices), each holding the hits of kmers for which
+    :func:`kmer_shard` gives its index. Queries for a kmer are routed to its
+    shard and bulk inserts into different shards are performed in parallel.
+    The ``kmer_indexed_[name]`` table always stays in the main database and a
+    sequence is only logged there once all its hits are committed in all
+    shards; each shard keeps a unique index over ``(seqid, pos)`` such that
+    hits of an interrupted insert are found and discarded cheaply.
+
+    If a clustered index is requested, ``kmers_[name]`` is instead a ``WITHOUT
+    ROWID`` table whose primary key is ``(kmer, seqid, pos)``, i.e the hits
+    are stored in a B-tree sorted by kmer. Each shard then also holds a side
+    table of observed kmers and their number of occurrences:
+
+    .. code-block:: sql
+
+        CREATE TABLE kmers_[name] (
+          'kmer'  INTEGER,
+          'seqid' INTEGER,
+          'pos'   INTEGER,
+          PRIMARY KEY (kmer, seqid, pos)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE kmer_counts_[name] (
+          'kmer'  INTEGER PRIMARY KEY,  -- the kmer in integer representation.
+          'count' INTEGER               -- the number of hits of the kmer.
+        );
+
+    Both :func:`hits` and :func:`kmers` are then range scans over a single
+    B-tree (instead of an index probe followed by one table lookup per hit,
+    and a full scan of all hits, respectively) and no separate SQL index
+    needs to be created. The price is slower inserts for large indices since
+    hits are not appended in order of kmers.
+
+    If a false positive rate is specified for a Bloom filter, a
+    :class:`KmerBloomFilter` of all observed kmers is consulted before any
+    query is sent to SQLite such that most absent kmers are rejected without
+    touching the database. The filter is built upon first query, rebuilt
+    when new sequences are indexed, and is stored in the main database
+    alongside its generation, i.e the largest ``seqid`` it covers, such that
+    filters made stale by other instances or processes are never trusted:
+
+    .. code-block:: sql
+
+        CREATE TABLE kmer_bloom_[name] (
+          'generation' INTEGER,
+          'num_bits'   INTEGER,
+          'num_hashes' INTEGER,
+          'bits'       BLOB
+        );
+
     Attributes:
         name (str):
         cache (KmerCache): optional :class:`KmerCache` object to use for
             retrieving integer representations of sequences.
+        num_shards (int): number of shards among which kmer hits are
+            distributed; default is 1.
+        shards (list): the :class:`KmerDBWrapper` of each shard; for an
+            unsharded index this is just the index itself.
+        clustered (bool): whether hits are stored in a ``WITHOUT ROWID``
+            table clustered on kmers, alongside a table of kmer counts;
+            default is False.
+        bloom_fp_rate (float|None): If specified, the false positive rate of
+            the Bloom filter used to reject absent kmers; default is None,
+            i.e no Bloom filter.
+        min_qual (int|None): If specified, kmers covering a base of lower
+            quality are not indexed for sequences indexed with quality scores
+            (cf. :func:`index_kmers`); default is None.
     """
-    def __init__(self, name='', kmer_cache=None, **kw):
+    def __init__(self, name='', kmer_cache=None, num_shards=1,
+                 clustered=False, bloom_fp_rate=None, min_qual=None, **kw):
         self.name = name
+        self.min_qual = min_qual
+        assert isinstance(num_shards, int) and num_shards > 0
+        self.num_shards = num_shards
+        self.clustered = clustered
+        assert bloom_fp_rate is None or 0 < bloom_fp_rate < 1
+        self.bloom_fp_rate = bloom_fp_rate
+        self._bloom_filter = None
+        self._bloom_generation = None
+        self._bloom_data_version = None
         init_script = """
-            CREATE TABLE IF NOT EXISTS %s (
-              'kmer'  INTEGER,      -- the kmer in integer representation.
-              'seqid' INTEGER,      -- integer identifier of sequence
-                                    -- REFERENCES kmer_indexed(seqid), but not
-                                    -- declared to avoid integrity checks
-              'pos'   INTEGER       -- the position of kmer in sequence.
-            );
-
             CREATE TABLE IF NOT EXISTS %s (
               'seq'  VARCHAR,                           -- content id,
               'seqid' INTEGER PRIMARY KEY AUTOINCREMENT -- integer id.
             );
-        """ % (self.kmers_table, self.log_table)
+        """ % self.log_table
+        if self.bloom_fp_rate:
+            init_script += """
+                CREATE TABLE IF NOT EXISTS %s (
+                  'generation' INTEGER,
+                  'num_bits'   INTEGER,
+                  'num_hashes' INTEGER,
+                  'bits'       BLOB
+                );
+            """ % self.bloom_table
+        if self.num_shards == 1:
+            init_script = self.kmers_table_script + init_script
         kw['name'] = name
         super(KmerIndex, self).__init__(init_script=init_script, **kw)
+        if self.num_shards == 1:
+            self.shards = [self]
+        else:
+            shard_kw = {key: getattr(self, key)
+                        for key in ['name', 'alphabet', 'wordlen', 'mask',
+                                    'log_level', 'mmap_size', 'cache_size',
+                                    'busy_timeout']}
+            self.shards = [
+                KmerDBWrapper(path=self.shard_path(idx),
+                              init_script=self.kmers_table_script,
+                              **shard_kw)
+                for idx in range(self.num_shards)
+            ]
         if kmer_cache:
             assert isinstance(kmer_cache, KmerCache)
             assert kmer_cache.wordlen == self.wordlen
@@ -437,25 +1077,202 @@ class KmerIndex(KmerDBWrapper):
         :attr:`KmerDBWrapper.name`."""
         return 'kmers_' + self.name
 
+    @property
+    def counts_table(self):
+        """The kmer counts table name ``kmer_counts_[name]``, cf.
+        :attr:`KmerDBWrapper.name`; only present in clustered indices."""
+        return 'kmer_counts_' + self.name
+
+    @property
+    def kmers_table_script(self):
+        """The SQL script creating :attr:`kmers_table` (and
+        :attr:`counts_table` if clustered) in each shard."""
+        if self.clustered:
+            script = """
+                CREATE TABLE IF NOT EXISTS %s (
+                  'kmer'  INTEGER,
+                  'seqid' INTEGER,
+                  'pos'   INTEGER,
+                  PRIMARY KEY (kmer, seqid, pos)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS %s (
+                  'kmer'  INTEGER PRIMARY KEY,
+                  'count' INTEGER
+                );
+            """ % (self.kmers_table, self.counts_table)
+        else:
+            script = """
+                CREATE TABLE IF NOT EXISTS %s (
+                  'kmer'  INTEGER,      -- the kmer in integer representation.
+                  'seqid' INTEGER,      -- integer identifier of sequence
+                                        -- REFERENCES kmer_indexed(seqid), but
+                                        -- not declared to avoid integrity
+                                        -- checks
+                  'pos'   INTEGER       -- the position of kmer in sequence.
+                );
+            """ % self.kmers_table
+        if self.num_shards > 1:
+            # shards commit separately from the log table; hits of a sequence
+            # must be cheap to find (and impossible to duplicate) in order to
+            # discard those of an interrupted insert.
+            script += """
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_%s_seqid ON %s
+                  (seqid, pos);
+            """ % (self.kmers_table, self.kmers_table)
+        return script
+
     @property
     def log_table(self):
         """The log table name ``kmer_indexed_[name]``, cf.
         :attr:`KmerDBWrapper.name`."""
         return 'kmer_indexed_' + self.name
 
-    def index_kmers(self, seq):
+    @property
+    def bloom_table(self):
+        """The Bloom filter table name ``kmer_bloom_[name]``, cf.
+        :attr:`KmerDBWrapper.name`; only present if :attr:`bloom_fp_rate` is
+        specified."""
+        return 'kmer_bloom_' + self.name
+
+    def bloom_filter(self):
+        """Returns the Bloom filter of all observed kmers. The filter is
+        loaded from the database if already built for the current generation
+        of the index (cf. :attr:`bloom_table`), and otherwise is built and
+        stored. A cached filter is only trusted if SQLite reports no commits
+        by other connections since it was last validated
+        (``PRAGMA data_version``), or if the generation is unchanged. Each
+        call thus revalidates the filter; lookups call this once per batch
+        of kmers (cf. :func:`hits_many`, :func:`hits_within`) and
+        :func:`hits` only if no filter is cached.
+
+        Returns:
+            KmerBloomFilter
+        """
+        assert self.bloom_fp_rate, 'no Bloom filter requested'
+        with self.connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            data_version = (conn, cursor.execute('PRAGMA data_version')
+                            .next()[0])
+            if self._bloom_filter is not None and \
+                    self._bloom_data_version == data_version:
+                return self._bloom_filter
+            q = 'SELECT IFNULL(MAX(seqid), 0) FROM %s' % self.log_table
+            generation = cursor.execute(q).next()[0]
+            if self._bloom_filter is not None and \
+                    self._bloom_generation == generation:
+                self._bloom_data_version = data_version
+                return self._bloom_filter
+            q = """
+                SELECT num_bits, num_hashes, bits FROM %s
+                WHERE generation = ?
+            """ % self.bloom_table
+            for num_bits, num_hashes, bits in cursor.execute(q, (generation,)):
+                bits = np.frombuffer(bytes(bits), dtype=np.uint8).copy()
+                self._bloom_filter = KmerBloomFilter(
+                    num_bits=num_bits, num_hashes=num_hashes, bits=bits)
+                self._bloom_generation = generation
+                self._bloom_data_version = data_version
+                return self._bloom_filter
+
+        # kmers are read after the generation such that concurrently indexed
+        # sequences can only make the filter a superset of its generation.
+        kmers = self.kmers()
+        self.log('building Bloom filter for %d kmers' % len(kmers))
+        bloom_filter = KmerBloomFilter(capacity=len(kmers),
+                                       fp_rate=self.bloom_fp_rate)
+        bloom_filter.add(kmers)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM %s' % self.bloom_table)
+            q = """
+                INSERT INTO %s (generation, num_bits, num_hashes, bits)
+                VALUES (?, ?, ?, ?)
+            """ % self.bloom_table
+            cursor.execute(q, (generation, bloom_filter.num_bits,
+                               bloom_filter.num_hashes,
+                               buffer(bloom_filter.bits.tobytes())))
+        self._bloom_filter = bloom_filter
+        self._bloom_generation = generation
+        # our own write bumps the data version seen by the readonly
+        # connection, which then revalidates against the generation once.
+        self._bloom_data_version = None
+        return bloom_filter
+
+    def shard_path(self, idx):
+        """The path of the database holding the given shard, ``:memory:`` if
+        the index is in memory.
+
+        Args:
+            idx (int): the index of the shard.
+
+        Returns:
+            str
+        """
+        if self.path == ':memory:':
+            return self.path
+        return '%s.shard%d-%d' % (self.path, idx, self.num_shards)
+
+    def shard_for(self, kmer):
+        """Returns the shard responsible for the given kmer.
+
+        Args:
+            kmer (int): kmer of interest.
+
+        Returns:
+            KmerDBWrapper
+        """
+        return self.shards[kmer_shard(kmer, self.num_shards)]
+
+    def _for_all_shards(self, func, args=None):
+        # calls func(shard, *args[idx]) for each shard in a separate thread
+        # and returns the results in order of shards.
+        args = args if args is not None else [()] * self.num_shards
+        if self.num_shards == 1:
+            return [func(self, *args[0])]
+
+        results, errors = [None] * self.num_shards, []
+
+        def _target(idx):
+            try:
+                results[idx] = func(self.shards[idx], *args[idx])
+            except Exception:
+                errors.append(sys.exc_info())
+
+        threads = [threading.Thread(target=_target, args=(idx,))
+                   for idx in range(self.num_shards)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            exc_type, exc_value, exc_tb = errors[0]
+            raise exc_type, exc_value, exc_tb
+        return results
+
+    def index_kmers(self, seq, quals=None):
         """ Indexes all kmers observed in the given sequence in
         :attr:`kmers_table`.
 
         Args:
             seq (sequence.Sequence): The sequence just inserted into the
                 database.
-            seqid (int): The integer identifier to use for sequence.
+            quals (array-like|None): Per-base quality scores of the sequence;
+                if given, low quality kmers are skipped according to
+                :attr:`min_qual`.
+
+        Returns:
+            int: The integer identifier of the sequence.
         """
         if self.kmer_cache:
             kmer_seq = self.kmer_cache.as_kmer_seq(seq)
         else:
             kmer_seq = as_kmer_seq(seq, self.wordlen, mask=self.mask)
+        if quals is not None and self.min_qual is not None:
+            assert len(quals) == len(seq), 'need one quality score per base'
+            low_quality = low_quality_kmers(quals, self.wordlen,
+                                            self.min_qual)
+            kmer_seq = [None if low else kmer
+                        for kmer, low in zip(kmer_seq, low_quality)]
 
         with self.connection() as conn:
             self.log('indexing %d-mers for sequence %s (%d)' %
@@ -475,27 +1292,112 @@ class KmerIndex(KmerDBWrapper):
                 SELECT last_insert_rowid();
             """ % self.log_table
             seqid = cursor.execute(q, (seq.content_id,)).next()[0]
-            q = """
-                INSERT INTO %s (kmer, seqid, pos)
-                VALUES (?,?,?)
-            """ % self.kmers_table
-            cursor.executemany(q, ((kmer, seqid, pos)
-                                   for pos, kmer in enumerate(kmer_seq)
-                                   if kmer is not None))
+            if self.bloom_fp_rate:
+                # the Bloom filter is rebuilt upon next query
+                cursor.execute('DELETE FROM %s' % self.bloom_table)
+                self._bloom_filter = None
+
+            records = [[] for _ in range(self.num_shards)]
+            for pos, kmer in enumerate(kmer_seq):
+                if kmer is None:
+                    continue
+                records[kmer_shard(kmer, self.num_shards)].append(
+                    (kmer, seqid, pos)
+                )
+
+            def _insert(shard, shard_records):
+                q = """
+                    INSERT INTO %s (kmer, seqid, pos)
+                    VALUES (?,?,?)
+                """ % self.kmers_table
+                if self.clustered:
+                    # inserting in order of primary key keeps B-tree page
+                    # splits local.
+                    shard_records.sort()
+                if shard is self:
+                    shard_cursor = cursor
+                else:
+                    shard_cursor = shard.connection().cursor()
+                with shard.connection():
+                    if shard is not self:
+                        self._discard_hits(shard_cursor, seqid)
+                    shard_cursor.executemany(q, shard_records)
+                    if self.clustered:
+                        self._update_counts(shard_cursor, shard_records)
+
+            # Shards commit separately from the main database. The log row is
+            # only committed (upon exiting this block) once all shards have
+            # committed and, until then, the uncommitted log row keeps other
+            # writers from claiming the same seqid. Should any shard fail,
+            # hits already committed in other shards are discarded; hits
+            # orphaned by a crash are discarded when the seqid is reused.
+            try:
+                self._for_all_shards(_insert, args=[(rs,) for rs in records])
+            except Exception:
+                exc_type, exc_value, exc_tb = sys.exc_info()
+                if self.num_shards > 1:
+                    try:
+                        self._for_all_shards(
+                            self._discard_shard_hits,
+                            args=[(seqid,)] * self.num_shards)
+                    except Exception:
+                        self.log('failed to discard hits of seqid %d, they '
+                                 'are discarded when the seqid is reused.' %
+                                 seqid)
+                raise exc_type, exc_value, exc_tb
             return seqid
 
+    def _discard_shard_hits(self, shard, seqid):
+        with shard.connection() as conn:
+            self._discard_hits(conn.cursor(), seqid)
+
+    def _discard_hits(self, cursor, seqid):
+        # removes all hits of the given seqid from a shard, relies on the
+        # (seqid, pos) index of sharded kmer tables.
+        if self.clustered:
+            q = 'SELECT kmer, seqid, pos FROM %s WHERE seqid = ? ' \
+                'ORDER BY kmer' % self.kmers_table
+            orphans = list(cursor.execute(q, (seqid,)))
+            if orphans:
+                self._update_counts(cursor, orphans, sign=-1)
+                cursor.execute('DELETE FROM %s WHERE count <= 0' %
+                               self.counts_table)
+        cursor.execute('DELETE FROM %s WHERE seqid = ?' % self.kmers_table,
+                       (seqid,))
+
+    def _update_counts(self, cursor, records, sign=1):
+        # records are sorted by kmer; cf. "Insert-or-Append Queries"
+        counts = [(kmer, kmer, sign * len(list(hits)))
+                  for kmer, hits in groupby(records, key=lambda rec: rec[0])]
+        q = """
+            INSERT OR REPLACE INTO %s (kmer, count)
+            SELECT ?, IFNULL((SELECT count FROM %s WHERE kmer = ?), 0) + ?
+        """ % (self.counts_table, self.counts_table)
+        cursor.executemany(q, counts)
+
     def create_sql_index(self):
-        """Creates SQL index over the ``kmer`` column of ``kmers`` table."""
+        """Creates SQL index over the ``kmer`` column of ``kmers`` table (in
+        all shards). Clustered indices need no separate SQL index and this is
+        a no-op for them."""
+        if self.clustered:
+            return
         self.log('Creating SQL index for table %s.' % self.kmers_table)
-        with self.connection() as conn:
-            q = """
-                CREATE INDEX IF NOT EXISTS idx_%s ON %s (kmer);
-            """ % (self.kmers_table, self.kmers_table)
-            conn.cursor().execute(q)
+
+        def _create(shard):
+            with shard.connection() as conn:
+                q = """
+                    CREATE INDEX IF NOT EXISTS idx_%s ON %s (kmer);
+                """ % (self.kmers_table, self.kmers_table)
+                conn.cursor().execute(q)
+
+        self._for_all_shards(_create)
         self.log('Created SQL index for table %s.' % self.kmers_table)
 
     def hits(self, kmer):
-        """Returns all hits of a given kmer in indexed sequences.
+        """Returns all hits of a given kmer in indexed sequences. If a Bloom
+        filter is requested, a cached filter is used as is; sequences indexed
+        by other instances since it was last validated are only seen by
+        batch lookups (cf. :func:`hits_many`, :func:`bloom_filter`).
 
         Args:
             kmer (int): kmer of interest.
@@ -505,10 +1407,82 @@ class KmerIndex(KmerDBWrapper):
                 A list of 2-tuples containing sequence ids (int) and positions.
         """
         assert isinstance(kmer, int)
+        if self.bloom_fp_rate:
+            bloom_filter = self._bloom_filter
+            if bloom_filter is None:
+                bloom_filter = self.bloom_filter()
+            if kmer not in bloom_filter:
+                return []
         query = 'SELECT seqid, pos FROM %s WHERE kmer = ?' % self.kmers_table
-        with self.connection() as conn:
+        shard = self.shard_for(kmer)
+        with shard.connection(readonly=True) as conn:
             return list(conn.cursor().execute(query, (kmer,)))
 
+    def hits_many(self, kmers):
+        """Returns all hits of each of the given kmers in indexed sequences.
+        If a Bloom filter is requested, it is revalidated once (cf.
+        :func:`bloom_filter`) and queried for all kmers at once.
+
+        Args:
+            kmers (list): kmers of interest.
+
+        Returns:
+            list:
+                A list, in the same order as ``kmers``, of lists of 2-tuples
+                containing sequence ids (int) and positions.
+        """
+        kmers = list(kmers)
+        present = [True] * len(kmers)
+        if self.bloom_fp_rate and kmers:
+            present = self.bloom_filter().contains(kmers).tolist()
+        query = 'SELECT seqid, pos FROM %s WHERE kmer = ?' % self.kmers_table
+        hits = [[] for _ in kmers]
+        for idx, kmer in enumerate(kmers):
+            if not present[idx]:
+                continue
+            with self.shard_for(kmer).connection(readonly=True) as conn:
+                hits[idx] = list(conn.cursor().execute(query, (kmer,)))
+        return hits
+
+    def hits_within(self, kmer, max_mismatches=1):
+        """Returns all hits of kmers within the given Hamming distance of a
+        kmer in indexed sequences. All neighboring kmers (cf.
+        :func:`kmer_neighbors`) are looked up in a single query per shard.
+
+        Args:
+            kmer (int): kmer of interest.
+
+        Keyword Args:
+            max_mismatches (int): maximum Hamming distance; default is 1.
+
+        Returns:
+            list:
+                A list of 2-tuples containing sequence ids (int) and positions.
+        """
+        assert isinstance(kmer, int)
+        neighbors = kmer_neighbors(kmer, self.wordlen, len(self.alphabet),
+                                   max_mismatches=max_mismatches)
+        if self.bloom_fp_rate:
+            present = self.bloom_filter().contains(neighbors)
+            neighbors = [n for n, p in zip(neighbors, present) if p]
+        by_shard = [[] for _ in range(self.num_shards)]
+        for neighbor in neighbors:
+            by_shard[kmer_shard(neighbor, self.num_shards)].append(neighbor)
+
+        hits = []
+        for shard, shard_kmers in zip(self.shards, by_shard):
+            if not shard_kmers:
+                continue
+            with shard.connection(readonly=True) as conn:
+                cursor = conn.cursor()
+                # stay below SQLite's maximum number of host parameters
+                for idx in range(0, len(shard_kmers), 500):
+                    batch = shard_kmers[idx: idx + 500]
+                    query = 'SELECT seqid, pos FROM %s WHERE kmer IN (%s)' % \
+                        (self.kmers_table, ', '.join('?' * len(batch)))
+                    hits += list(cursor.execute(query, batch))
+        return hits
+
     def kmers(self):
         """Returns all observed kmers.
 
@@ -516,14 +1490,240 @@ class KmerIndex(KmerDBWrapper):
             list: list of kmers in integer representation.
         """
         self.create_sql_index()  # FIXME do we need this?
-        query = 'SELECT DISTINCT kmer FROM %s' % self.kmers_table
+        if self.clustered:
+            query = 'SELECT kmer FROM %s' % self.counts_table
+        else:
+            query = 'SELECT DISTINCT kmer FROM %s' % self.kmers_table
+
+        # shards hold disjoint sets of kmers
+        def _kmers(shard):
+            with shard.connection(readonly=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute(query)
+                return [x[0] for x in cursor]
+
+        return list(chain(*self._for_all_shards(_kmers)))
+
+    def kmer_counts(self):
+        """Returns the number of hits of all observed kmers. For clustered
+        indices this is read directly from :attr:`counts_table`, otherwise it
+        is computed by aggregating all hits.
+
+        Returns:
+            dict: number of hits keyed by kmers in integer representation.
+        """
+        if self.clustered:
+            query = 'SELECT kmer, count FROM %s' % self.counts_table
+        else:
+            self.create_sql_index()
+            query = 'SELECT kmer, COUNT(*) FROM %s GROUP BY kmer' % \
+                self.kmers_table
+
+        def _counts(shard):
+            with shard.connection(readonly=True) as conn:
+                return list(conn.cursor().execute(query))
+
+        return dict(chain(*self._for_all_shards(_counts)))
+
+    def drop_data(self):
+        """Drop all tables created by this object."""
+        with self.connection() as conn:
+            conn.cursor().execute('DROP TABLE %s;' % self.log_table)
+            if self.bloom_fp_rate:
+                conn.cursor().execute('DROP TABLE %s;' % self.bloom_table)
+
+        def _drop(shard):
+            with shard.connection() as conn:
+                conn.cursor().execute('DROP TABLE %s;' % self.kmers_table)
+                if self.clustered:
+                    conn.cursor().execute('DROP TABLE %s;' %
+                                          self.counts_table)
+
+        self._for_all_shards(_drop)
+
+
+class MultiKmerIndex(KmerDBWrapper):
+    """An index backed by SQLite for occurences of kmers of several word
+    lengths in a body of sequences. All word lengths are derived from a
+    single pass over each sequence (cf. :func:`as_kmer_arrays`) and share the
+    same position records; i.e upon initialization the following script is
+    executed:
+
+    .. code-block:: sql
+
+        CREATE TABLE multi_kmers_[name] (
+          'seqid'     INTEGER,  -- integer identifier of sequence
+          'pos'       INTEGER,  -- the position of kmers in sequence.
+          'kmer_[w1]' INTEGER,  -- the w1-mer at pos.
+          'kmer_[w2]' INTEGER,  -- the w2-mer at pos, etc.
+          ...
+        );
+
+        CREATE TABLE IF NOT EXISTS multi_kmer_indexed_[name] (
+          'seq'  VARCHAR,                           -- content id,
+          'seqid' INTEGER PRIMARY KEY AUTOINCREMENT -- integer id.
+        );
+
+    Kmer columns are ``NULL`` for positions too close to the end of the
+    sequence to contain a kmer of the corresponding length and for masked
+    kmers. The :attr:`wordlen` of the index is the largest word length.
+
+    Attributes:
+        name (str):
+        wordlens (list): sorted word lengths of interest.
+    """
+    def __init__(self, name='', wordlens=None, **kw):
+        self.name = name
+        assert wordlens, 'at least one word length is needed'
+        self.wordlens = sorted(set(wordlens))
+        kw['wordlen'] = self.wordlens[-1]
+        init_script = """
+            CREATE TABLE IF NOT EXISTS %s (
+              'seqid' INTEGER,
+              'pos'   INTEGER,
+              %s
+            );
+            CREATE TABLE IF NOT EXISTS %s (
+              'seq'  VARCHAR,                           -- content id,
+              'seqid' INTEGER PRIMARY KEY AUTOINCREMENT -- integer id.
+            );
+        """ % (self.kmers_table,
+               ', '.join("'%s' INTEGER" % self.kmer_column(w)
+                         for w in self.wordlens),
+               self.log_table)
+        super(MultiKmerIndex, self).__init__(name=name,
+                                             init_script=init_script, **kw)
+
+    @property
+    def kmers_table(self):
+        """The kmer hits table name ``multi_kmers_[name]``, cf.
+        :attr:`KmerDBWrapper.name`."""
+        return 'multi_kmers_' + self.name
+
+    @property
+    def log_table(self):
+        """The log table name ``multi_kmer_indexed_[name]``, cf.
+        :attr:`KmerDBWrapper.name`."""
+        return 'multi_kmer_indexed_' + self.name
+
+    def kmer_column(self, wordlen):
+        """The name of the column holding kmers of the given word length.
+
+        Args:
+            wordlen (int): one of :attr:`wordlens`.
+
+        Returns:
+            str
+        """
+        assert wordlen in self.wordlens, \
+            'word length %d is not indexed' % wordlen
+        return 'kmer_%d' % wordlen
+
+    def index_kmers(self, seq):
+        """Indexes kmers of all word lengths observed in the given sequence
+        in :attr:`kmers_table`.
+
+        Args:
+            seq (sequence.Sequence): The sequence to be indexed.
+
+        Returns:
+            int: The integer identifier of the sequence.
+        """
         with self.connection() as conn:
+            self.log('indexing %s-mers for sequence %s (%d)' %
+                     (','.join(str(w) for w in self.wordlens),
+                      seq.content_id[:8], len(seq)))
             cursor = conn.cursor()
-            cursor.execute(query)
-            return [x[0] for x in cursor]
+            q = 'SELECT seqid FROM %s WHERE seq = ?' % self.log_table
+            for seqid in cursor.execute(q, (seq.content_id,)):
+                self.log('sequence %s already indexed, skipping.' %
+                         seq.content_id[:8])
+                return seqid[0]
+            q = """
+                INSERT INTO %s (seq) VALUES (?);
+                SELECT last_insert_rowid();
+            """ % self.log_table
+            seqid = cursor.execute(q, (seq.content_id,)).next()[0]
+
+            kmer_arrays = as_kmer_arrays(seq, self.wordlens, mask=self.mask)
+            num_pos = len(kmer_arrays[self.wordlens[0]])
+            columns = []
+            for w in self.wordlens:
+                kmers = kmer_arrays[w].tolist()
+                columns.append([None if kmer < 0 else kmer for kmer in kmers] +
+                               [None] * (num_pos - len(kmers)))
+            q = 'INSERT INTO %s (seqid, pos, %s) VALUES (?, ?, %s)' % \
+                (self.kmers_table,
+                 ', '.join(self.kmer_column(w) for w in self.wordlens),
+                 ', '.join('?' * len(self.wordlens)))
+            cursor.executemany(q, ((seqid, pos) + rec for pos, rec in
+                                   enumerate(zip(*columns))))
+            return seqid
+
+    def create_sql_index(self):
+        """Creates SQL indices over all kmer columns of the ``kmers``
+        table."""
+        self.log('Creating SQL indices for table %s.' % self.kmers_table)
+        with self.connection() as conn:
+            for w in self.wordlens:
+                q = 'CREATE INDEX IF NOT EXISTS idx_%s_%d ON %s (%s);' % \
+                    (self.kmers_table, w, self.kmers_table,
+                     self.kmer_column(w))
+                conn.cursor().execute(q)
+
+    def hits(self, kmer, wordlen):
+        """Returns all hits of a given kmer in indexed sequences.
+
+        Args:
+            kmer (int): kmer of interest.
+            wordlen (int): word length of the kmer.
+
+        Returns:
+            list:
+                A list of 2-tuples containing sequence ids (int) and positions.
+        """
+        assert isinstance(kmer, int)
+        query = 'SELECT seqid, pos FROM %s WHERE %s = ?' % \
+            (self.kmers_table, self.kmer_column(wordlen))
+        with self.connection(readonly=True) as conn:
+            return list(conn.cursor().execute(query, (kmer,)))
+
+    def kmers(self, wordlen):
+        """Returns all observed kmers of the given word length.
+
+        Args:
+            wordlen (int): word length of interest.
+
+        Returns:
+            list: list of kmers in integer representation.
+        """
+        self.create_sql_index()
+        col = self.kmer_column(wordlen)
+        query = 'SELECT DISTINCT %s FROM %s WHERE %s IS NOT NULL' % \
+            (col, self.kmers_table, col)
+        with self.connection(readonly=True) as conn:
+            return [x[0] for x in conn.cursor().execute(query)]
+
+    def kmer_counts(self, wordlen):
+        """Returns the number of hits of all observed kmers of the given word
+        length.
+
+        Args:
+            wordlen (int): word length of interest.
+
+        Returns:
+            dict: number of hits keyed by kmers in integer representation.
+        """
+        self.create_sql_index()
+        col = self.kmer_column(wordlen)
+        query = """
+            SELECT %s, COUNT(*) FROM %s WHERE %s IS NOT NULL GROUP BY %s
+        """ % (col, self.kmers_table, col, col)
+        with self.connection(readonly=True) as conn:
+            return dict(conn.cursor().execute(query))
 
     def drop_data(self):
         """Drop all tables created by this object."""
         with self.connection() as conn:
-            conn.cursor().execute('DROP TABLE %s; DROP TABLE %s;' %
-                                  (self.kmers_table, self.logs_table))
+            conn.cursor().execute('DROP TABLE %s;' % self.kmers_table)
+            conn.cursor().execute('DROP TABLE %s;' % self.log_table)
@@ -12,12 +12,851 @@
     >>> S, T = A.parse('TAAGCGT'), A.parse('GGCGTAA')
     >>> seed_index = SeedIndex(S, T, path=':memory:', wordlen=3, alphabet=A)
     >>> list(seed_index.seeds())
-    [(4, 2), (3, 1), (0, 4)]
+    [(0, 4), (3, 1), (4, 2)]
 """
-from itertools import chain, combinations
-from itertools import groupby, product
+import json
+import numpy as np
+from hashlib import sha1
+from itertools import groupby, islice, product
 
-from .kmers import KmerIndex, KmerDBWrapper
+from .kmers import KmerIndex, KmerDBWrapper, as_kmer_arrays, low_quality_kmers
+
+
+def _hit_sums(hits):
+    # distinct sums of one hit from each of the given arrays, in increasing
+    # order, and their multiplicities; the number of distinct sums is bounded
+    # by the total span of hits regardless of the number of combinations.
+    sums = np.zeros(1, dtype=np.int64)
+    counts = np.ones(1, dtype=np.int64)
+    for pos in hits:
+        sums = (sums[:, None] + pos[None, :]).ravel()
+        counts = np.repeat(counts, len(pos))
+        sums, inverse = np.unique(sums, return_inverse=True)
+        counts = np.bincount(inverse, weights=counts).astype(np.int64)
+    return sums, counts
+
+
+def _kmer_runs(kmers):
+    # positions of valid kmers sorted by kmer (and by position within equal
+    # kmers) and the distinct kmers, start and length of their runs.
+    kmers = np.asarray(kmers, dtype=np.int64)
+    positions = np.flatnonzero(kmers >= 0)
+    order = np.argsort(kmers[positions], kind='mergesort')
+    positions = positions[order]
+    uniq, starts, counts = np.unique(kmers[positions], return_index=True,
+                                     return_counts=True)
+    return positions, uniq, starts, counts
+
+
+def kmer_seeds(kmers_S, kmers_T=None):
+    """Finds all seeds between two kmer sequences by a sort-merge join: the
+    positions of each sequence are sorted by kmer, the runs of kmers present
+    in both are matched, and each pair of runs of lengths :math:`m, n` is
+    expanded into :math:`mn` seeds using NumPy repeat/arange arithmetic,
+    without any per-kmer Python loops. In self comparisons each run of length
+    :math:`m` directly gives the :math:`m(m+1)/2` seeds of its upper
+    triangle.
+
+    Args:
+        kmers_S (array-like): kmers of the 1st sequence in integer
+            representation with masked kmers represented by -1 (cf.
+            :func:`biseqt.kmers.as_kmer_arrays`).
+
+    Keyword Args:
+        kmers_T (array-like|None): kmers of the 2nd sequence; if not given
+            seeds of the 1st sequence with itself are found, in which case
+            only seeds with :math:`i \\le j` (i.e :math:`d \\le 0`) are
+            reported.
+
+    Returns:
+        tuple: ``(d, a)`` arrays of type ``int64`` holding the diagonal
+        coordinates of seeds, sorted by ``d`` and then by ``a``.
+    """
+    self_comp = kmers_T is None
+    pos_S, uniq_S, starts_S, counts_S = _kmer_runs(kmers_S)
+    if self_comp:
+        pos_T, starts_T, counts_T = pos_S, starts_S, counts_S
+    else:
+        pos_T, uniq_T, starts_T, counts_T = _kmer_runs(kmers_T)
+        shared = np.intersect1d(uniq_S, uniq_T, assume_unique=True)
+        in_S = np.searchsorted(uniq_S, shared)
+        in_T = np.searchsorted(uniq_T, shared)
+        starts_S, counts_S = starts_S[in_S], counts_S[in_S]
+        starts_T, counts_T = starts_T[in_T], counts_T[in_T]
+
+    if self_comp:
+        # positions are sorted within each run: the x-th position of a run
+        # of length m is paired with the m - x positions from x onwards.
+        rows = np.arange(int(counts_S.sum()), dtype=np.int64)
+        ranks = rows - np.repeat(np.cumsum(counts_S) - counts_S, counts_S)
+        rows_S = np.repeat(starts_S, counts_S) + ranks
+        row_lens = np.repeat(counts_S, counts_S) - ranks
+        total = int(row_lens.sum())
+        row_offsets = np.repeat(np.cumsum(row_lens) - row_lens, row_lens)
+        idx_S = np.repeat(rows_S, row_lens)
+        idx_T = idx_S + np.arange(total, dtype=np.int64) - row_offsets
+    else:
+        # the k-th seed of a run pair is the (k // n, k % n) pair of positions
+        num_pairs = counts_S * counts_T
+        total = int(num_pairs.sum())
+        run_offsets = np.repeat(np.cumsum(num_pairs) - num_pairs, num_pairs)
+        ranks = np.arange(total, dtype=np.int64) - run_offsets
+        run_counts_T = np.repeat(counts_T, num_pairs)
+        idx_S = np.repeat(starts_S, num_pairs) + ranks // run_counts_T
+        idx_T = np.repeat(starts_T, num_pairs) + ranks % run_counts_T
+    i, j = pos_S[idx_S], pos_T[idx_T]
+    return sort_diagonal_coordinates(i - j, i + j)
+
+
+# approximate storage costs per seed, the on-disk ones measured for random
+# sequences with SQLite's default page size.
+BYTES_PER_SEED = {
+    'sqlite': 28,    # plain table plus (d, a) index
+    'rtree': 60,     # R*Tree of points
+    'memory': 8,     # int32 (d, a) arrays
+    'indexing': 48,  # peak of int64 working arrays in kmer_seeds()
+}
+
+
+def _kmer_seed_counts(kmers_S, kmers_T=None):
+    # distinct kmers shared by S and T and the number of seeds they give; for
+    # self comparisons only seeds with i <= j are counted.
+    _, uniq_S, _, counts_S = _kmer_runs(kmers_S)
+    if kmers_T is None:
+        return uniq_S, counts_S * (counts_S + 1) // 2
+    _, uniq_T, _, counts_T = _kmer_runs(kmers_T)
+    shared = np.intersect1d(uniq_S, uniq_T, assume_unique=True)
+    counts_S = counts_S[np.searchsorted(uniq_S, shared)]
+    counts_T = counts_T[np.searchsorted(uniq_T, shared)]
+    return shared, counts_S * counts_T
+
+
+def seed_volume(kmers_S, kmers_T=None, rtree=False):
+    """Estimates, before any seeds are found, the resources needed to index
+    the seeds of two sequences from their kmer spectra: the number of seeds
+    is exactly :math:`\\sum_w c_S(w)c_T(w)` where :math:`c_S(w)` is the
+    number of occurrences of kmer :math:`w` in S. This only requires sorting
+    the kmers of each sequence.
+
+    Args:
+        kmers_S (array-like): kmers of the 1st sequence in integer
+            representation with masked kmers represented by -1 (cf.
+            :func:`biseqt.kmers.as_kmer_arrays`).
+
+    Keyword Args:
+        kmers_T (array-like|None): kmers of the 2nd sequence; if not given
+            a self comparison is assumed (cf. :func:`kmer_seeds`).
+        rtree (bool): whether the sqlite size is estimated for an R*Tree
+            seeds table (cf. :func:`create_seeds_table`); default is False.
+
+    Returns:
+        dict: with keys ``seeds`` (number of seeds), ``sqlite_bytes``
+        (approximate size of the seeds table of the sqlite backend),
+        ``memory_bytes`` (approximate size of seeds and their
+        :class:`RectangleCounter` in the memory backend) and
+        ``indexing_bytes`` (approximate peak memory used to find seeds).
+    """
+    _, counts = _kmer_seed_counts(kmers_S, kmers_T)
+    num_seeds = int(counts.sum())
+    return {
+        'seeds': num_seeds,
+        'sqlite_bytes':
+            num_seeds * BYTES_PER_SEED['rtree' if rtree else 'sqlite'],
+        'memory_bytes': num_seeds * BYTES_PER_SEED['memory'] +
+        RectangleCounter.estimate_nbytes(num_seeds),
+        'indexing_bytes': num_seeds * BYTES_PER_SEED['indexing'],
+    }
+
+
+def create_seeds_table(cursor, table, d_cols, rtree=False, runs=False):
+    """Creates a table of seeds in diagonal coordinates. By default this is a
+    plain table with one integer column per diagonal coordinate and one for
+    the antidiagonal coordinate:
+
+    .. code-block:: sql
+
+        CREATE TABLE seeds_[name] (
+          'd' INTEGER, -- diagonal position(s): d or d_1, d_2, ...
+          'a' INTEGER  -- antidiagonal position
+        );
+
+    Alternatively seeds can be stored as degenerate boxes (i.e points) in an
+    R*Tree virtual table such that counting and retrieving seeds in a
+    rectangle is a true multi-dimensional range query instead of a scan of a
+    diagonal band. The lower bound of each coordinate is named like the
+    column of the plain table such that queries work for either layout:
+
+    .. code-block:: sql
+
+        CREATE VIRTUAL TABLE seeds_[name] USING rtree_i32(
+          id, d, d_max, a, a_max
+        );
+
+    Args:
+        cursor (apsw.Cursor): cursor of the database connection.
+        table (str): name of the seeds table.
+        d_cols (list): names of diagonal coordinate columns.
+
+    Keyword Args:
+        rtree (bool): whether to create an R*Tree table; since SQLite
+            R*Trees have at most 5 dimensions this is only possible for up to
+            4 diagonal coordinates. Default is False.
+        runs (bool): whether the plain table stores runs of seeds (cf.
+            :func:`seed_runs`) in which case additional integer columns
+            ``n`` and ``a_end`` hold the length of each run and the
+            antidiagonal coordinate of its last seed, i.e :math:`a + 2(n -
+            1)`, such that runs reaching an antidiagonal band are found in
+            an index of ``a_end``; default is False.
+    """
+    cols = list(d_cols) + ['a']
+    if runs:
+        assert not rtree, 'runs of seeds cannot be stored in an R*Tree'
+        cols += ['n', 'a_end']
+    if rtree:
+        assert len(cols) <= 5, 'R*Trees have at most 5 dimensions'
+        cols = [c for col in cols for c in [col, col + '_max']]
+        cursor.execute('CREATE VIRTUAL TABLE %s USING rtree_i32(id, %s);' %
+                       (table, ', '.join(cols)))
+    else:
+        cursor.execute('CREATE TABLE %s (%s);' %
+                       (table, ', '.join("'%s' INTEGER" % col
+                                         for col in cols)))
+
+
+# version of the layout of seeds tables, recorded in their metadata; tables
+# of other versions are rebuilt.
+SEEDS_SCHEMA_VERSION = 2
+SEEDS_META_TABLE = 'seeds_meta'
+
+
+def seeds_fingerprint(index, seqs, **params):
+    """Builds the fingerprint of a seeds table, i.e all that determines its
+    contents: the full content identifiers of sequences, the word length,
+    alphabet and mask of kmers (those of the kmer cache, if any) and any
+    other parameters of seeding.
+
+    Args:
+        index (KmerDBWrapper): the seed index.
+        seqs (list): the sequences whose seeds are indexed.
+
+    Keyword Args:
+        **params: other parameters that affect seeds, must be JSON
+            serializable.
+
+    Returns:
+        str: the fingerprint as a canonical JSON string.
+    """
+    kmer_cache = getattr(index, 'kmer_cache', None)
+    mask = kmer_cache.mask if kmer_cache else index.mask
+    params.update({
+        'seqs': [seq.content_id for seq in seqs],
+        'wordlen': index.wordlen,
+        'alphabet': repr(index.alphabet),
+        'mask': sorted(sorted(letters) for letters in mask),
+        'kmer_cache': kmer_cache is not None,
+    })
+    return json.dumps(params, sort_keys=True)
+
+
+def check_seeds_table(cursor, table, fingerprint):
+    """Verifies that a seeds table exists and holds the seeds described by a
+    fingerprint (cf. :func:`seeds_fingerprint`) as recorded by
+    :func:`record_seeds_table` in the metadata table:
+
+    .. code-block:: sql
+
+        CREATE TABLE seeds_meta (
+          'seeds_table' VARCHAR PRIMARY KEY, -- name of the seeds table
+          'schema' INTEGER,                  -- layout version of the table
+          'fingerprint' VARCHAR              -- cf. seeds_fingerprint()
+        );
+
+    Tables without matching metadata, e.g tables of another schema version
+    or tables of other sequences or parameters that happen to have the same
+    name, are dropped such that databases can be safely shared as persistent
+    caches of seeds. Since tables are built in a single transaction (cf.
+    :func:`build_seeds_table`), a table being built is invisible to other
+    connections and is never dropped.
+
+    Args:
+        cursor (apsw.Cursor): cursor of the database connection.
+        table (str): name of the seeds table.
+        fingerprint (str): the expected fingerprint.
+
+    Returns:
+        bool: whether the table exists and can be reused.
+    """
+    cursor.execute("SELECT name FROM sqlite_master WHERE name IN (?, ?);",
+                   (table, SEEDS_META_TABLE))
+    names = set(row[0] for row in cursor)
+    if table not in names:
+        return False
+    if SEEDS_META_TABLE in names:
+        cursor.execute('SELECT schema, fingerprint FROM %s '
+                       'WHERE seeds_table = ?;' % SEEDS_META_TABLE, (table,))
+        for schema, recorded in cursor:
+            if schema == SEEDS_SCHEMA_VERSION and recorded == fingerprint:
+                return True
+        cursor.execute('DELETE FROM %s WHERE seeds_table = ?;' %
+                       SEEDS_META_TABLE, (table,))
+    cursor.execute('DROP TABLE %s;' % table)
+    return False
+
+
+def record_seeds_table(cursor, table, fingerprint):
+    """Records the metadata of a fully indexed seeds table, cf.
+    :func:`check_seeds_table`.
+
+    Args:
+        cursor (apsw.Cursor): cursor of the database connection.
+        table (str): name of the seeds table.
+        fingerprint (str): fingerprint of the table, cf.
+            :func:`seeds_fingerprint`.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS %s (
+          'seeds_table' VARCHAR PRIMARY KEY,
+          'schema' INTEGER,
+          'fingerprint' VARCHAR
+        );
+    """ % SEEDS_META_TABLE)
+    cursor.execute('INSERT OR REPLACE INTO %s VALUES (?, ?, ?);' %
+                   SEEDS_META_TABLE, (table, SEEDS_SCHEMA_VERSION,
+                                      fingerprint))
+
+
+def build_seeds_table(conn, table, fingerprint, build):
+    """Creates, fills and records a seeds table (cf.
+    :func:`create_seeds_table` and :func:`record_seeds_table`) in a single
+    transaction such that other connections either see the complete table
+    or none at all. The transaction takes the write lock upfront and the
+    table is checked again under the lock (cf. :func:`check_seeds_table`)
+    such that concurrent builders of the same table wait for one another
+    and only the first one builds it. If building fails the transaction is
+    rolled back and no trace of the table is left.
+
+    Args:
+        conn (apsw.Connection): the database connection, not in a
+            transaction.
+        table (str): name of the seeds table.
+        fingerprint (str): fingerprint of the table, cf.
+            :func:`seeds_fingerprint`.
+        build (callable): given a cursor, creates and fills the table.
+
+    Returns:
+        bool: whether the table was built, False if it was already built by
+        another connection.
+    """
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE;')
+    try:
+        built = not check_seeds_table(cursor, table, fingerprint)
+        if built:
+            build(cursor)
+            record_seeds_table(cursor, table, fingerprint)
+    except BaseException:
+        cursor.execute('ROLLBACK;')
+        raise
+    cursor.execute('COMMIT;')
+    return built
+
+
+def sort_diagonal_coordinates(d, a):
+    """Sorts seeds in diagonal coordinates by diagonal and then by
+    antidiagonal. Both coordinates are packed in a single integer key which
+    is sorted in place; this is much faster than a lexicographic sort.
+
+    Args:
+        d (numpy.ndarray): diagonal coordinates of seeds.
+        a (numpy.ndarray): antidiagonal coordinates of seeds.
+
+    Returns:
+        tuple: sorted ``(d, a)`` arrays of type ``int64``.
+    """
+    d, a = np.asarray(d, dtype=np.int64), np.asarray(a, dtype=np.int64)
+    if not len(d):
+        return d, a
+    d_min, a_max = d.min(), a.max()
+    keys = (d - d_min) * (a_max + 1) + a
+    keys.sort()
+    return keys // (a_max + 1) + d_min, keys % (a_max + 1)
+
+
+def seed_runs(d, a):
+    """Compresses seeds in diagonal coordinates into maximal runs of
+    consecutive seeds on the same diagonal. A long exact match of length
+    :math:`L` gives :math:`L - w + 1` overlapping seeds whose antidiagonal
+    coordinates increase by 2, which are represented by a single
+    ``(d, a, n)`` record: the diagonal, the antidiagonal coordinate of the
+    first seed and the number of seeds in the run.
+
+    Args:
+        d (numpy.ndarray): diagonal coordinates of seeds.
+        a (numpy.ndarray): antidiagonal coordinates of seeds, sorted by ``d``
+            and then by ``a`` (cf. :func:`sort_diagonal_coordinates`).
+
+    Returns:
+        tuple: ``(d, a, n)`` arrays of type ``int64`` sorted like the seeds.
+    """
+    d, a = np.asarray(d, dtype=np.int64), np.asarray(a, dtype=np.int64)
+    # a seed starts a run unless it follows its predecessor on a diagonal
+    starts = np.ones(len(d), dtype=bool)
+    starts[1:] = (d[1:] != d[:-1]) | (a[1:] != a[:-1] + 2)
+    starts = np.flatnonzero(starts)
+    n = np.diff(np.append(starts, len(d)))
+    return d[starts], a[starts], n
+
+
+def expand_seed_runs(d, a, n):
+    """Expands runs of seeds to the seeds they contain, the inverse of
+    :func:`seed_runs`.
+
+    Args:
+        d (numpy.ndarray): diagonal coordinates of runs.
+        a (numpy.ndarray): antidiagonal coordinates of the first seed of
+            runs.
+        n (numpy.ndarray): number of seeds in each run.
+
+    Returns:
+        tuple: ``(d, a)`` arrays of type ``int64``.
+    """
+    d, a = np.asarray(d, dtype=np.int64), np.asarray(a, dtype=np.int64)
+    n = np.asarray(n, dtype=np.int64)
+    offsets = np.repeat(np.cumsum(n) - n, n)
+    ranks = np.arange(int(n.sum()), dtype=np.int64) - offsets
+    return np.repeat(d, n), np.repeat(a, n) + 2 * ranks
+
+
+def split_seed_runs(d, a, n, max_len):
+    """Splits runs of seeds into consecutive pieces of at most the given
+    number of seeds.
+
+    Args:
+        d (numpy.ndarray): diagonal coordinates of runs.
+        a (numpy.ndarray): antidiagonal coordinates of the first seed of
+            runs.
+        n (numpy.ndarray): number of seeds in each run.
+        max_len (int): maximum number of seeds in each piece.
+
+    Returns:
+        tuple: ``(d, a, n)`` arrays of type ``int64`` of pieces.
+    """
+    assert max_len > 0, 'pieces must have at least one seed'
+    d, a = np.asarray(d, dtype=np.int64), np.asarray(a, dtype=np.int64)
+    n = np.asarray(n, dtype=np.int64)
+    pieces = (n + max_len - 1) // max_len
+    offsets = np.repeat(np.cumsum(pieces) - pieces, pieces)
+    ranks = np.arange(int(pieces.sum()), dtype=np.int64) - offsets
+    lens = np.minimum(max_len, np.repeat(n, pieces) - ranks * max_len)
+    return (np.repeat(d, pieces), np.repeat(a, pieces) + 2 * max_len * ranks,
+            lens)
+
+
+def run_seed_counts(a, n, a_min, a_max):
+    """Counts the seeds of runs of seeds (cf. :func:`seed_runs`) in an
+    antidiagonal band, i.e the number of :math:`0 \\le k < n` with
+    :math:`a_{\\min} \\le a + 2k \\le a_{\\max}` for each run.
+
+    Args:
+        a (numpy.ndarray): antidiagonal coordinates of the first seed of
+            runs.
+        n (numpy.ndarray): number of seeds in each run.
+        a_min (int|numpy.ndarray): lower bound(s) of the band.
+        a_max (int|numpy.ndarray): upper bound(s) of the band.
+
+    Returns:
+        numpy.ndarray: number of seeds of each run in the band.
+    """
+    a = np.asarray(a, dtype=np.int64)
+    k_min = np.maximum(0, -((a - a_min) // 2))
+    k_max = np.minimum(np.asarray(n, dtype=np.int64) - 1, (a_max - a) // 2)
+    return np.maximum(k_max - k_min + 1, 0)
+
+
+class RectangleCounter(object):
+    """A static merge-sort tree over seeds in diagonal coordinates which
+    counts the seeds in any rectangle :math:`[d_{\\min}, d_{\\max}] \\times
+    [a_{\\min}, a_{\\max}]` in polylogarithmic time.
+
+    Seeds are sorted by diagonal such that the diagonal band of a rectangle
+    is a contiguous range of seeds, found by binary search. The antidiagonal
+    coordinates of seeds are then stored at several levels: at level
+    :math:`k` consecutive blocks of :math:`b2^k` seeds are each sorted
+    (:math:`b` being the leaf size). A range of seeds decomposes into at
+    most two partial leaf blocks, which are scanned, and :math:`O(\\log n)`
+    whole blocks at various levels in each of which the number of seeds in
+    the antidiagonal band is found by binary search.
+
+    Attributes:
+        d (numpy.ndarray): sorted diagonal coordinates of seeds.
+        levels (list): the antidiagonal coordinates of seeds at each level as
+            ``int32`` arrays, padded to a power of two multiple of the leaf
+            size; level 0 is sorted within leaf blocks.
+        leaf_size (int): number of seeds in each leaf block.
+    """
+    _PAD = np.iinfo(np.int32).max
+
+    def __init__(self, d, a, leaf_size=64):
+        d, a = np.asarray(d), np.asarray(a)
+        assert len(d) == len(a)
+        assert np.all(d[1:] >= d[:-1]), 'seeds must be sorted by diagonal'
+        self.d = d
+        self.leaf_size = leaf_size
+        num_blocks = 1
+        while num_blocks * leaf_size < len(a):
+            num_blocks *= 2
+        self._a = np.full(num_blocks * leaf_size, self._PAD, dtype=np.int32)
+        self._a[:len(a)] = a
+        self.levels = []
+        block_size = leaf_size
+        while block_size <= len(self._a):
+            level = self._a.reshape(-1, block_size).copy()
+            level.sort(axis=1)
+            self.levels.append(level.ravel())
+            block_size *= 2
+
+    @staticmethod
+    def estimate_nbytes(num_seeds, leaf_size=64):
+        """Computes :attr:`nbytes` of a counter without building it.
+
+        Args:
+            num_seeds (int): number of seeds.
+
+        Keyword Args:
+            leaf_size (int): as in :class:`RectangleCounter`; default is 64.
+
+        Returns:
+            int: number of bytes.
+        """
+        num_blocks = 1
+        while num_blocks * leaf_size < num_seeds:
+            num_blocks *= 2
+        num_levels = int(np.log2(num_blocks)) + 1
+        return 4 * num_blocks * leaf_size * (1 + num_levels)
+
+    @property
+    def nbytes(self):
+        """Number of bytes used by the counter on top of the diagonal
+        coordinates of seeds it is given."""
+        return self._a.nbytes + sum(level.nbytes for level in self.levels)
+
+    @classmethod
+    def from_seeds(cls, seeds, **kw):
+        """Builds a counter for seeds in standard coordinates.
+
+        Args:
+            seeds (iterable): seeds as :math:`(i, j)` tuples.
+
+        Returns:
+            RectangleCounter
+        """
+        seeds = np.array(list(seeds), dtype=np.int64).reshape(-1, 2)
+        d, a = sort_diagonal_coordinates(seeds[:, 0] - seeds[:, 1],
+                                         seeds[:, 0] + seeds[:, 1])
+        return cls(d, a, **kw)
+
+    def __len__(self):
+        return len(self.d)
+
+    def _block_count(self, level, block, a_min, a_max):
+        size = self.leaf_size << level
+        values = self.levels[level][block * size: (block + 1) * size]
+        return int(np.searchsorted(values, a_max, side='right') -
+                   np.searchsorted(values, a_min, side='left'))
+
+    def _block_counts(self, level, blocks, a_min, a_max):
+        # number of antidiagonals in [a_min, a_max] in each of the given
+        # blocks of a level, by a binary search vectorized across blocks.
+        size = self.leaf_size << level
+        values = self.levels[level]
+
+        def _search(targets, side):
+            lo, hi = blocks * size, (blocks + 1) * size
+            while True:
+                active = lo < hi
+                if not active.any():
+                    return lo
+                mid = (lo + hi) // 2
+                pivot = values[np.where(active, mid, 0)]
+                if side == 'left':
+                    right = active & (pivot < targets)
+                else:
+                    right = active & (pivot <= targets)
+                lo = np.where(right, mid + 1, lo)
+                hi = np.where(active & ~right, mid, hi)
+
+        return _search(a_max, 'right') - _search(a_min, 'left')
+
+    def _scan(self, lo, hi, a_min, a_max):
+        # number of antidiagonals in [a_min, a_max] in each range of seeds
+        # [lo, hi); ranges must be shorter than two leaf blocks.
+        offsets = np.arange(2 * self.leaf_size)
+        idx = np.minimum(lo[:, None] + offsets, len(self._a) - 1)
+        values = self._a[idx]
+        hits = (offsets < (hi - lo)[:, None]) & \
+            (values >= a_min[:, None]) & (values <= a_max[:, None])
+        return np.count_nonzero(hits, axis=1)
+
+    def count(self, d_band=None, a_band=None):
+        """Counts the seeds within a rectangle.
+
+        Keyword Args:
+            d_band (tuple|None): :math:`(d_{\\min}, d_{\\max})`, inclusive;
+                default is all diagonals.
+            a_band (tuple|None): :math:`(a_{\\min}, a_{\\max})`, inclusive;
+                default is all antidiagonals.
+
+        Returns:
+            int: Number of seeds in the rectangle.
+        """
+        start, end = 0, len(self.d)
+        if d_band is not None:
+            start = int(np.searchsorted(self.d, d_band[0], side='left'))
+            end = int(np.searchsorted(self.d, d_band[1], side='right'))
+        if a_band is None or start >= end:
+            return max(end - start, 0)
+        a_min, a_max = a_band
+
+        def _scan(lo, hi):
+            values = self._a[lo:hi]
+            return int(np.count_nonzero((values >= a_min) &
+                                        (values <= a_max)))
+
+        leaf = self.leaf_size
+        first, last = -(-start // leaf), end // leaf  # whole leaf blocks
+        if first >= last:
+            return _scan(start, end)
+        cnt = _scan(start, first * leaf) + _scan(last * leaf, end)
+        level = 0
+        while first < last:
+            if first % 2:
+                cnt += self._block_count(level, first, a_min, a_max)
+                first += 1
+            if last % 2:
+                last -= 1
+                cnt += self._block_count(level, last, a_min, a_max)
+            first, last, level = first // 2, last // 2, level + 1
+        return cnt
+
+    def count_many(self, d_bands=None, a_bands=None, num=None):
+        """Counts the seeds within many rectangles at once. All rectangles
+        are processed together in a constant number of vectorized passes per
+        level of the tree.
+
+        Keyword Args:
+            d_bands (array|None): :math:`(d_{\\min}, d_{\\max})` rows,
+                inclusive; default is all diagonals for all rectangles.
+            a_bands (array|None): :math:`(a_{\\min}, a_{\\max})` rows,
+                inclusive; default is all antidiagonals for all rectangles.
+            num (int|None): number of rectangles, only needed if neither
+                band is given.
+
+        Returns:
+            numpy.ndarray: Number of seeds in each rectangle.
+        """
+        if d_bands is not None:
+            d_bands = np.asarray(d_bands).reshape(-1, 2)
+            num = len(d_bands)
+        if a_bands is not None:
+            a_bands = np.asarray(a_bands).reshape(-1, 2)
+            assert num is None or num == len(a_bands), \
+                'need as many antidiagonal bands as diagonal bands'
+            num = len(a_bands)
+        assert num is not None, 'number of rectangles unknown'
+
+        if d_bands is None:
+            start = np.zeros(num, dtype=np.int64)
+            end = np.full(num, len(self.d), dtype=np.int64)
+        else:
+            start = np.searchsorted(self.d, d_bands[:, 0], side='left')
+            end = np.searchsorted(self.d, d_bands[:, 1], side='right')
+            end = np.maximum(start, end)
+        if a_bands is None:
+            return end - start
+        a_min, a_max = a_bands[:, 0], a_bands[:, 1]
+
+        leaf = self.leaf_size
+        first, last = -(-start // leaf), end // leaf  # whole leaf blocks
+        # ranges without whole leaf blocks are scanned in full
+        short = first >= last
+        head_end = np.where(short, end, first * leaf)
+        tail_start = np.where(short, end, last * leaf)
+        last = np.where(short, first, last)
+        cnt = self._scan(start, head_end, a_min, a_max) + \
+            self._scan(tail_start, end, a_min, a_max)
+        level = 0
+        while np.any(first < last):
+            active = first < last
+            take = active & (first % 2 == 1)
+            cnt[take] += self._block_counts(level, first[take],
+                                            a_min[take], a_max[take])
+            first[take] += 1
+            take = active & (last % 2 == 1)
+            last[take] -= 1
+            cnt[take] += self._block_counts(level, last[take],
+                                            a_min[take], a_max[take])
+            first, last, level = first // 2, last // 2, level + 1
+        return cnt
+
+
+class RunCounter(object):
+    """Counts the seeds of runs of seeds (cf. :func:`seed_runs`) in many
+    rectangles :math:`[d_{\\min}, d_{\\max}] \\times [a_{\\min}, a_{\\max}]`
+    at once without expanding runs.
+
+    Runs are sorted by diagonal such that the diagonal band of a rectangle
+    is a contiguous range of runs, found by binary search, which decomposes
+    into at most two partial blocks, scanned with :func:`run_seed_counts`,
+    and whole blocks of :math:`b` runs. The number of seeds no larger than
+    :math:`x` of a run whose first and last seeds are :math:`a` and
+    :math:`e` (which have the same parity) is
+
+    .. math::
+        f(x) = [a \\le x]\\left(\\left\\lfloor\\frac{x - a}{2}
+            \\right\\rfloor + 1\\right) - [e \\le x]\\left\\lfloor\\frac{x -
+            e}{2}\\right\\rfloor
+
+    and in each whole block, where first and last seeds of runs are each
+    sorted, :math:`\\sum f(x)` follows by binary search from prefix sums of
+    :math:`a` and :math:`e` and of their parities. The seeds in an
+    antidiagonal band are :math:`f(a_{\\max}) - f(a_{\\min} - 1)`.
+
+    Attributes:
+        d (numpy.ndarray): sorted diagonal coordinates of runs.
+        a (numpy.ndarray): antidiagonal coordinates of the first seed of
+            runs.
+        n (numpy.ndarray): number of seeds in each run.
+        block_size (int): number of runs in each block.
+    """
+    def __init__(self, d, a, n, block_size=256):
+        d, a, n = np.asarray(d), np.asarray(a), np.asarray(n)
+        assert len(d) == len(a) == len(n)
+        assert np.all(d[1:] >= d[:-1]), 'runs must be sorted by diagonal'
+        self.d, self.a, self.n = d, a, n
+        self.block_size = block_size
+        a = a.astype(np.int64)
+        e = a + 2 * (n.astype(np.int64) - 1)
+        # keys of each block are offset by a multiple of a stride larger than
+        # all keys such that all blocks are searched in a single array
+        self._stride = int(e.max()) + 2 if len(e) else 2
+        self._a_min = int(a.min()) if len(a) else 0
+        self._sums = [self._block_sums(keys) for keys in (a, e)]
+
+    def _block_sums(self, keys):
+        # keys sorted within blocks and offset by block, and prefix sums of
+        # the sorted keys and of their parities
+        blocks = np.arange(len(keys), dtype=np.int64) // self.block_size
+        keys = keys[np.lexsort((keys, blocks))]
+        offset = blocks * self._stride + keys + 1
+        cumsum = np.concatenate([[0], np.cumsum(keys)])
+        odd = np.concatenate([[0], np.cumsum(keys & 1)]).astype(np.int32)
+        return offset, cumsum, odd
+
+    @staticmethod
+    def estimate_nbytes(num_runs):
+        """Computes :attr:`nbytes` of a counter without building it.
+
+        Args:
+            num_runs (int): number of runs.
+
+        Returns:
+            int: number of bytes.
+        """
+        return 2 * (8 * num_runs + 12 * (num_runs + 1))
+
+    @property
+    def nbytes(self):
+        """Number of bytes used by the counter on top of the runs it is
+        given."""
+        return sum(arr.nbytes for sums in self._sums for arr in sums)
+
+    def __len__(self):
+        return len(self.d)
+
+    def _below(self, blocks, x):
+        # sum of f(x) over runs in each of the given whole blocks
+        base = blocks * self.block_size
+        target = blocks * self._stride + np.clip(x, -1, self._stride - 2) + 1
+        total = np.zeros(len(blocks), dtype=np.int64)
+        for sign, (offset, cumsum, odd) in zip([1, -1], self._sums):
+            pos = np.searchsorted(offset, target, side='right')
+            cnt = pos - base
+            num_odd = odd[pos] - odd[base]
+            # number of keys whose difference with x is odd
+            parity = np.where(x & 1, cnt - num_odd, num_odd)
+            halves = (cnt * x - (cumsum[pos] - cumsum[base]) - parity) // 2
+            total += sign * halves
+            if sign > 0:
+                total += cnt
+        return total
+
+    def _scan(self, lo, hi, a_min, a_max):
+        # number of seeds in [a_min, a_max] in each range of runs [lo, hi);
+        # ranges must be shorter than two blocks.
+        offsets = np.arange(2 * self.block_size)
+        idx = np.minimum(lo[:, None] + offsets, len(self.a) - 1)
+        counts = run_seed_counts(self.a[idx], self.n[idx], a_min[:, None],
+                                 a_max[:, None])
+        return np.sum(counts * (offsets < (hi - lo)[:, None]), axis=1)
+
+    def count_many(self, d_bands=None, a_bands=None, num=None):
+        """Counts the seeds within many rectangles at once, cf.
+        :func:`RectangleCounter.count_many`.
+
+        Keyword Args:
+            d_bands (array|None): :math:`(d_{\\min}, d_{\\max})` rows,
+                inclusive; default is all diagonals for all rectangles.
+            a_bands (array|None): :math:`(a_{\\min}, a_{\\max})` rows,
+                inclusive; default is all antidiagonals for all rectangles.
+            num (int|None): number of rectangles, only needed if neither
+                band is given.
+
+        Returns:
+            numpy.ndarray: Number of seeds in each rectangle.
+        """
+        if d_bands is not None:
+            d_bands = np.asarray(d_bands).reshape(-1, 2)
+            num = len(d_bands)
+        if a_bands is not None:
+            a_bands = np.asarray(a_bands, dtype=np.int64).reshape(-1, 2)
+            assert num is None or num == len(a_bands), \
+                'need as many antidiagonal bands as diagonal bands'
+            num = len(a_bands)
+        assert num is not None, 'number of rectangles unknown'
+        if not len(self.d):
+            return np.zeros(num, dtype=np.int64)
+        if a_bands is None:
+            a_bands = np.array([[self._a_min, self._stride]] * num,
+                               dtype=np.int64)
+
+        if d_bands is None:
+            start = np.zeros(num, dtype=np.int64)
+            end = np.full(num, len(self.d), dtype=np.int64)
+        else:
+            start = np.searchsorted(self.d, d_bands[:, 0], side='left')
+            end = np.searchsorted(self.d, d_bands[:, 1], side='right')
+            end = np.maximum(start, end)
+        a_min, a_max = a_bands[:, 0], a_bands[:, 1]
+
+        size = self.block_size
+        first, last = -(-start // size), end // size  # whole blocks
+        # ranges without whole blocks are scanned in full
+        short = first >= last
+        head_end = np.where(short, end, first * size)
+        tail_start = np.where(short, end, last * size)
+        cnt = self._scan(start, head_end, a_min, a_max) + \
+            self._scan(tail_start, end, a_min, a_max)
+
+        num_blocks = np.where(short, 0, last - first)
+        rects = np.repeat(np.arange(num), num_blocks)
+        blocks = np.arange(len(rects), dtype=np.int64) - \
+            np.repeat(np.cumsum(num_blocks) - num_blocks, num_blocks) + \
+            first[rects]
+        in_blocks = self._below(blocks, a_max[rects]) - \
+            self._below(blocks, a_min[rects] - 1)
+        cnt += np.bincount(rects, weights=in_blocks,
+                           minlength=num).astype(np.int64)
+        return cnt
 
 
 class SeedIndex(KmerDBWrapper):
@@ -28,14 +867,103 @@ class SeedIndex(KmerDBWrapper):
         T (biseqt.sequence.Sequence): The 2nd sequence.
         cache (KmerCache): optional :class:`KmerCache` object to use for
             retrieving integer representations of sequences.
+        max_mismatches (int): If positive, seeds are pairs of kmers within
+            this Hamming distance of one another instead of exactly matching
+            kmers (cf. :func:`biseqt.kmers.KmerIndex.hits_within`); default
+            is 0.
+        quals (tuple|None): If specified, per-base quality scores of S and T
+            used to skip low quality kmers (cf. :attr:`min_qual`).
+        min_qual (int|None): Minimum quality of all bases in a seed, only
+            used if ``quals`` are specified; default is None.
+        backend (str): Where seeds are stored: ``sqlite`` for a table in the
+            database at :attr:`path`, ``memory`` for NumPy arrays of
+            diagonal coordinates sorted by diagonal, or ``auto`` to use
+            memory unless the seeds and their :class:`RectangleCounter` need
+            more than :attr:`allowed_memory` (or the seeds are already
+            stored in the database); default is ``sqlite``. After
+            initialization this is either ``sqlite`` or ``memory``.
+        allowed_memory (int|float): allocatable memory in GB for the seeds
+            kept in memory by the ``auto`` backend; default is 1.
+        rtree (bool): Whether the seeds table of the sqlite backend is an
+            R*Tree of points (cf. :func:`create_seeds_table`) such that
+            counts in rectangles are 2D range queries; default is False.
+        max_seeds (int|None): If specified, the number of seeds is estimated
+            before indexing (cf. :func:`seed_volume`) and if it exceeds this
+            budget either a ``MemoryError`` is raised or the most repetitive
+            kmers are masked, cf. :attr:`on_excess`; default is None.
+        on_excess (str): Either ``raise`` or ``mask``, the action taken when
+            there would be more than :attr:`max_seeds` seeds. Masking drops
+            as few kmers as possible, those giving the most seeds first, and
+            is not supported with mismatches for which the estimate (from
+            exactly matching kmers) is only a lower bound; default is
+            ``raise``.
+        runs (bool): Whether maximal runs of consecutive seeds on the same
+            diagonal, i.e maximal exact matches, are stored as single
+            ``(d, a, n)`` records (cf. :func:`seed_runs`) instead of one
+            record per seed. Seeds are expanded on retrieval and counted
+            analytically from runs; this reduces the size of the index by
+            orders of magnitude for highly similar sequences. Not supported
+            with :attr:`rtree`; default is False.
+        both_strands (bool): Whether seeds of S and the reverse complement of
+            T are also indexed, cf. :attr:`reverse`; default is False.
+        complement (list|dict): Letter mappings giving the complement of
+            letters, cf. :func:`biseqt.sequence.Alphabet.transform`; only
+            used if :attr:`both_strands` is True, default is the complement
+            of DNA letters.
+        reverse (SeedIndex|None): If :attr:`both_strands` is True, the index
+            of the same type and parameters for S and the reverse complement
+            of T (and hence seeds of the reverse strand in the diagonal
+            coordinates of S and the reverse complement of T). Unless seeds
+            are already indexed, its seeds are found in the same join of
+            kmers as the seeds of this index, cf. :func:`kmer_seeds`.
     """
-    def __init__(self, S, T, kmer_cache=None, **kw):
+    def __init__(self, S, T, kmer_cache=None, max_mismatches=0, quals=None,
+                 min_qual=None, backend='sqlite', allowed_memory=1,
+                 rtree=False, max_seeds=None, on_excess='raise', runs=False,
+                 both_strands=False, complement=['AT', 'CG'], _seeds=None,
+                 **kw):
+        assert backend in ['sqlite', 'memory', 'auto'], \
+            'unknown seed backend %s' % backend
+        assert on_excess in ['raise', 'mask'], \
+            'unknown action for excess seeds %s' % on_excess
+        assert on_excess == 'raise' or not max_mismatches, \
+            'cannot mask kmers for seeds with mismatches'
+        assert not (runs and rtree), \
+            'runs of seeds cannot be stored in an R*Tree'
         name = '%s_%s' % (S.content_id[:8], T.content_id[:8])
+        if max_mismatches:
+            name += '_m%d' % max_mismatches
+        if quals is not None and min_qual is not None:
+            assert len(quals) == 2, 'need quality scores for S and T'
+            name += '_q%d' % min_qual
+        if rtree:
+            name += '_rt'
+        if max_seeds is not None and on_excess == 'mask':
+            name += '_s%d' % max_seeds
+        if runs:
+            name += '_mem'
         super(SeedIndex, self).__init__(name=name, **kw)
+        self.rtree, self.runs = rtree, runs
         self.kmer_cache = kmer_cache
+        self.max_mismatches = max_mismatches
+        self.quals, self.min_qual = quals, min_qual
         self.self_comp = S == T
         self.S, self.T = S, T
-        if self._table_exists():
+        assert allowed_memory > 0, 'allowed memory must be positive'
+        self.backend, self.allowed_memory = backend, allowed_memory
+        self.max_seeds, self.on_excess = max_seeds, on_excess
+        self._d = self._a = None  # seed arrays of the memory backend
+        self._n = None  # run lengths of the memory backend, cf. runs
+        self._diag_cumsum = None  # prefix sums of seeds on diagonals
+        self._counter = None  # RectangleCounter (or RunCounter) of memory
+        self.both_strands, self.complement = both_strands, complement
+        self._T_rc = T.reverse().transform(mappings=complement) \
+            if both_strands else None
+        # seeds given by the index of the other strand, and seeds of the
+        # reverse strand found along with ours, cf. reverse.
+        self._given_seeds, self._reverse_seeds = _seeds, None
+        if backend != 'memory' and self._table_exists():
+            self.backend = 'sqlite'
             self.log('seeds for %s and %s already indexed, skipping' %
                      (S.content_id[:8], T.content_id[:8]))
         else:
@@ -45,6 +973,19 @@ class SeedIndex(KmerDBWrapper):
             self.log('Indexed seeds for %s (%d) and %s (%d).' %
                      (S.content_id[:8], len(S), T.content_id[:8], len(T)))
 
+        self.reverse = None
+        if both_strands:
+            strand_kw = dict(kw, kmer_cache=kmer_cache,
+                             max_mismatches=max_mismatches, min_qual=min_qual,
+                             backend=backend,
+                             allowed_memory=allowed_memory, rtree=rtree,
+                             max_seeds=max_seeds, on_excess=on_excess,
+                             runs=runs, _seeds=self._reverse_seeds)
+            if quals is not None:
+                strand_kw['quals'] = (quals[0], quals[1][::-1])
+            self._reverse_seeds = None
+            self.reverse = self._reverse_strand_index(self._T_rc, **strand_kw)
+
     @property
     def seeds_table(self):
         """The seeds table name ``seeds_[name]``, cf.
@@ -101,65 +1042,351 @@ class SeedIndex(KmerDBWrapper):
         # end overflows cannot be fixed without sequence lenghts
         return (i_start, i_end), (j_start, j_end)
 
+    def _fingerprint(self):
+        # all that determines the seeds, cf. seeds_fingerprint()
+        params = {'max_mismatches': self.max_mismatches, 'rtree': self.rtree,
+                  'runs': self.runs}
+        if self.quals is not None and self.min_qual is not None:
+            params['min_qual'] = self.min_qual
+            params['quals'] = [
+                sha1(np.asarray(quals, dtype=np.int64).tostring()).hexdigest()
+                for quals in self.quals
+            ]
+        if self.max_seeds is not None and self.on_excess == 'mask':
+            params['max_seeds'] = self.max_seeds
+        return seeds_fingerprint(self, [self.S, self.T], **params)
+
     def _table_exists(self):
+        # whether seeds are already indexed with the same parameters, stale
+        # tables are dropped, cf. check_seeds_table().
         with self.connection() as conn:
-            q = """
-                SELECT name FROM sqlite_master
-                WHERE type='table' AND name='%s';
-            """ % self.seeds_table
-            cursor = conn.cursor()
-            cursor.execute(q)
-            for name in cursor:
-                return True
-        return False
+            return check_seeds_table(conn.cursor(), self.seeds_table,
+                                     self._fingerprint())
+
+    def _reverse_strand_index(self, T, **kw):
+        # the index of S against the reverse complement of T, cf. reverse
+        return SeedIndex(self.S, T, **kw)
+
+    def _both_strand_seeds(self, kmers_S, kmers_T, quals_T):
+        # seeds of both strands in one join of kmers of S against kmers of T
+        # followed by those of its reverse complement; kmer positions beyond
+        # T are positions in its reverse complement.
+        quals_rc = None if quals_T is None else quals_T[::-1]
+        kmers_rc = self._kmer_array(self._T_rc, quals_rc)
+        if self.self_comp:
+            # seeds of self comparisons are found in a join of their own
+            return kmer_seeds(kmers_S), kmer_seeds(kmers_S, kmers_rc)
+        num_kmers = len(kmers_T)
+        ds, as_ = kmer_seeds(kmers_S, np.concatenate([kmers_T, kmers_rc]))
+        rc = (as_ - ds) // 2 >= num_kmers
+        self.log('found %d forward and %d reverse strand seeds' %
+                 (len(ds) - rc.sum(), rc.sum()))
+        # j -> j - num_kmers, sort order is preserved
+        return (ds[~rc], as_[~rc]), (ds[rc] + num_kmers, as_[rc] - num_kmers)
 
     # idempotent operation
     def _index_seeds(self):
-        with self.connection() as conn:
-            conn.cursor().execute("""
-                CREATE TABLE %s (
-                  'd' INTEGER,     -- zero-adjusted diagonal position
-                  'a'  INTEGER      -- antidiagonal position
-                );
-            """ % self.seeds_table)
+        quals_S, quals_T = self.quals if self.quals is not None else \
+            (None, None)
+        self.log('Indexing seeds for %s.' % self.name)
+        if self._given_seeds is not None:
+            # seeds were found by the index of the other strand
+            (ds, as_), self._given_seeds = self._given_seeds, None
+        else:
+            if not self.max_mismatches or self.max_seeds is not None:
+                kmers_S = self._kmer_array(self.S, quals_S)
+                kmers_T = None if self.self_comp else \
+                    self._kmer_array(self.T, quals_T)
+            if self.max_seeds is not None:
+                kmers_S, kmers_T = self._limit_seeds(kmers_S, kmers_T)
+            if self.max_mismatches:
+                ds, as_ = self._mismatch_seeds(quals_S, quals_T)
+            # the reverse strand of a palindrome S is a self comparison
+            elif self.both_strands and self.max_seeds is None and \
+                    not self._T_rc == self.S:
+                (ds, as_), self._reverse_seeds = \
+                    self._both_strand_seeds(kmers_S, kmers_T, quals_T)
+            else:
+                ds, as_ = kmer_seeds(kmers_S, kmers_T)
+        if self.runs:
+            num_seeds = len(ds)
+            ds, as_, ns = seed_runs(ds, as_)
+            self.log('compressed %d seeds into %d runs' % (num_seeds, len(ds)))
+        self._diag_cumsum = self._cumsum_diagonals(
+            ds, ns if self.runs else None)
+
+        if self.backend == 'auto':
+            # runs need lengths and are counted by a RunCounter
+            memory_bytes = BYTES_PER_SEED['memory'] * len(ds)
+            memory_bytes += 4 * len(ds) + RunCounter.estimate_nbytes(len(ds)) \
+                if self.runs else RectangleCounter.estimate_nbytes(len(ds))
+            self.backend = 'memory' \
+                if memory_bytes <= self.allowed_memory * 2 ** 30 else 'sqlite'
+            self.log('storing %d seeds in %s' % (len(ds), self.backend))
+        if self.backend == 'memory':
+            self._d, self._a = ds.astype(np.int32), as_.astype(np.int32)
+            if self.runs:
+                self._n = ns.astype(np.int32)
+            return
+
+        def _build(cursor):
+            create_seeds_table(cursor, self.seeds_table, ['d'],
+                               rtree=self.rtree, runs=self.runs)
+            if self.runs:
+                self._insert_seeds(cursor, zip(
+                    ds.tolist(), as_.tolist(), ns.tolist(),
+                    (as_ + 2 * (ns - 1)).tolist()))
+            else:
+                self._insert_seeds(cursor, zip(ds.tolist(), as_.tolist()))
+
+        if not build_seeds_table(self.connection(), self.seeds_table,
+                                 self._fingerprint(), _build):
+            self.log('seeds for %s and %s indexed concurrently, skipping' %
+                     (self.S.content_id[:8], self.T.content_id[:8]))
 
+    def _limit_seeds(self, kmers_S, kmers_T):
+        # fails fast, or masks the most repetitive kmers, if there would be
+        # more than max_seeds seeds.
+        volume = seed_volume(kmers_S, kmers_T, rtree=self.rtree)
+        self.log('expecting %d seeds (%.1f MB in sqlite, %.1f MB in memory)' %
+                 (volume['seeds'], volume['sqlite_bytes'] / 2. ** 20,
+                  volume['memory_bytes'] / 2. ** 20))
+        excess = volume['seeds'] - self.max_seeds
+        if excess <= 0:
+            return kmers_S, kmers_T
+        if self.on_excess == 'raise':
+            msg = 'too many seeds (max = %d) ' % self.max_seeds
+            msg += 'for %s and %s ' % (self.S.content_id[:8],
+                                       self.T.content_id[:8])
+            msg += '(%d expected)' % volume['seeds']
+            raise MemoryError(msg)
+
+        kmers, counts = _kmer_seed_counts(kmers_S, kmers_T)
+        order = np.argsort(counts, kind='mergesort')[::-1]
+        num_masked = np.searchsorted(np.cumsum(counts[order]), excess) + 1
+        masked = kmers[order[:num_masked]]
+        self.log('masking %d most repetitive kmers to drop %d seeds' %
+                 (num_masked, excess))
+        kmers_S = np.where(np.in1d(kmers_S, masked), -1, kmers_S)
+        if kmers_T is not None:
+            kmers_T = np.where(np.in1d(kmers_T, masked), -1, kmers_T)
+        return kmers_S, kmers_T
+
+    def _mismatch_seeds(self, quals_S, quals_T):
         kmer_index_name = '%d_%s' % (self.wordlen, self.name)
         kmer_index = KmerIndex(path=self.path, name=kmer_index_name,
                                wordlen=self.wordlen, alphabet=self.alphabet,
                                log_level=self.log_level, mask=self.mask,
-                               kmer_cache=self.kmer_cache)
-        kmer_index.index_kmers(self.S)
+                               kmer_cache=self.kmer_cache,
+                               min_qual=self.min_qual)
+        id_S = kmer_index.index_kmers(self.S, quals=quals_S)
+        id_T = id_S
         if not self.self_comp:
-            kmer_index.index_kmers(self.T)
+            id_T = kmer_index.index_kmers(self.T, quals=quals_T)
 
         kmers = kmer_index.kmers()
 
         def _records():
             for kmer in kmers:
                 hits = kmer_index.hits(kmer)
-                if self.self_comp:
-                    pairs = chain(combinations(hits, 2),
-                                  [(x, x) for x in hits])
-                else:
-                    pairs = (((id0, pos0), (id1, pos1))
-                             for (id0, pos0), (id1, pos1)
-                             in combinations(hits, 2)
-                             if id0 != id1)
-                for (id0, pos0), (id1, pos1) in pairs:
-                    d, a = self.to_diagonal_coordinates(pos0, pos1)
-                    yield d, a
+                # pair occurrences of kmer in S with occurrences of its
+                # neighbors in T, each pair is visited exactly once.
+                hits_S = [pos for id_, pos in hits if id_ == id_S]
+                if not hits_S:
+                    continue
+                hits_T = [pos for id_, pos in kmer_index.hits_within(
+                              kmer, max_mismatches=self.max_mismatches)
+                          if id_ == id_T]
+                for pos0, pos1 in product(hits_S, hits_T):
+                    # only keep one triangle for self comparisons
+                    if self.self_comp and pos0 > pos1:
+                        continue
+                    yield self.to_diagonal_coordinates(pos0, pos1)
 
-        self.log('Indexing seeds for %s.' % self.name)
-        with self.connection() as conn:
-            cursor = conn.cursor()
+        seeds = np.array(list(_records()), dtype=np.int64).reshape(-1, 2)
+        return sort_diagonal_coordinates(seeds[:, 0], seeds[:, 1])
+
+    def _kmer_array(self, seq, quals):
+        # kmers of seq as an array with masked kmers represented by -1
+        if self.kmer_cache:
+            kmers = np.array([-1 if kmer is None else kmer
+                              for kmer in self.kmer_cache.as_kmer_seq(seq)],
+                             dtype=np.int64)
+        else:
+            kmers = as_kmer_arrays(seq, [self.wordlen],
+                                   mask=self.mask)[self.wordlen]
+        if quals is not None and self.min_qual is not None:
+            assert len(quals) == len(seq), 'need one quality score per base'
+            kmers[low_quality_kmers(quals, self.wordlen, self.min_qual)] = -1
+        return kmers
+
+    def _insert_seeds(self, cursor, records):
+        if self.rtree:
+            # seeds are degenerate boxes
             cursor.executemany(
-                'INSERT INTO %s (d, a) VALUES (?, ?)' % self.seeds_table,
-                _records()
+                'INSERT INTO %s (d, d_max, a, a_max) VALUES (?, ?, ?, ?)'
+                % self.seeds_table,
+                ((d, d, a, a) for d, a in records)
             )
-            # FIXME is this necessary?
-            self.log('Creating SQL index for table %s.' % self.seeds_table)
-            cursor.execute('CREATE INDEX %s_diagonal ON %s(d);' %
-                           (self.seeds_table, self.seeds_table))
+            return
+        cols = self._record_cols() + (['a_end'] if self.runs else [])
+        cursor.executemany(
+            'INSERT INTO %s (%s) VALUES (%s)' %
+            (self.seeds_table, ', '.join(cols),
+             ', '.join(['?'] * len(cols))),
+            records
+        )
+        # covers all columns so that counts in rectangles are index-only;
+        # runs reaching an antidiagonal band are a range of a_end.
+        if self.runs:
+            cols = ['d', 'a_end', 'a', 'n']
+        self.log('Creating SQL index for table %s.' % self.seeds_table)
+        cursor.execute('CREATE INDEX %s_diagonal ON %s(%s);' %
+                       (self.seeds_table, self.seeds_table, ', '.join(cols)))
+
+    def _cumsum_diagonals(self, ds, weights=None):
+        # prefix sums of the number of seeds on diagonals, diagonal d being
+        # at index d + |T|, from the diagonals of stored records.
+        num_diags = len(self.S) + len(self.T) + 1
+        counts = np.bincount(np.asarray(ds, dtype=np.int64) + len(self.T),
+                             weights=weights, minlength=num_diags)
+        return np.append(0, np.cumsum(counts)).astype(np.int64)
+
+    def _diagonal_cumsum(self):
+        # prefix sums of the number of stored seeds on diagonals, computed
+        # upon first use for reused seeds tables.
+        if self._diag_cumsum is None:
+            if self.backend == 'memory':
+                ds, weights = self._d, self._n
+            else:
+                count = 'SUM(n)' if self.runs else 'COUNT(*)'
+                recs = np.array(list(self._query(
+                    'SELECT d, %s FROM %s GROUP BY d' %
+                    (count, self.seeds_table)
+                )), dtype=np.int64).reshape(-1, 2)
+                ds, weights = recs[:, 0], recs[:, 1]
+            self._diag_cumsum = self._cumsum_diagonals(ds, weights)
+        return self._diag_cumsum
+
+    def _diagonal_band_counts(self, d_bands):
+        # number of stored seeds in diagonal bands, bounds being truncated to
+        # integers like in SQL queries.
+        cumsum = self._diagonal_cumsum()
+        d_bands = np.trunc(np.asarray(d_bands, dtype=float)).astype(np.int64)
+        d_bands = d_bands.reshape(-1, 2) + len(self.T)
+        start = np.clip(d_bands[:, 0], 0, len(cumsum) - 1)
+        end = np.clip(d_bands[:, 1] + 1, 0, len(cumsum) - 1)
+        return np.maximum(cumsum[end] - cumsum[start], 0)
+
+    def diagonal_counts(self, exclude_trivial=False):
+        """Returns the number of seeds on each diagonal as a dense array
+        which is built along with the index such that counting seeds in
+        diagonal bands (cf. :func:`seed_count`) takes constant time. The
+        seeds are the same as those of :func:`seeds`, i.e for self
+        comparisons mirror images of stored seeds are counted.
+
+        Keyword Args:
+            exclude_trivial (bool): Whether to exclude seeds on the main
+                diagonal of self comparisons; default is False.
+
+        Returns:
+            numpy.ndarray: number of seeds on diagonal :math:`d` at index
+            :math:`d + |T|` for :math:`-|T| \\le d \\le |S|`.
+        """
+        counts = np.diff(self._diagonal_cumsum())
+        if self.self_comp:
+            main = len(self.T)
+            counts = counts + counts[::-1]
+            counts[main] = 0 if exclude_trivial else counts[main] // 2
+        return counts
+
+    def _record_cols(self):
+        # columns of stored records: seeds or runs of seeds
+        return ['d', 'a', 'n'] if self.runs else ['d', 'a']
+
+    def _expand(self, records):
+        # (d, a) arrays of seeds in stored records
+        if self.runs:
+            return expand_seed_runs(*records)
+        return records
+
+    def seed_arrays(self, d_band=None, exclude_trivial=False,
+                    chunk_size=2 ** 16, expand_runs=True, mirror=True):
+        """Yields blocks of seeds in diagonal coordinates as NumPy arrays,
+        read directly from the store without creating any per-seed Python
+        objects. The seeds are the same and in the same order as those of
+        :func:`seeds`, i.e for self comparisons each stored seed
+        :math:`(d, a)` with :math:`d \\neq 0` is followed by its mirror image
+        :math:`(-d, a)`.
+
+        Keyword Args:
+            d_band (tuple|None):
+                If specified a ``(d_min, d_max)`` tuple restricting the seeds
+                to a diagonal band.
+            exclude_trivial (bool): Whether to exclude seeds on the main
+                diagonal of self comparisons; default is False.
+            chunk_size (int): Maximum number of stored records (seeds or
+                runs of seeds, cf. :attr:`runs`) in each block; default is
+                :math:`2^{16}`.
+            expand_runs (bool): Whether stored runs of seeds are expanded to
+                seeds; if False, blocks of runs ``(d, a, n)`` are yielded
+                instead (cf. :func:`seed_runs`), mirrored like seeds. Only
+                relevant if :attr:`runs` is True; default is True.
+            mirror (bool): Whether mirror images of stored seeds of self
+                comparisons are yielded; if False only stored seeds, i.e
+                those with :math:`d \\le 0`, are yielded. Default is True.
+
+        Yields:
+            tuple: ``(d, a)`` (or ``(d, a, n)``) arrays of type ``int64``.
+        """
+        assert chunk_size > 0, 'chunk size must be positive'
+        if self.backend == 'memory':
+            start, end = self._band_slice(d_band)
+
+            arrays = [self._d, self._a] + ([self._n] if self.runs else [])
+
+            def _chunks():
+                for offset in range(start, end, chunk_size):
+                    limit = min(offset + chunk_size, end)
+                    yield [arr[offset:limit] for arr in arrays]
+        else:
+            query = 'SELECT %s FROM %s' % (', '.join(self._record_cols()),
+                                           self.seeds_table)
+            if d_band is not None:
+                assert len(d_band) == 2, 'need a 2-tuple for diagonal band'
+                d_min, d_max = d_band
+                query += ' WHERE d BETWEEN %d AND %d ' % \
+                    (d_min, d_max)
+            query += ' ORDER BY rowid'
+
+            def _chunks():
+                records = self._query(query)
+                while True:
+                    chunk = np.array(list(islice(records, chunk_size)),
+                                     dtype=np.int64)
+                    if not len(chunk):
+                        return
+                    yield chunk.T
+
+        for chunk in _chunks():
+            if expand_runs:
+                chunk = self._expand(chunk)
+            cols = [col.astype(np.int64) for col in chunk]
+            if not self.self_comp:
+                yield tuple(cols)
+                continue
+            if exclude_trivial:
+                keep = cols[0] != 0
+                cols = [col[keep] for col in cols]
+            if not mirror:
+                yield tuple(cols)
+                continue
+            # interleave each seed (or run) with its mirror image, if any
+            ds = np.stack([cols[0], -cols[0]], axis=1).ravel()
+            cols = [ds] + [np.repeat(col, 2) for col in cols[1:]]
+            keep = np.ones(len(ds), dtype=bool)
+            keep[1::2] = ds[1::2] != 0
+            yield tuple(col[keep] for col in cols)
 
     def seeds(self, d_band=None, exclude_trivial=False):
         """Yields all seeds, optionally those within a diagonal band.
@@ -173,24 +1400,62 @@ class SeedIndex(KmerDBWrapper):
             tuple:
                 seeds coordinates :math:`(i, j)`.
         """
-        query = 'SELECT d, a FROM %s' % self.seeds_table
-        if d_band is not None:
-            assert len(d_band) == 2, 'need a 2-tuple for diagonal band'
-            d_min, d_max = d_band
-            query += ' WHERE d BETWEEN %d AND %d ' % \
-                (d_min, d_max)
-        query += ' ORDER BY rowid'
+        for ds, as_ in self.seed_arrays(d_band=d_band,
+                                        exclude_trivial=exclude_trivial):
+            i, j = self.to_ij_coordinates(ds, as_)
+            for seed in zip(i.tolist(), j.tolist()):
+                yield seed
 
-        with self.connection() as conn:
+    def _query(self, query):
+        with self.connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute(query)
-            for d, a in cursor:
-                i, j = self.to_ij_coordinates(d, a)
-                if self.self_comp and exclude_trivial and i == j:
-                    continue
-                yield (i, j)
-                if self.self_comp and i != j:
-                    yield (j, i)
+            for rec in cursor:
+                yield rec
+
+    def _band_slice(self, d_band):
+        # the range of memory seeds within a diagonal band
+        if d_band is None:
+            return 0, len(self._d)
+        assert len(d_band) == 2, 'need a 2-tuple for diagonal band'
+        # bounds are truncated to integers like in SQL queries
+        start = np.searchsorted(self._d, int(d_band[0]), side='left')
+        end = np.searchsorted(self._d, int(d_band[1]), side='right')
+        return start, end
+
+    def seed_coordinates(self, d_band=None, a_band=None):
+        """Returns diagonal coordinates of stored seeds as arrays, optionally
+        those within a diagonal and/or antidiagonal band. For self
+        comparisons only seeds with :math:`d \\le 0` are stored (cf.
+        :func:`seeds`).
+
+        Keyword Args:
+            d_band (tuple|None):
+                If specified a :math:`(d_{\\min}, d_{\\max})` tuple.
+            a_band (tuple|None):
+                If specified a :math:`(a_{\\min}, a_{\\max})` tuple.
+
+        Returns:
+            tuple: ``(d, a)`` NumPy arrays sorted by diagonal.
+        """
+        if self.backend == 'memory':
+            start, end = self._band_slice(d_band)
+            arrays = [self._d, self._a] + ([self._n] if self.runs else [])
+            ds, as_ = self._expand([arr[start:end] for arr in arrays])
+        else:
+            cols = self._record_cols()
+            query = 'SELECT %s FROM %s' % (', '.join(cols), self.seeds_table)
+            if d_band is not None:
+                assert len(d_band) == 2, 'need a 2-tuple for diagonal band'
+                query += ' WHERE d BETWEEN %d AND %d' % d_band
+            query += ' ORDER BY rowid'
+            records = np.array(list(self._query(query)), dtype=np.int64)
+            ds, as_ = self._expand(records.reshape(-1, len(cols)).T)
+        if a_band is not None:
+            assert len(a_band) == 2, 'need a 2-tuple for antidiagonal band'
+            keep = (as_ >= int(a_band[0])) & (as_ <= int(a_band[1]))
+            ds, as_ = ds[keep], as_[keep]
+        return ds, as_
 
     def seed_count(self, d_band=None, a_band=None):
         """Counts the number of seeds either in the whole table or in the
@@ -208,7 +1473,26 @@ class SeedIndex(KmerDBWrapper):
             int: Number of seeds found in the entire table or in the specified
             diagonal band.
         """
-        query = 'SELECT COUNT(*) FROM %s' % self.seeds_table
+        if a_band is None:
+            # prefix sums of diagonal counts, cf. diagonal_counts()
+            if d_band is None:
+                return int(self._diagonal_cumsum()[-1])
+            assert len(d_band) == 2, 'need a 2-tuple for diagonal band'
+            return int(self._diagonal_band_counts([d_band])[0])
+
+        if self.backend == 'memory':
+            assert len(a_band) == 2, 'need a 2-tuple for antidiagonal band'
+            if d_band is not None:
+                assert len(d_band) == 2, 'need a 2-tuple for diagonal band'
+            # bounds are truncated to integers like in SQL queries
+            d_band = (int(d_band[0]), int(d_band[1])) if d_band else None
+            a_band = (int(a_band[0]), int(a_band[1]))
+            if self.runs:
+                return int(self._seed_counter().count_many(
+                    d_bands=None if d_band is None else [d_band],
+                    a_bands=[a_band])[0])
+            return self._seed_counter().count(d_band=d_band, a_band=a_band)
+
         conds = []
         if d_band is not None:
             assert len(d_band) == 2, 'need a 2-tuple for diagonal band'
@@ -217,19 +1501,280 @@ class SeedIndex(KmerDBWrapper):
                    (d_min, d_max)
             conds.append(cond)
 
-        if a_band is not None:
-            assert len(a_band) == 2, 'need a 2-tuple for antidiagonal band'
-            conds.append('a BETWEEN %d AND %d' % a_band)
+        assert len(a_band) == 2, 'need a 2-tuple for antidiagonal band'
+        count, cond = self._count_sql('%d' % a_band[0], '%d' % a_band[1])
+        conds.append(cond)
 
-        if conds:
-            query += ' WHERE ' + ' AND '.join(conds)
+        query = 'SELECT %s FROM %s' % (count, self.seeds_table)
+        query += ' WHERE ' + ' AND '.join(conds)
 
-        with self.connection() as conn:
+        with self.connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute(query)
             for row in cursor:
                 return row[0]
 
+    def _seed_counter(self):
+        # the counter of seeds (or runs of seeds) of the memory backend
+        if self._counter is None:
+            self._counter = RunCounter(self._d, self._a, self._n) \
+                if self.runs else RectangleCounter(self._d, self._a)
+        return self._counter
+
+    def _count_sql(self, a_min, a_max):
+        # the SQL aggregate counting seeds in an antidiagonal band between
+        # the given SQL expressions and the condition selecting the records
+        # that contain them; runs are counted like run_seed_counts() where
+        # integer division of nonnegative numbers is a floor and
+        # (a_min - a + 1) / 2 is the ceiling of (a_min - a) / 2 if positive.
+        if not self.runs:
+            return 'COUNT(*)', 'a BETWEEN %s AND %s' % (a_min, a_max)
+        count = 'COALESCE(SUM(MIN(n - 1, (%s - a) / 2) - ' % a_max + \
+                'MAX(0, (%s - a + 1) / 2) + 1), 0)' % a_min
+        cond = 'a_end >= %s AND a <= %s' % (a_min, a_max)
+        return count, cond
+
+    def seed_count_many(self, d_bands=None, a_bands=None):
+        """Counts the number of seeds in many rectangles at once, equivalent
+        to but much faster than calling :func:`seed_count` for each. For the
+        memory backend all rectangles are counted in a single vectorized pass
+        (cf. :func:`RectangleCounter.count_many` and, for runs of seeds,
+        :func:`RunCounter.count_many`) and diagonal bands alone
+        are counted from the per-diagonal counts (cf.
+        :func:`diagonal_counts`); for the sqlite backend
+        rectangles are joined, in chunks, against the seeds table in a single
+        query per chunk.
+
+        Keyword Args:
+            d_bands (list|None): :math:`(d_{\\min}, d_{\\max})` tuples, one per
+                rectangle; default is all diagonals for all rectangles.
+            a_bands (list|None): :math:`(a_{\\min}, a_{\\max})` tuples, one per
+                rectangle; default is all antidiagonals for all rectangles.
+
+        Returns:
+            numpy.ndarray: Number of seeds in each rectangle.
+        """
+        assert d_bands is not None or a_bands is not None, \
+            'need at least one of diagonal or antidiagonal bands'
+        bands = []
+        for band in [d_bands, a_bands]:
+            if band is not None:
+                # bounds are truncated to integers like in SQL queries
+                band = np.trunc(np.asarray(band, dtype=float)).astype(np.int64)
+                band = band.reshape(-1, 2)
+            bands.append(band)
+        d_bands, a_bands = bands
+        if d_bands is not None and a_bands is not None:
+            assert len(d_bands) == len(a_bands), \
+                'need as many antidiagonal bands as diagonal bands'
+
+        if a_bands is None:
+            # prefix sums of diagonal counts, cf. diagonal_counts()
+            return self._diagonal_band_counts(d_bands)
+        if self.backend == 'memory':
+            return self._seed_counter().count_many(d_bands=d_bands,
+                                                   a_bands=a_bands)
+
+        num = len(d_bands) if d_bands is not None else len(a_bands)
+        no_bounds = np.array([[-2 ** 62, 2 ** 62]] * num, dtype=np.int64)
+        d_bands = no_bounds if d_bands is None else d_bands
+        a_bands = no_bounds if a_bands is None else a_bands
+        rects = np.hstack([d_bands, a_bands])
+        counts = np.zeros(num, dtype=np.int64)
+        # 4 bound parameters per rectangle, stay within SQLite's limit of 999
+        chunk_size = 200
+        count, a_cond = self._count_sql('a_lo', 'a_hi')
+        query = """
+            WITH rects (idx, d_lo, d_hi, a_lo, a_hi) AS (VALUES %%s)
+            SELECT idx, (SELECT %s FROM %%s
+                         WHERE d BETWEEN d_lo AND d_hi
+                         AND %s)
+            FROM rects
+        """ % (count, a_cond)
+        with self.connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            for offset in range(0, num, chunk_size):
+                chunk = rects[offset: offset + chunk_size]
+                values = ', '.join('(%d, ?, ?, ?, ?)' % (offset + idx)
+                                   for idx in range(len(chunk)))
+                cursor.execute(query % (values, self.seeds_table),
+                               chunk.ravel().tolist())
+                for idx, count in cursor:
+                    counts[idx] = count
+        return counts
+
+
+class SeedHitLists(object):
+    """Seeds between multiple sequences represented implicitly by the hits
+    of each kmer in each sequence. A kmer with :math:`m_k` hits in the
+    :math:`k`-th sequence gives :math:`\\prod_k m_k` seeds which are never
+    materialized unless enumerated by :func:`seeds`.
+
+    Seeds in a hyper-rectangle of diagonal coordinates are counted
+    analytically: for each hit :math:`i_1` of a kmer in the 1st sequence,
+    the band :math:`[d_{k,\\min}, d_{k,\\max}]` restricts hits in the
+    :math:`(k+1)`-th sequence to the interval :math:`[i_1 - d_{k,\\max}, i_1 -
+    d_{k,\\min}]` whose number of hits is found by binary search; the number
+    of seeds anchored at :math:`i_1` is the product of these counts. An
+    antidiagonal band is handled by the smallest and largest possible
+    :math:`a` of the seeds anchored at each :math:`i_1`; seeds of anchors
+    straddling the band are counted, without enumeration, from the distinct
+    partial sums of hits in each half of the sequences.
+
+    Attributes:
+        positions (list): for each sequence, the positions of hits of all
+            kmers, grouped by kmer and sorted within each group.
+        offsets (list): for each sequence, the start of the hits of each
+            kmer in :attr:`positions` followed by the total number of hits.
+    """
+    def __init__(self, positions, offsets):
+        assert len(positions) == len(offsets) > 1
+        self.positions = [np.asarray(pos, dtype=np.int64) for pos in positions]
+        self.offsets = [np.asarray(off, dtype=np.int64) for off in offsets]
+        num_kmers = len(self.offsets[0]) - 1
+        assert all(len(off) == num_kmers + 1 for off in self.offsets)
+        self._stride = 1 + max([pos.max() for pos in self.positions
+                                if len(pos)] + [0])
+        self._kmer_ids, self._keys = [], []
+        for pos, off in zip(self.positions, self.offsets):
+            kmer_ids = np.repeat(np.arange(num_kmers), np.diff(off))
+            self._kmer_ids.append(kmer_ids)
+            # hits of each kmer are contiguous in the sorted keys
+            self._keys.append(kmer_ids * self._stride + pos)
+
+    @classmethod
+    def from_hit_lists(cls, hit_lists, num_seqs):
+        """Builds seeds from the hits of kmers in all sequences.
+
+        Args:
+            hit_lists (iterable): for each kmer present in all sequences a
+                list of the sorted positions of its hits in each sequence.
+            num_seqs (int): number of sequences.
+
+        Returns:
+            SeedHitLists
+        """
+        positions = [[] for _ in range(num_seqs)]
+        counts = [[] for _ in range(num_seqs)]
+        for hits in hit_lists:
+            assert len(hits) == num_seqs
+            for k in range(num_seqs):
+                positions[k].extend(hits[k])
+                counts[k].append(len(hits[k]))
+        offsets = [np.concatenate([[0], np.cumsum(cnts, dtype=np.int64)])
+                   for cnts in counts]
+        return cls(positions, offsets)
+
+    @classmethod
+    def from_kmer_arrays(cls, kmer_arrays):
+        """Builds seeds from the kmers of all sequences by a sort-merge join
+        (cf. :func:`kmer_seeds`).
+
+        Args:
+            kmer_arrays (list): kmers of each sequence in integer
+                representation with masked kmers represented by -1 (cf.
+                :func:`biseqt.kmers.as_kmer_arrays`).
+
+        Returns:
+            SeedHitLists
+        """
+        runs = [_kmer_runs(kmers) for kmers in kmer_arrays]
+        shared = runs[0][1]
+        for _, uniq, _, _ in runs[1:]:
+            shared = np.intersect1d(shared, uniq, assume_unique=True)
+        positions, offsets = [], []
+        for pos, uniq, starts, counts in runs:
+            idx = np.searchsorted(uniq, shared)
+            starts, counts = starts[idx], counts[idx]
+            run_offsets = np.cumsum(counts) - counts
+            total = int(counts.sum())
+            gather = np.repeat(starts - run_offsets, counts) + \
+                np.arange(total, dtype=np.int64)
+            positions.append(pos[gather])
+            offsets.append(np.concatenate([[0], np.cumsum(counts)]))
+        return cls(positions, offsets)
+
+    def __len__(self):
+        return self.count()
+
+    def seeds(self):
+        """Lazily enumerates all seeds.
+
+        Yields:
+            tuple: seed coordinates ``(ds, a)`` where ``ds`` is the list
+            :math:`(d_1, \\ldots, d_{n-1})`.
+        """
+        num_kmers = len(self.offsets[0]) - 1
+        for kmer in range(num_kmers):
+            hits = [pos[off[kmer]: off[kmer + 1]].tolist()
+                    for pos, off in zip(self.positions, self.offsets)]
+            for idxs in product(*hits):
+                yield [idxs[0] - i for i in idxs[1:]], sum(idxs)
+
+    def count(self, ds_band=None, a_band=None):
+        """Counts the seeds within a hyper-rectangle.
+
+        Keyword Args:
+            ds_band (list|None): :math:`n-1` tuples :math:`(d_{k,\\min},
+                d_{k,\\max})` (or None for no restriction); default is all
+                diagonals.
+            a_band (tuple|None): :math:`(a_{\\min}, a_{\\max})`; default is
+                all antidiagonals.
+
+        Returns:
+            int: Number of seeds in the hyper-rectangle.
+        """
+        num_seqs = len(self.positions)
+        if ds_band is None:
+            ds_band = [None] * (num_seqs - 1)
+        assert len(ds_band) == num_seqs - 1
+        anchors, kmer_ids = self.positions[0], self._kmer_ids[0]
+        cnt = np.ones(len(anchors), dtype=np.int64)
+        a_min, a_max = anchors.copy(), anchors.copy()
+        ranges = []
+        for k in range(1, num_seqs):
+            offsets, band = self.offsets[k], ds_band[k - 1]
+            lo, hi = offsets[kmer_ids], offsets[kmer_ids + 1]
+            if band is not None:
+                assert len(band) == 2, 'need a 2-tuple for diagonal band'
+                lower = np.maximum(anchors - band[1], 0)
+                upper = np.minimum(anchors - band[0], self._stride - 1)
+                base = kmer_ids * self._stride
+                lo = np.searchsorted(self._keys[k], base + lower, side='left')
+                hi = np.searchsorted(self._keys[k], base + upper,
+                                     side='right')
+                hi = np.where(upper < lower, lo, np.maximum(hi, lo))
+            cnt *= hi - lo
+            ranges.append((lo, hi))
+            if a_band is not None:
+                nonempty = hi > lo
+                a_min[nonempty] += self.positions[k][lo[nonempty]]
+                a_max[nonempty] += self.positions[k][hi[nonempty] - 1]
+        if a_band is None:
+            return int(cnt.sum())
+
+        assert len(a_band) == 2, 'need a 2-tuple for antidiagonal band'
+        nonempty = cnt > 0
+        inside = nonempty & (a_min >= a_band[0]) & (a_max <= a_band[1])
+        total = int(cnt[inside].sum())
+        straddle = nonempty & ~inside & (a_max >= a_band[0]) & \
+            (a_min <= a_band[1])
+        # count the seeds straddling the band by meeting in the middle: the
+        # number of pairs of partial sums of hits in the two halves of
+        # sequences whose total is in the band.
+        half = len(ranges) // 2
+        for idx in np.flatnonzero(straddle):
+            hits = [self.positions[k + 1][r_lo[idx]:r_hi[idx]]
+                    for k, (r_lo, r_hi) in enumerate(ranges)]
+            left, left_cnts = _hit_sums(hits[:half])
+            right, right_cnts = _hit_sums(hits[half:])
+            cumsum = np.concatenate([[0], np.cumsum(right_cnts)])
+            shift = anchors[idx] + left
+            upper = np.searchsorted(right, a_band[1] - shift, side='right')
+            lower = np.searchsorted(right, a_band[0] - shift, side='left')
+            total += int(np.dot(left_cnts, cumsum[upper] - cumsum[lower]))
+        return total
+
 
 class SeedIndexMultiple(KmerDBWrapper):
     """An index for seeds between multiple sequences in diagonal coordinates.
@@ -238,20 +1783,47 @@ class SeedIndexMultiple(KmerDBWrapper):
         seqs (list[biseqt.sequence.Sequence]): The sequences of interest.
         cache (KmerCache): optional :class:`KmerCache` object to use for
             retrieving integer representations of sequences.
+        rtree (bool): Whether the seeds table is an R*Tree of points (cf.
+            :func:`create_seeds_table`), only possible for up to 5
+            sequences; default is False.
+        backend (str): Where seeds are stored: ``sqlite`` for a table in the
+            database at :attr:`path` with one row per seed, or ``memory`` for
+            the hits of each kmer in each sequence (cf.
+            :class:`SeedHitLists`) such that seeds are never materialized;
+            default is ``sqlite``.
     """
     def __init__(self, *seqs, **kw):
         assert(len(seqs)) > 2
+        self.backend = kw.pop('backend', 'sqlite')
+        assert self.backend in ['sqlite', 'memory'], \
+            'unknown seed backend %s' % self.backend
+        self.rtree = kw.pop('rtree', False)
+        assert not self.rtree or len(seqs) <= 5, \
+            'R*Tree seeds tables support at most 5 sequences'
         name = '_'.join(S.content_id[:8] for S in seqs)
+        if self.rtree:
+            name += '_rt'
         super(SeedIndexMultiple, self).__init__(name=name, **kw)
         self.kmer_cache = kw.get('kmer_cache', None)
         self.seqs = seqs
         self.d_cols = ['d_%d' % (idx + 1) for idx in range(len(self.seqs) - 1)]
 
-        if self._table_exists():
+        if self.backend == 'memory':
+            self._seed_hits = SeedHitLists.from_kmer_arrays(
+                [self._kmer_array(seq) for seq in self.seqs])
+        elif self._table_exists():
             self.log('Seeds for %s already indexed, skipping' % name)
         else:
             self._index_seeds()
 
+    def _kmer_array(self, seq):
+        # kmers of seq as an array with masked kmers represented by -1
+        if self.kmer_cache:
+            return np.array([-1 if kmer is None else kmer
+                             for kmer in self.kmer_cache.as_kmer_seq(seq)],
+                            dtype=np.int64)
+        return as_kmer_arrays(seq, [self.wordlen])[self.wordlen]
+
     @property
     def seeds_table(self):
         """The seeds table name ``seeds_[name]``, cf.
@@ -314,29 +1886,15 @@ class SeedIndexMultiple(KmerDBWrapper):
         return std_ranges
 
     def _table_exists(self):
+        # whether seeds are already indexed with the same parameters, stale
+        # tables are dropped, cf. check_seeds_table().
+        fingerprint = seeds_fingerprint(self, self.seqs, rtree=self.rtree)
         with self.connection() as conn:
-            q = """
-                SELECT name FROM sqlite_master
-                WHERE type='table' AND name='%s';
-            """ % self.seeds_table
-            cursor = conn.cursor()
-            cursor.execute(q)
-            for name in cursor:
-                return True
-        return False
+            return check_seeds_table(conn.cursor(), self.seeds_table,
+                                     fingerprint)
 
     # idempotent operation
     def _index_seeds(self):
-        d_col_defs = ', '.join(col + ' INTEGER' for col in self.d_cols)
-        init_query = """
-            CREATE TABLE %s (
-              %s,               -- diagonal positions
-              'a'  INTEGER      -- antidiagonal position
-            );
-        """ % (self.seeds_table, d_col_defs)
-        with self.connection() as conn:
-            conn.cursor().execute(init_query)
-
         kmer_index_name = '%d_%s' % (self.wordlen, self.name)
         kmer_index = KmerIndex(path=self.path, name=kmer_index_name,
                                wordlen=self.wordlen, alphabet=self.alphabet,
@@ -364,13 +1922,28 @@ class SeedIndexMultiple(KmerDBWrapper):
                     yield tuple(list(ds) + [a])
 
         self.log('Indexing seeds for %s.' % self.name)
-        d_cols = ', '.join(self.d_cols)
-        with self.connection() as conn:
-            cursor = conn.cursor()
-            q_marks = ', '.join(['?'] * len(self.seqs))
-            query = 'INSERT INTO %s (%s, a) VALUES (%s)' % \
-                    (self.seeds_table, d_cols, q_marks)
-            cursor.executemany(query, _records())
+        cols = self.d_cols + ['a']
+        records = _records()
+        if self.rtree:
+            # seeds are degenerate boxes
+            cols = [c for col in cols for c in [col, col + '_max']]
+            records = (tuple(x for coord in rec for x in [coord, coord])
+                       for rec in records)
+
+        def _build(cursor):
+            create_seeds_table(cursor, self.seeds_table, self.d_cols,
+                               rtree=self.rtree)
+            q_marks = ', '.join(['?'] * len(cols))
+            query = 'INSERT INTO %s (%s) VALUES (%s)' % \
+                    (self.seeds_table, ', '.join(cols), q_marks)
+            cursor.executemany(query, records)
+
+        if not build_seeds_table(self.connection(), self.seeds_table,
+                                 seeds_fingerprint(self, self.seqs,
+                                                   rtree=self.rtree),
+                                 _build):
+            self.log('Seeds for %s indexed concurrently, skipping' %
+                     self.name)
 
     def seeds(self):
         """Yields all seeds in diagonal coordinates.
@@ -379,9 +1952,13 @@ class SeedIndexMultiple(KmerDBWrapper):
             tuple:
                 seeds coordinates :math:`(d_1, \ldots, d_{n-1}, a)`.
         """
+        if self.backend == 'memory':
+            for seed in self._seed_hits.seeds():
+                yield seed
+            return
         query = 'SELECT %s, a FROM %s' % \
                 (', '.join(self.d_cols), self.seeds_table)
-        with self.connection() as conn:
+        with self.connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute(query)
             for rec in cursor:
@@ -405,6 +1982,14 @@ class SeedIndexMultiple(KmerDBWrapper):
             int: Number of seeds found in the entire table or in the specified
             diagonal band.
         """
+        if self.backend == 'memory':
+            # bounds are truncated to integers like in SQL queries
+            if ds_band is not None:
+                ds_band = [None if band is None else
+                           (int(band[0]), int(band[1])) for band in ds_band]
+            if a_band is not None:
+                a_band = (int(a_band[0]), int(a_band[1]))
+            return self._seed_hits.count(ds_band=ds_band, a_band=a_band)
         query = 'SELECT COUNT(*) FROM %s' % self.seeds_table
         conds = []
         if ds_band is not None:
@@ -425,9 +2010,64 @@ class SeedIndexMultiple(KmerDBWrapper):
         if conds:
             query += ' WHERE ' + ' AND '.join(conds)
 
-        with self.connection() as conn:
+        with self.connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute(query)
             for row in cursor:
                 return row[0]
             return 0
+
+    def seed_count_many(self, ds_bands, a_bands):
+        """Counts the number of seeds in many hyper-rectangles at once,
+        equivalent to but faster than calling :func:`seed_count` for each.
+        For the sqlite backend rectangles are joined, in chunks, against the
+        seeds table in a single query per chunk.
+
+        Args:
+            ds_bands (list): for each rectangle a list of :math:`n-1` tuples
+                :math:`(d_{k,\\min}, d_{k,\\max})`.
+            a_bands (list): for each rectangle a :math:`(a_{\\min},
+                a_{\\max})` tuple.
+
+        Returns:
+            numpy.ndarray: Number of seeds in each rectangle.
+        """
+        assert len(ds_bands) == len(a_bands), \
+            'need as many antidiagonal bands as diagonal hyper-bands'
+        if self.backend == 'memory':
+            return np.array([self.seed_count(ds_band=ds_band, a_band=a_band)
+                             for ds_band, a_band in zip(ds_bands, a_bands)],
+                            dtype=np.int64)
+        num_ds = len(self.seqs) - 1
+        # bounds are truncated to integers like in SQL queries
+        ds_bands = np.trunc(np.asarray(ds_bands, dtype=float)).astype(np.int64)
+        a_bands = np.trunc(np.asarray(a_bands, dtype=float)).astype(np.int64)
+        rects = np.hstack([ds_bands.reshape(-1, 2 * num_ds),
+                           a_bands.reshape(-1, 2)])
+        num, num_params = rects.shape
+        counts = np.zeros(num, dtype=np.int64)
+
+        bound_cols = []
+        for col in self.d_cols + ['a']:
+            bound_cols += [col + '_lo', col + '_hi']
+        conds = ' AND '.join('%s.%s BETWEEN rects.%s_lo AND rects.%s_hi' %
+                             (self.seeds_table, col, col, col)
+                             for col in self.d_cols + ['a'])
+        query = """
+            WITH rects (idx, %s) AS (VALUES %%s)
+            SELECT idx, (SELECT COUNT(*) FROM %s WHERE %s)
+            FROM rects
+        """ % (', '.join(bound_cols), self.seeds_table, conds)
+        # stay within SQLite's limit of 999 bound parameters
+        chunk_size = 999 // num_params
+        q_marks = ', '.join('?' * num_params)
+        with self.connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            for offset in range(0, num, chunk_size):
+                chunk = rects[offset: offset + chunk_size]
+                values = ', '.join('(%d, %s)' % (offset + idx, q_marks)
+                                   for idx in range(len(chunk)))
+                cursor.execute(query % values, chunk.ravel().tolist())
+                for idx, count in cursor:
+                    counts[idx] = count
+        return counts
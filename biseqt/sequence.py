@@ -23,7 +23,18 @@
     >>> S = A.parse('A1A1A3A2')
     >>> print len(S)
     4
+
+    Sequencing reads with per-base qualities can be loaded from FASTQ files
+    using :func:`read_fastq`:
+
+    >>> from StringIO import StringIO
+    >>> from biseqt.sequence import read_fastq
+    >>> f = StringIO('@read_1\\nACGTAC\\n+\\nIIG-II\\n')
+    >>> for seq, name, quals in read_fastq(f, Alphabet('ACGT')):
+    ...     print name, quals[:4]
+    read_1 [40 40 38 12]
 """
+import numpy as np
 from itertools import chain
 from hashlib import sha1
 
@@ -232,3 +243,42 @@ class Sequence(object):
         else:
             contents = self.alphabet.letter_to_idx(other)
         return Sequence(self.alphabet, self.contents + contents)
+
+
+def read_fastq(f, alphabet, phred_offset=33, num_seqs=-1):
+    """Given a file handle reads FASTQ records and yields tuples of
+    ``(seq, name, quals)``. Each record must consist of exactly four lines:
+    ``@name``, the sequence, ``+`` (optionally followed by the name), and
+    the per-base quality string of the same length as the sequence.
+
+    Args:
+        f (file): The file handle to read from.
+        alphabet (Alphabet): The alphabet of sequences; all letters in the
+            file must belong to the alphabet.
+
+    Keyword Args:
+        phred_offset (int): The ASCII offset of Phred quality scores; default
+            is 33.
+        num_seqs (int): Maximum number of records to read; default is -1,
+            i.e all records.
+
+    Yields:
+        tuple: a :class:`Sequence`, its name, and its Phred quality scores as
+        a NumPy array of type ``uint8``.
+    """
+    cnt = 0
+    while num_seqs < 0 or cnt < num_seqs:
+        header = f.readline()
+        if not header:
+            break
+        if not header.strip():
+            continue
+        assert header[0] == '@', 'FASTQ records must start with @'
+        raw_seq = f.readline().strip()
+        assert f.readline()[0] == '+', 'FASTQ separator line missing'
+        raw_quals = f.readline().strip()
+        assert len(raw_quals) == len(raw_seq), \
+            'FASTQ quality string must be as long as the sequence'
+        quals = np.frombuffer(raw_quals, dtype=np.uint8) - phred_offset
+        yield alphabet.parse(raw_seq), header[1:].strip(), quals
+        cnt += 1
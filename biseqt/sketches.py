@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+.. wikisection:: overview
+    :title: (7) MinHash Sketches
+
+    The :mod:`biseqt.sketches` module provides bottom-s MinHash sketches of
+    the kmer contents of sequences. Sketches are used to cheaply estimate the
+    Jaccard similarity (or containment) of all pairs in a large collection of
+    sequences such that only promising pairs are compared using the much more
+    expensive :class:`biseqt.blot.WordBlot`.
+
+    >>> from biseqt.sequence import Alphabet
+    >>> from biseqt.stochastics import rand_seq
+    >>> from biseqt.sketches import SketchIndex
+    >>> import numpy as np
+    >>> np.random.seed(0)
+    >>> A = Alphabet('ACGT')
+    >>> S = rand_seq(A, 1000)
+    >>> sketch_index = SketchIndex(alphabet=A, wordlen=12, sketch_size=200)
+    >>> sketch_index.add(S[:600]), sketch_index.add(S[400:])
+    (0, 1)
+    >>> sketch_index.add(rand_seq(A, 600))
+    2
+    >>> list(sketch_index.candidate_pairs(.1))
+    [(0, 1, 0.16)]
+
+.. wikisection:: dev
+    :title: Bottom-s MinHash
+
+    For a set :math:`A` of kmers and a hash function :math:`h` that maps
+    kmers to (effectively) random 64-bit integers, the bottom-s sketch
+    :math:`S(A)` is the set of the :math:`s` smallest hash values of members
+    of :math:`A`. For two sets :math:`A, B` the :math:`s` smallest hash values
+    of :math:`S(A) \\cup S(B)` are exactly :math:`S(A \\cup B)` and are a
+    uniform sample of :math:`A \\cup B`. This gives an unbiased estimator of
+    the Jaccard similarity:
+
+    .. math::
+        \\hat{J}(A, B) = \\frac{|S(A \\cup B) \\cap S(A) \\cap S(B)|}
+                              {|S(A \\cup B)|}
+
+    The containment of :math:`A` in :math:`B` is derived from the Jaccard
+    estimate and the (exactly known) number of distinct kmers in each set:
+
+    .. math::
+        \\hat{C}(A, B) = \\frac{\\hat{J}(|A| + |B|)}{(1 + \\hat{J})|A|}
+
+    To avoid comparing all pairs of sketches, an inverted index from hash
+    values to sketches is maintained; only pairs of sketches that share at
+    least one hash value can have a nonzero estimate and only those are ever
+    considered.
+"""
+import logging
+import numpy as np
+from itertools import combinations
+
+from .kmers import as_kmer_seq, hash_kmers
+from .util import Logger
+
+
+class MinHashSketch(object):
+    """A bottom-s MinHash sketch of a set of kmers.
+
+    Attributes:
+        hashes (numpy.ndarray): the (at most) :attr:`size` smallest hash
+            values of the kmers in the set, sorted in increasing order.
+        cardinality (int): number of distinct kmers in the set.
+        size (int): the maximum number of hash values kept.
+    """
+    def __init__(self, kmers, size, seed=0):
+        assert size > 0, 'sketch size must be positive'
+        self.size = size
+        hashes = np.unique(hash_kmers(kmers, seed=seed))
+        self.cardinality = len(hashes)
+        self.hashes = hashes[:size]
+
+    def jaccard(self, other):
+        """Estimates the Jaccard similarity of the kmer sets of this sketch
+        and another sketch of the same size.
+
+        Args:
+            other (MinHashSketch): the other sketch.
+
+        Returns:
+            float: estimated Jaccard similarity.
+        """
+        assert self.size == other.size, 'sketch sizes must match'
+        union = np.union1d(self.hashes, other.hashes)[:self.size]
+        if not len(union):
+            return 0.
+        shared = np.intersect1d(self.hashes, other.hashes,
+                                assume_unique=True)
+        # only shared hashes that are in the sketch of the union count
+        shared = np.count_nonzero(shared <= union[-1])
+        return 1. * shared / len(union)
+
+    def containment(self, other):
+        """Estimates the containment of the kmer set of this sketch in that of
+        another sketch of the same size, i.e the proportion of kmers of this
+        sketch that are also present in the other.
+
+        Args:
+            other (MinHashSketch): the other sketch.
+
+        Returns:
+            float: estimated containment.
+        """
+        if not self.cardinality:
+            return 0.
+        J = self.jaccard(other)
+        intersection = J * (self.cardinality + other.cardinality) / (1 + J)
+        return min(1., intersection / self.cardinality)
+
+
+class SketchIndex(object):
+    """An in-memory inverted index of MinHash sketches of a collection of
+    sequences.
+
+    Attributes:
+        alphabet (sequence.Alphabet): The alphabet for indexed sequences.
+        wordlen (int): Length of kmers to be sketched.
+        sketch_size (int): Number of hash values in each sketch.
+        mask (list): A list of sets of integers which mask kmers, cf.
+            :func:`biseqt.kmers.as_kmer_seq`.
+        seed (int): Seed of the hash function, cf. :func:`hash_kmers`.
+        kmer_cache (kmers.KmerCache): optional :class:`KmerCache` object to
+            use for retrieving integer representations of sequences.
+        sketches (list): the :class:`MinHashSketch` of each indexed sequence;
+            the position of a sketch in this list is the integer identifier
+            of its sequence.
+    """
+    def __init__(self, alphabet=None, wordlen=None, sketch_size=1000, mask=[],
+                 seed=0, kmer_cache=None, log_level=logging.INFO):
+        assert isinstance(wordlen, int) and sketch_size > 0
+        self.alphabet = alphabet
+        self.wordlen = wordlen
+        self.sketch_size = sketch_size
+        self.mask = mask
+        self.seed = seed
+        if kmer_cache:
+            assert kmer_cache.wordlen == self.wordlen
+            assert kmer_cache.alphabet == self.alphabet
+        self.kmer_cache = kmer_cache
+        self.sketches = []
+        self._ids_by_content = {}
+        self._postings = {}  # hash value -> ids of sketches containing it
+
+        log_header = '%d-mer sketches (python-object)' % self.wordlen
+        self._logger = Logger(log_level=log_level, header=log_header)
+
+    def log(self, *args, **kwargs):
+        """Wraps :class:`Logger.log`."""
+        self._logger.log(*args, **kwargs)
+
+    def sketch(self, seq):
+        """Builds the MinHash sketch of the given sequence without adding it
+        to the index.
+
+        Args:
+            seq (sequence.Sequence): The sequence to be sketched.
+
+        Returns:
+            MinHashSketch
+        """
+        if self.kmer_cache:
+            kmers = self.kmer_cache.as_kmer_seq(seq)
+        else:
+            kmers = [kmer for kmer in as_kmer_seq(seq, self.wordlen,
+                                                  mask=self.mask)
+                     if kmer is not None]
+        return MinHashSketch(kmers, self.sketch_size, seed=self.seed)
+
+    def add(self, seq):
+        """Sketches the given sequence and adds it to the index. Each sequence
+        is only indexed once.
+
+        Args:
+            seq (sequence.Sequence): The sequence to be indexed.
+
+        Returns:
+            int: the integer identifier of the sequence in the index.
+        """
+        if seq.content_id in self._ids_by_content:
+            return self._ids_by_content[seq.content_id]
+        seqid = len(self.sketches)
+        sketch = self.sketch(seq)
+        self.sketches.append(sketch)
+        self._ids_by_content[seq.content_id] = seqid
+        for hash_value in sketch.hashes.tolist():
+            self._postings.setdefault(hash_value, []).append(seqid)
+        return seqid
+
+    def similarity(self, id0, id1, measure='jaccard'):
+        """Estimates the similarity of two indexed sequences.
+
+        Args:
+            id0 (int): identifier of the 1st sequence.
+            id1 (int): identifier of the 2nd sequence.
+
+        Keyword Args:
+            measure (str): either ``jaccard`` or ``containment``. In the latter
+                case the larger of the two containments (i.e that of the
+                sequence with fewer kmers in the other) is returned, which is
+                the relevant measure for overlapping reads of different
+                lengths; default is ``jaccard``.
+
+        Returns:
+            float: estimated similarity.
+        """
+        sk0, sk1 = self.sketches[id0], self.sketches[id1]
+        if measure == 'jaccard':
+            return sk0.jaccard(sk1)
+        elif measure == 'containment':
+            return max(sk0.containment(sk1), sk1.containment(sk0))
+        else:
+            raise ValueError('unknown similarity measure %s' % measure)
+
+    def shared_hashes(self):
+        """Counts the number of hash values shared between all pairs of
+        indexed sequences using the inverted index, without considering pairs
+        which share none.
+
+        Returns:
+            dict: number of shared hash values keyed by pairs ``(id0, id1)``
+            of sequence identifiers with ``id0 < id1``.
+        """
+        counts = {}
+        for ids in self._postings.itervalues():
+            for pair in combinations(ids, 2):
+                counts[pair] = counts.get(pair, 0) + 1
+        return counts
+
+    def candidate_pairs(self, threshold, measure='jaccard'):
+        """Finds all pairs of indexed sequences whose estimated similarity is
+        at least the given threshold.
+
+        Args:
+            threshold (float): minimum estimated similarity, must be
+                positive.
+
+        Keyword Args:
+            measure (str): the similarity measure, cf. :func:`similarity`.
+
+        Yields:
+            tuple: ``(id0, id1, similarity)`` with ``id0 < id1`` in
+            lexicographic order of ids.
+        """
+        assert 0 < threshold <= 1, 'threshold must be in (0, 1]'
+        self.log('finding candidate pairs among %d sketches' %
+                 len(self.sketches))
+        for id0, id1 in sorted(self.shared_hashes()):
+            score = self.similarity(id0, id1, measure=measure)
+            if score >= threshold:
+                yield id0, id1, score
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from itertools import combinations
+from itertools import combinations, groupby
 import logging
 import numpy as np
 import sys
@@ -8,6 +8,7 @@ from time import time
 
 from biseqt.util import ProgressIndicator
 from biseqt.blot import WordBlotOverlap, WordBlotOverlapRef
+from biseqt.sketches import SketchIndex
 from biseqt.sequence import Alphabet
 from biseqt.stochastics import rand_seq, MutationProcess
 
@@ -259,18 +260,39 @@ def sim_overlap_sequencing_reads(**kw):
 
     num_reads = len(reads)
     assert len(reads) == len(mappings)
-    num_total = (num_reads * (num_reads - 1)) / 2
-    log('finding all overlapping pairs of reads')
+    t_start = time()
+    # optionally, only compare pairs whose MinHash containment estimate is
+    # above the given threshold; other pairs are reported as not overlapping.
+    min_containment = kw.get('min_containment', None)
+    if min_containment is None:
+        pairs = list(combinations(range(num_reads), 2))
+    else:
+        log('sketching reads to find candidate overlapping pairs')
+        sketch_index = SketchIndex(alphabet=A, wordlen=wordlen,
+                                   sketch_size=kw.get('sketch_size', 1000),
+                                   log_level=logging.WARN)
+        # reads of identical contents share an id in the sketch index
+        reads_by_id = {}
+        for idx, read in enumerate(reads):
+            reads_by_id.setdefault(sketch_index.add(read), []).append(idx)
+        pairs = [(i, j) for idxs in reads_by_id.values()
+                 for i, j in combinations(idxs, 2)]
+        for id0, id1, _ in sketch_index.candidate_pairs(
+                min_containment, measure='containment'):
+            pairs += [tuple(sorted((i, j))) for i in reads_by_id[id0]
+                      for j in reads_by_id[id1]]
+        pairs.sort()
+    num_total = len(pairs)
+    log('finding overlapping pairs among %d pairs of reads' % num_total)
     indic = ProgressIndicator(num_total=num_total, percentage=False)
     indic.start()
-    t_start = time()
-    for i in range(num_reads - 1):
+    for i, read_pairs in groupby(pairs, key=lambda pair: pair[0]):
         WB = WordBlotOverlapRef(reads[i], **WB_kw)
-        for j in range(i + 1, num_reads):
+        for _, j in read_pairs:
             indic.progress()
             res = WB.highest_scoring_overlap_band(reads[j])
             sim_data['overlap_band'][(i, j)] = res
-    sim_data['avg_time'] = (time() - t_start) / num_total
+    sim_data['avg_time'] = (time() - t_start) / max(num_total, 1)
     indic.finish()
     return sim_data
 
@@ -291,7 +313,7 @@ def plot_sequencing_reads_overlap(sim_data, suffix=''):
 
     pos, neg = [], []
     for i, j in combinations(range(len(reads)), 2):
-        if sim_data['overlap_band'][(i, j)] is None:
+        if sim_data['overlap_band'].get((i, j), None) is None:
             p_hat = 0
         else:
             p_hat = sim_data['overlap_band'][(i, j)]['p']
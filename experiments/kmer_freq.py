@@ -2,7 +2,7 @@
 import numpy as np
 from util import log, savefig, with_dumpfile
 from biseqt.sequence import Alphabet, Sequence
-from biseqt.kmers import KmerIndex
+from biseqt.kmers import MultiKmerIndex
 from matplotlib import pyplot as plt
 
 
@@ -26,16 +26,12 @@ def count_kmers(source_path, ws, **kw):
         'ws': ws,
         'len': len(seq)
     }
+    # all word lengths are indexed in one pass over the sequence
+    path = 'dumpfiles/w=%s-kmer-freqs.db' % ','.join(str(w) for w in ws)
+    kmer_index = MultiKmerIndex(alphabet=A, wordlens=ws, path=path)
+    kmer_index.index_kmers(seq)
     for w in ws:
-        path = 'dumpfiles/w=%d-kmer-freqs.db' % w
-        kmer_index = KmerIndex(alphabet=A, wordlen=w, path=path)
-        kmer_index.index_kmers(seq)
-        with kmer_index.connection() as conn:
-            cursor = conn.cursor()
-            q = 'SELECT COUNT(*), kmer FROM %s GROUP BY kmer' % \
-                kmer_index.kmers_table
-            cursor.execute(q)
-            sim_data['counts'][w] = list(row[0] for row in cursor)
+        sim_data['counts'][w] = kmer_index.kmer_counts(w).values()
     return sim_data
 
 
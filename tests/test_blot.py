@@ -2,12 +2,14 @@
 import pytest
 import numpy as np
 
+from biseqt import blot
 from biseqt.sequence import Alphabet
 from biseqt.stochastics import rand_seq, MutationProcess
 from biseqt.blot import find_peaks
 from biseqt.blot import band_radius
 from biseqt.blot import expected_overlap_len
 from biseqt.blot import band_radii
+from biseqt.blot import plan_wordlen, plan_word_blot
 from biseqt.blot import WordBlot, WordBlotLocalRef
 from biseqt.blot import WordBlotMultiple, WordBlotMultipleFast
 from biseqt.blot import WordBlotOverlap, WordBlotOverlapRef
@@ -94,6 +96,35 @@ def test_band_radii():
         'radius must increase with expected length'
 
 
+def test_plan_wordlen():
+    model = {'g_max': .1, 'sensitivity': .99}
+    wordlen = plan_wordlen(10 ** 4, 10 ** 4, 4, 200, .8, **model)
+    assert plan_wordlen(10 ** 4, 10 ** 4, 4, 200, .8, max_seeds=1000,
+                        **model) > wordlen, \
+        'smaller seed budgets should require longer words'
+    assert plan_wordlen(10 ** 4, 10 ** 4, 4, 200, .7, **model) >= wordlen, \
+        'weaker similarities should require longer words'
+    with pytest.raises(MemoryError):
+        plan_wordlen(10 ** 7, 10 ** 7, 4, 50, .6, **model)
+
+
+def test_plan_word_blot():
+    A = Alphabet('ACGT')
+    M = MutationProcess(A, go_prob=.05, ge_prob=.05, subst_probs=.05)
+    S = rand_seq(A, 1500)
+    T = rand_seq(A, 500) + M.mutate(S[500:1000])[0] + rand_seq(A, 500)
+    kw = {'alphabet': A, 'g_max': .2, 'sensitivity': .99, 'path': ':memory:'}
+    WB = plan_word_blot(S, T, 300, .8, **kw)
+    assert WB.backend == 'memory', 'few seeds should be kept in memory'
+    found = list(WB.similar_segments(300, .8))
+    assert len(found) == 1, 'the similarity should be found'
+
+    WB = plan_word_blot(S, T, 300, .8, allowed_memory=5e-4, max_seeds=10 ** 6,
+                        **kw)
+    assert WB.backend == 'sqlite' and WB.mmap_size, \
+        'seeds not fitting in memory should be stored in memory-mapped SQLite'
+
+
 def test_overlap_band_radius():
     n = 50  # sequence lengths
     g = .1
@@ -128,10 +159,13 @@ def test_local_similarity(wordlen, K, n):
     p_match = (1 - gap) * (1 - subst) * .9
 
     found_homs = {}
-    for mode in ['standard', 'ref']:
+    for mode in ['standard', 'runs', 'ref', 'compressed', 'fm_index']:
         if mode == 'standard':
             WB = WordBlot(S, T, **WB_kw)
             found_homs[mode] = list(WB.similar_segments(K, p_match))
+        elif mode == 'runs':
+            WB = WordBlot(S, T, runs=True, **WB_kw)
+            found_homs[mode] = list(WB.similar_segments(K, p_match))
         elif mode == 'ref':
             if wordlen > 12:
                 with pytest.raises(MemoryError):
@@ -139,6 +173,12 @@ def test_local_similarity(wordlen, K, n):
             else:
                 WB_ref = WordBlotLocalRef(S, allowed_memory=1, **WB_kw)
                 found_homs[mode] = list(WB_ref.similar_segments(T, K, p_match))
+        elif mode == 'compressed':
+            WB_ref = WordBlotLocalRef(S, compressed=True, **WB_kw)
+            found_homs[mode] = list(WB_ref.similar_segments(T, K, p_match))
+        elif mode == 'fm_index':
+            WB_ref = WordBlotLocalRef(S, fm_index=True, **WB_kw)
+            found_homs[mode] = list(WB_ref.similar_segments(T, K, p_match))
 
     for mode, homs in found_homs.items():
         assert len(homs) == 1, \
@@ -151,6 +191,97 @@ def test_local_similarity(wordlen, K, n):
             'estimated match prob should be close to truth (mode: %s)' % mode
 
 
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+def test_inversion_similarity(backend, monkeypatch):
+    gap, subst = .05, .05
+    A = Alphabet('ACGT')
+    M = MutationProcess(A, subst_probs=subst, ge_prob=gap, go_prob=gap)
+    WB_kw = {'g_max': .2, 'sensitivity': .99, 'alphabet': A, 'wordlen': 8,
+             'path': ':memory:', 'backend': backend}
+    K, n = 500, 2000
+    fwd, inv = rand_seq(A, K), rand_seq(A, K)
+    S = A.parse(str(fwd) + str(rand_seq(A, n)) + str(inv))
+    T = A.parse(str(M.mutate(fwd)[0]) + str(rand_seq(A, n)) +
+                str(M.mutate(inv)[0].reverse().transform(['AT', 'CG'])))
+    p_match = (1 - gap) * (1 - subst) * .9
+
+    WB = WordBlot(S, T, both_strands=True, **WB_kw)
+    homs = list(WB.similar_segments(K, p_match))
+    assert [rec['strand'] for rec in homs] == [1, -1], \
+        'similarities of both strands should be found in order'
+    # the inversion starts T's reverse complement
+    for rec, (i_start, j_start) in zip(homs, [(0, 0), (n + K, 0)]):
+        (i_min, i_max), (j_min, j_max) = WB.to_ij_coordinates_seg(
+            rec['segment'])
+        assert i_min < i_start + K / 5 < i_max and \
+            j_min < j_start + K / 5 < j_max, \
+            'similar segment coordinates must be correct'
+        assert 0.8 * p_match <= rec['p'] <= 1.2 * p_match, \
+            'estimated match prob should be close to truth'
+
+    monkeypatch.setattr(blot, 'SEGMENT_BATCH', 1)
+    calls = []
+    score_reverse = WB.reverse.score_seeds
+    monkeypatch.setattr(WB.reverse, 'score_seeds',
+                        lambda K: calls.append(K) or score_reverse(K))
+    homs = WB.similar_segments(K, p_match)
+    assert next(homs)['strand'] == 1 and not calls, \
+        'segments should be yielded before later strands are scored'
+    assert [rec['strand'] for rec in homs] == [-1] and calls, \
+        'segments of later strands should follow'
+
+
+@pytest.mark.parametrize('runs', [False, True], ids=['no-runs', 'runs'])
+def test_repeat_similarity(runs):
+    gap, subst = .05, .05
+    A = Alphabet('ACGT')
+    M = MutationProcess(A, subst_probs=subst, ge_prob=gap, go_prob=gap)
+    WB_kw = {'g_max': .2, 'sensitivity': .99, 'alphabet': A, 'wordlen': 8}
+    K = 200
+    hom, unit = rand_seq(A, K), rand_seq(A, 10)
+    # an interspersed repeat and a tandem repeat straddling the diagonal
+    S = A.parse(str(rand_seq(A, 500)) + str(hom) + str(rand_seq(A, 500)) +
+                str(M.mutate(hom)[0]) + str(rand_seq(A, 500)) +
+                str(M.mutate(A.parse(str(unit) * 30))[0]) +
+                str(rand_seq(A, 500)))
+    p_match = (1 - gap) * (1 - subst) * .9
+
+    WB = WordBlot(S, S, runs=runs, **WB_kw)
+    found = sorted((rec['segment'], rec['p'])
+                   for rec in WB.similar_segments(K, p_match))
+    if not runs:
+        # seeds against a reference are found in both halves of the dot plot
+        WB_ref = WordBlotLocalRef(S, **WB_kw)
+        expected = sorted((rec['segment'], rec['p'])
+                          for rec in WB_ref.similar_segments(S, K, p_match))
+        assert len(found) == len(expected) and all(
+            seg0 == seg1 and abs(p0 - p1) < .01
+            for (seg0, p0), (seg1, p1) in zip(found, expected)
+        ), 'self comparisons should find the same segments as full dot plots'
+    segments = set(seg for seg, _ in found)
+    assert all(((-d_max, -d_min), a_band) in segments
+               for (d_min, d_max), a_band in segments), \
+        'segments of self comparisons should be symmetric'
+    assert any(d_min < 0 < d_max for (d_min, d_max), _ in segments), \
+        'tandem repeats should give segments straddling the main diagonal'
+    assert any(-K - 600 < d_min < -K - 400 for (d_min, _), _ in segments), \
+        'interspersed repeats should be found'
+
+
+def test_find_all_neighbors():
+    d_radius, a_radius = 4, 20
+    ds = np.random.randint(-50, 50, size=300)
+    as_ = np.random.randint(0, 500, size=300)
+    indptr, indices = WordBlot.find_all_neighbors((ds, as_), d_radius,
+                                                  a_radius)
+    for idx in range(len(ds)):
+        expected = [other for other in range(len(ds)) if other != idx and
+                    abs(ds[idx] - ds[other]) <= d_radius and
+                    abs(as_[idx] - as_[other]) <= a_radius]
+        assert sorted(indices[indptr[idx]:indptr[idx + 1]]) == expected, \
+            'neighbors should be found as arrays without per-seed objects'
+
+
 @pytest.mark.parametrize('wordlen', [8, 15],
                          ids=['k=8', 'k=15'])
 @pytest.mark.parametrize('K', [500, 1000],
@@ -169,11 +300,18 @@ def test_overlap_detection(wordlen, K, n):
     S = rand_seq(A, n - K) + overlap
     T = M.mutate(overlap)[0] + rand_seq(A, n - K)
     recs = {}
-    for mode in ['standard', 'ref']:
+    for mode in ['standard', 'ref', 'compressed', 'reverse']:
         if mode == 'standard':
             WBO = WordBlotOverlap(S, T, **WB_kw)
             rec = WBO.highest_scoring_overlap_band()
             recs[mode] = rec
+        elif mode == 'reverse':
+            # the overlap is on the reverse strand of the reverse complement
+            T_rc = T.reverse().transform(mappings=['AT', 'CG'])
+            WBO = WordBlotOverlap(S, T_rc, both_strands=True, **WB_kw)
+            rec = WBO.highest_scoring_overlap_band()
+            assert rec['strand'] == -1, 'overlap strand must be detected'
+            recs[mode] = rec
         elif mode == 'ref':
             if wordlen > 12:
                 with pytest.raises(MemoryError):
@@ -182,6 +320,9 @@ def test_overlap_detection(wordlen, K, n):
                 WBO_ref = WordBlotOverlapRef(S, allowed_memory=1, **WB_kw)
                 rec = WBO_ref.highest_scoring_overlap_band(T)
                 recs[mode] = rec
+        elif mode == 'compressed':
+            WBO_ref = WordBlotOverlapRef(S, compressed=True, **WB_kw)
+            recs[mode] = WBO_ref.highest_scoring_overlap_band(T)
     for mode, rec in recs.items():
         d_min, d_max = rec['d_band']
         p_hat = rec['p']
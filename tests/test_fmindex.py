@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import pytest
+import numpy as np
+
+from biseqt.stochastics import rand_seq
+from biseqt.sequence import Alphabet, Sequence
+from biseqt import fmindex
+from biseqt.fmindex import suffix_array, FMIndex
+
+
+@pytest.mark.parametrize('length', [0, 1, 10, 500],
+                         ids=lambda n: 'n=%d' % n)
+def test_suffix_array(length):
+    A = Alphabet('ACGT')
+    text = list(rand_seq(A, length).contents) if length else []
+    assert suffix_array(text).tolist() == \
+        sorted(range(length), key=lambda i: text[i:]), \
+        'suffix array should sort all suffixes'
+    text = [0] * length
+    assert suffix_array(text).tolist() == range(length)[::-1], \
+        'shorter suffixes of a repeat should come first'
+
+
+def test_fm_index_locate():
+    A = Alphabet('ACGT')
+    S = rand_seq(A, 2000)
+    fm_index = FMIndex(S, occ_sample=16, sa_sample=8)
+    S_str = str(S)
+    for pattern in ['A', 'CG', 'TTAC', S_str[100:110], S_str[-5:]]:
+        expected = [i for i in range(len(S)) if S_str.startswith(pattern, i)]
+        lo, hi = fm_index.interval(A.parse(pattern))
+        assert fm_index.count(A.parse(pattern)) == len(expected), \
+            'occurrences of patterns should be counted'
+        assert fm_index.locate(lo, hi).tolist() == expected, \
+            'occurrences of patterns should be located'
+
+
+def test_fm_index_matches(monkeypatch):
+    A = Alphabet('ACGT')
+    S = rand_seq(A, 1000)
+    # the unrelated middle part does not extend the matches with S
+    middle = list(rand_seq(A, 100).contents)
+    middle[0] = (S.contents[400] + 1) % len(A)
+    middle[-1] = (S.contents[599] + 1) % len(A)
+    T = S[200:400] + Sequence(A, middle) + S[600:700]
+    fm_index = FMIndex(S)
+    assert fm_index.nbytes < 2 * len(S), \
+        'FM-index should use less than 2 bytes per base'
+    assert fm_index.nbytes == FMIndex.estimate_nbytes(len(S), len(A)), \
+        'FM-index size should be known before it is built'
+    S_str, T_str = str(S), str(T)
+
+    pos_S, pos_T = fm_index.matches(T, 6)
+    expected = sorted((i, j) for j in range(len(T) - 5)
+                      for i in range(len(S) - 5)
+                      if S_str[i:i + 6] == T_str[j:j + 6])
+    assert sorted(zip(pos_S.tolist(), pos_T.tolist())) == expected, \
+        'all exact matches of given length should be found'
+    assert np.all(np.diff(pos_T) >= 0), 'matches should be sorted by query'
+    # queries are processed in chunks of fixed size
+    monkeypatch.setattr(fmindex, 'CHUNK_SIZE', 7)
+    assert sorted(zip(*[pos.tolist() for pos in fm_index.matches(T, 6)])) \
+        == expected, 'exact matches should be found in chunks'
+    monkeypatch.undo()
+
+    pos_S, pos_T, lens = fm_index.mems(T, 20)
+    mems = set(zip(pos_S.tolist(), pos_T.tolist(), lens.tolist()))
+    assert (200, 0, 200) in mems and (600, 300, 100) in mems, \
+        'maximal exact matches should be found'
+    for i, j, length in mems:
+        assert S_str[i:i + length] == T_str[j:j + length], \
+            'maximal exact matches should match'
+        assert i + length == len(S) or j + length == len(T) or \
+            S_str[i + length] != T_str[j + length], \
+            'maximal exact matches should not extend to the right'
+
+    smems = fm_index.smems(T, min_len=20)
+    assert [(start, end) for start, end, _ in smems] == \
+        [(0, 200), (300, 400)], 'super-maximal exact matches should be found'
+    assert [pos.tolist() for _, _, pos in smems] == [[200], [600]], \
+        'super-maximal exact matches should be located'
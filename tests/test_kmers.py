@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
+import os
+import time
+import apsw
 import pytest
-from itertools import product
+import numpy as np
+from itertools import chain, product
 from random import choice
+from tempfile import NamedTemporaryFile
+from threading import Thread
 
 from biseqt.stochastics import rand_seq
 from biseqt.sequence import Alphabet, Sequence
 from biseqt.kmers import kmer_as_int, as_kmer_seq, KmerIndex, KmerCache
+from biseqt.kmers import kmer_shard, kmer_neighbors, KmerBloomFilter
+from biseqt.kmers import CompressedPostings, as_kmer_arrays, MultiKmerIndex
+from biseqt.kmers import sliding_min, kmers_as_ints, ints_as_kmers
+from biseqt.kmers import ints_as_strs
 
 
 def test_kmer_as_int_limitations():
@@ -68,6 +78,86 @@ def test_as_kmer_seq(alphabet, wordlen):
         'correct number of kmers should be scanned'
 
 
+@pytest.mark.parametrize('alphabet',
+                         [Alphabet('ACGT'), Alphabet(['00', '01', '11'])],
+                         ids=['one-letter alphabet', 'two-letter alphabet'])
+@pytest.mark.parametrize('wordlen', [1, 6, 20], ids=['w=1', 'w=6', 'w=20'])
+def test_batch_kmer_encoding(alphabet, wordlen):
+    kmers = np.random.randint(0, len(alphabet), size=(100, wordlen))
+    codes = kmers_as_ints(kmers, len(alphabet))
+    expected = [kmer_as_int(kmer, alphabet) for kmer in kmers]
+    assert codes.tolist() == expected, \
+        'batch encoding should agree with kmer_as_int'
+    assert np.all(ints_as_kmers(codes, wordlen, len(alphabet)) == kmers), \
+        'decoding should invert encoding'
+    expected = [str(Sequence(alphabet, kmer.tolist())) for kmer in kmers]
+    assert ints_as_strs(codes, wordlen, alphabet) == expected, \
+        'kmers should be translated to strings of letters'
+
+
+@pytest.mark.parametrize('mask', [[], [set([0]), set([1, 2])]],
+                         ids=['no mask', 'with mask'])
+def test_as_kmer_arrays(mask):
+    A = Alphabet('ACGT')
+    S = rand_seq(A, 200) + A.parse('AAAAAAAAAACGCGCGCGCG')
+    wordlens = [3, 7, 11, 300]
+    kmer_arrays = as_kmer_arrays(S, wordlens, mask=mask)
+    assert sorted(kmer_arrays) == wordlens, \
+        'kmers of all word lengths should be computed'
+    for w in wordlens:
+        expected = [-1 if kmer is None else kmer
+                    for kmer in as_kmer_seq(S, w, mask=mask)]
+        assert kmer_arrays[w].tolist() == expected, \
+            'rolling kmers should agree with as_kmer_seq'
+
+
+@pytest.mark.parametrize('width', [1, 4, 7, 50], ids=lambda w: 'w=%d' % w)
+def test_sliding_min(width):
+    values = np.random.randint(0, 40, size=49)
+    expected = [min(values[i: i + width])
+                for i in range(len(values) - width + 1)]
+    assert list(sliding_min(values, width)) == expected, \
+        'sliding minimum should be the minimum of each window'
+
+
+def test_quality_masked_kmers():
+    A = Alphabet('ACGT')
+    wordlen = 4
+    S = rand_seq(A, 30)
+    quals = np.array([30] * 30)
+    quals[10] = 5
+    kmers = as_kmer_seq(S, wordlen, quals=quals, min_qual=20)
+    masked = [pos for pos, kmer in enumerate(kmers) if kmer is None]
+    assert masked == range(7, 11), \
+        'kmers covering low quality bases should be masked'
+
+    kmer_index = KmerIndex(path=':memory:', alphabet=A, wordlen=wordlen,
+                           min_qual=20)
+    seqid = kmer_index.index_kmers(S, quals=quals)
+    hits = set(chain(*[kmer_index.hits(kmer) for kmer in kmer_index.kmers()]))
+    assert hits == set((seqid, pos) for pos, kmer in enumerate(kmers)
+                       if kmer is not None), \
+        'low quality kmers should not be indexed'
+
+
+@pytest.mark.parametrize('max_mismatches', [1, 2], ids=['m=1', 'm=2'])
+def test_kmer_neighbors(max_mismatches):
+    A = Alphabet('ACGT')
+    wordlen = 5
+    kmer = (0, 1, 2, 3, 0)
+    neighbors = kmer_neighbors(kmer_as_int(kmer, A), wordlen, len(A),
+                               max_mismatches=max_mismatches)
+    expected = [kmer_as_int(other, A)
+                for other in product(range(len(A)), repeat=wordlen)
+                if sum(x != y for x, y in zip(kmer, other)) <= max_mismatches]
+    assert neighbors[0] == kmer_as_int(kmer, A), \
+        'the kmer itself should be the first neighbor'
+    assert len(neighbors) == len(set(neighbors)), \
+        'each neighbor should be enumerated once'
+    assert set(neighbors) == set(expected), \
+        'neighbors should be exactly the kmers within Hamming distance'
+
+
 @pytest.fixture(ids=['wordlen 3', 'wordlen 13'], params=[3, 13])
 def dna_kmer_index(request):
     """Returns a kmer index created on top of a sequence database (i.e
@@ -95,6 +185,295 @@ def test_index_kmers(dna_kmer_index):
         'different sequences should have different seqids'
 
 
+@pytest.mark.parametrize('in_memory', [True, False],
+                         ids=['in memory', 'on disk'])
+def test_sharded_kmer_index(in_memory):
+    A = Alphabet('ACGT')
+    wordlen, num_shards = 4, 3
+    seqs = [rand_seq(A, 100), A.parse('A' * 50)]
+
+    def _tests(path):
+        kw = {'path': path, 'alphabet': A, 'wordlen': wordlen}
+        plain_index = KmerIndex(name='plain', **kw)
+        sharded_index = KmerIndex(name='sharded', num_shards=num_shards, **kw)
+        for seq in seqs:
+            assert plain_index.index_kmers(seq) == \
+                sharded_index.index_kmers(seq), \
+                'sharding should not affect sequence ids'
+        assert sharded_index.index_kmers(seqs[0]) == 1, \
+            'same sequence should not be indexed twice in a sharded index'
+
+        kmers = plain_index.kmers()
+        assert sorted(kmers) == sorted(sharded_index.kmers()), \
+            'sharded index should observe the same kmers'
+        for kmer in kmers:
+            assert sorted(plain_index.hits(kmer)) == \
+                sorted(sharded_index.hits(kmer)), \
+                'sharded index should find the same hits'
+        shards_used = set(kmer_shard(kmer, num_shards) for kmer in kmers)
+        assert shards_used == set(range(num_shards)), \
+            'kmers should be spread among all shards'
+        if not in_memory:
+            for idx in range(num_shards):
+                assert os.path.exists(sharded_index.shard_path(idx)), \
+                    'each shard should be stored in a separate file'
+                os.remove(sharded_index.shard_path(idx))
+
+    if in_memory:
+        _tests(':memory:')
+    else:
+        with NamedTemporaryFile() as f:
+            _tests(f.name)
+
+
+@pytest.mark.parametrize('num_shards', [1, 3], ids=['unsharded', 'sharded'])
+def test_clustered_kmer_index(num_shards):
+    A = Alphabet('ACGT')
+    kw = {'path': ':memory:', 'alphabet': A, 'wordlen': 4,
+          'num_shards': num_shards}
+    plain_index = KmerIndex(name='plain', **kw)
+    clustered_index = KmerIndex(name='clustered', clustered=True, **kw)
+    seqs = [rand_seq(A, 100), rand_seq(A, 50), A.parse('A' * 20)]
+    for seq in seqs + seqs[:1]:
+        plain_index.index_kmers(seq)
+        clustered_index.index_kmers(seq)
+
+    kmers = plain_index.kmers()
+    assert sorted(kmers) == sorted(clustered_index.kmers()), \
+        'clustered index should observe the same kmers'
+    for kmer in kmers:
+        assert sorted(plain_index.hits(kmer)) == \
+            sorted(clustered_index.hits(kmer)), \
+            'clustered index should find the same hits'
+    counts = clustered_index.kmer_counts()
+    assert counts == plain_index.kmer_counts(), \
+        'clustered index should keep correct kmer counts'
+    assert sum(counts.values()) == sum(len(seq) - 3 for seq in seqs), \
+        'kmer counts should add up to the number of kmers'
+
+
+@pytest.mark.parametrize('clustered', [False, True],
+                         ids=['plain', 'clustered'])
+def test_sharded_kmer_index_failure(clustered):
+    A = Alphabet('ACGT')
+    kw = {'path': ':memory:', 'alphabet': A, 'wordlen': 4, 'num_shards': 3,
+          'clustered': clustered}
+    plain_index = KmerIndex(name='plain', **kw)
+    sharded_index = KmerIndex(name='sharded', **kw)
+    S = rand_seq(A, 200)
+
+    def _hits(index):
+        return {kmer: sorted(index.hits(kmer)) for kmer in range(4 ** 4)}
+
+    # one shard fails to insert while the others succeed
+    failing = sharded_index.shards[1]
+    with failing.connection() as conn:
+        conn.cursor().execute('DROP TABLE %s' % sharded_index.kmers_table)
+    with pytest.raises(Exception):
+        sharded_index.index_kmers(S)
+    with sharded_index.connection() as conn:
+        q = 'SELECT COUNT(*) FROM %s' % sharded_index.log_table
+        assert conn.cursor().execute(q).next()[0] == 0, \
+            'sequence should not be logged unless all shards commit'
+    for shard in [sharded_index.shards[0], sharded_index.shards[2]]:
+        with shard.connection() as conn:
+            q = 'SELECT COUNT(*) FROM %s' % sharded_index.kmers_table
+            assert conn.cursor().execute(q).next()[0] == 0, \
+                'hits in shards that committed should be discarded'
+
+    with failing.connection() as conn:
+        conn.cursor().execute(sharded_index.kmers_table_script)
+    # a crashed insert left orphan hits behind with the same seqid
+    with sharded_index.shards[0].connection() as conn:
+        q = 'INSERT INTO %s (kmer, seqid, pos) VALUES (?, ?, ?)' % \
+            sharded_index.kmers_table
+        conn.cursor().executemany(q, [(0, 1, 0), (0, 1, 1000)])
+        if clustered:
+            q = 'INSERT OR REPLACE INTO %s (kmer, count) VALUES (0, 2)' % \
+                sharded_index.counts_table
+            conn.cursor().execute(q)
+    assert sharded_index.index_kmers(S) == plain_index.index_kmers(S) == 1
+    assert _hits(sharded_index) == _hits(plain_index), \
+        'retried insert should leave no orphan or duplicate hits'
+    if clustered:
+        assert sharded_index.kmer_counts() == plain_index.kmer_counts(), \
+            'kmer counts should not include orphan hits'
+
+
+@pytest.mark.parametrize('fp_rate', [.01, .1], ids=['p=0.01', 'p=0.1'])
+def test_bloom_filter(fp_rate):
+    n = 5000
+    bloom_filter = KmerBloomFilter(capacity=n, fp_rate=fp_rate)
+    bloom_filter.add(range(n))
+    assert all(bloom_filter.contains(range(n))), \
+        'Bloom filter should not give false negatives'
+    fps = bloom_filter.contains(range(n, 11 * n)).mean()
+    assert fps < 1.5 * fp_rate, \
+        'Bloom filter should respect the false positive rate'
+
+    kmers = range(0, 11 * n, 7)
+    assert [kmer in bloom_filter for kmer in kmers] == \
+        bloom_filter.contains(kmers).tolist(), \
+        'single kmer membership should agree with batch membership'
+    restored = KmerBloomFilter(num_bits=bloom_filter.num_bits,
+                               num_hashes=bloom_filter.num_hashes,
+                               bits=bloom_filter.bits.copy())
+    assert all(kmer in restored for kmer in range(n)), \
+        'Bloom filter should be restorable from its bits'
+
+
+def test_kmer_index_bloom_filter():
+    A = Alphabet('ACGT')
+    wordlen = 8
+    S, T = rand_seq(A, 200), rand_seq(A, 200)
+    with NamedTemporaryFile() as f:
+        kw = {'path': f.name, 'alphabet': A, 'wordlen': wordlen}
+        plain_index = KmerIndex(name='plain', **kw)
+        kmer_index = KmerIndex(name='bloom', bloom_fp_rate=.01, **kw)
+        for kmer_index_ in [plain_index, kmer_index]:
+            kmer_index_.index_kmers(S)
+        kmers = range(len(A) ** wordlen)[::37]
+        for kmer in kmers:
+            assert kmer_index.hits(kmer) == plain_index.hits(kmer), \
+                'Bloom filter should not affect hits'
+        assert kmer_index.hits_many(kmers) == \
+            [plain_index.hits(kmer) for kmer in kmers], \
+            'Bloom filter should not affect batch hits'
+        num_bits = kmer_index.bloom_filter().num_bits
+
+        restored = KmerIndex(name='bloom', bloom_fp_rate=.01, **kw)
+        assert all(restored.bloom_filter().bits ==
+                   kmer_index.bloom_filter().bits), \
+            'Bloom filter should be stored with the index'
+
+        restored.index_kmers(T)
+        for kmer in as_kmer_seq(T, wordlen):
+            assert restored.hits(kmer), \
+                'Bloom filter should be rebuilt when sequences are indexed'
+        assert restored.bloom_filter().num_bits > num_bits, \
+            'rebuilt Bloom filter should be sized for new kmers'
+        assert all(kmer_index.hits_many(as_kmer_seq(T, wordlen))), \
+            'Bloom filters cached by other instances should not go stale'
+        assert kmer_index.bloom_filter().num_bits == \
+            restored.bloom_filter().num_bits, \
+            'stale Bloom filters should be reloaded from the database'
+
+
+def test_kmer_index_bloom_filter_speed():
+    A = Alphabet('ACGT')
+    wordlen = 12
+    S = rand_seq(A, 2000)
+    with NamedTemporaryFile() as f:
+        kw = {'path': f.name, 'alphabet': A, 'wordlen': wordlen}
+        plain_index = KmerIndex(name='plain', **kw)
+        kmer_index = KmerIndex(name='bloom', bloom_fp_rate=.01, **kw)
+        for kmer_index_ in [plain_index, kmer_index]:
+            kmer_index_.index_kmers(S)
+        present = set(as_kmer_seq(S, wordlen))
+        absent = [kmer for kmer in range(0, len(A) ** wordlen, 4099)
+                  if kmer not in present]
+        kmer_index.bloom_filter()
+
+        def _time(func):
+            start = time.time()
+            for _ in range(3):
+                func()
+            return time.time() - start
+
+        plain = _time(lambda: [plain_index.hits(kmer) for kmer in absent])
+        bloom = _time(lambda: [kmer_index.hits(kmer) for kmer in absent])
+        assert bloom < plain, \
+            'Bloom filter should speed up lookups of absent kmers'
+        bloom = _time(lambda: kmer_index.hits_many(absent))
+        assert bloom < plain, \
+            'Bloom filter should speed up batch lookups of absent kmers'
+
+
+@pytest.mark.parametrize('wordlen', [4, 12], ids=['w=4', 'w=12'])
+def test_compressed_postings(wordlen):
+    A = Alphabet('ACGT')
+    S = rand_seq(A, 20000) + A.parse('A' * 300)
+    kmer_seq = as_kmer_seq(S, wordlen, mask=[set([0])])
+    postings = CompressedPostings(kmer_seq)
+    hits = {}
+    for pos, kmer in enumerate(kmer_seq):
+        if kmer is not None:
+            hits.setdefault(kmer, []).append(pos)
+    assert len(postings) == sum(len(x) for x in hits.values()), \
+        'all unmasked kmer occurrences should be indexed'
+    assert list(postings.kmers) == sorted(hits), \
+        'all distinct kmers should be in the directory'
+    for kmer, positions in hits.items():
+        decoded = postings.hits(kmer)
+        assert decoded.dtype == np.int64 and list(decoded) == positions, \
+            'compressed postings should decode to the correct positions'
+    assert postings[0] == [] and postings[len(A) ** wordlen] == [], \
+        'absent kmers should have no hits'
+    assert postings.nbytes < 4 * len(postings) + 8 * len(hits), \
+        'compressed postings should use a few bytes per occurrence'
+    estimate = CompressedPostings.estimate_nbytes(
+        len(postings), len(hits), len(kmer_seq), len(A) ** wordlen - 1)
+    assert abs(estimate - postings.nbytes) < .1 * postings.nbytes, \
+        'size of compressed postings should be known before building'
+
+
+def test_compressed_postings_density():
+    # many occurrences per kmer as in a large read set: the 8-byte directory
+    # entry of each kmer is amortized and deltas take 2 bytes each.
+    A = Alphabet('ACGT')
+    wordlen = 6
+    kmer_seq = as_kmer_seq(rand_seq(A, 200000), wordlen)
+    postings = CompressedPostings(kmer_seq)
+    assert 2 <= float(postings.nbytes) / len(postings) <= 3, \
+        'compressed postings should use 2-3 bytes per occurrence'
+
+
+def test_multi_kmer_index():
+    A = Alphabet('ACGT')
+    wordlens = [3, 5, 8]
+    seqs = [rand_seq(A, 100), rand_seq(A, 50), A.parse('A' * 20)]
+    multi_index = MultiKmerIndex(path=':memory:', alphabet=A,
+                                 wordlens=wordlens)
+    for w in wordlens:
+        kmer_index = KmerIndex(path=':memory:', alphabet=A, wordlen=w)
+        for seq in seqs:
+            assert kmer_index.index_kmers(seq) == \
+                multi_index.index_kmers(seq), \
+                'sequence ids should be consistent with KmerIndex'
+        kmers = kmer_index.kmers()
+        assert sorted(kmers) == sorted(multi_index.kmers(w)), \
+            'all kmers of each word length should be observed'
+        for kmer in kmers:
+            assert sorted(kmer_index.hits(kmer)) == \
+                sorted(multi_index.hits(kmer, w)), \
+                'hits of each word length should be found'
+        assert kmer_index.kmer_counts() == multi_index.kmer_counts(w), \
+            'kmer counts of each word length should be correct'
+    with pytest.raises(AssertionError):
+        multi_index.hits(0, 4)
+
+
+@pytest.mark.parametrize('num_shards', [1, 3], ids=['unsharded', 'sharded'])
+def test_hits_within(num_shards):
+    A = Alphabet('ACGT')
+    wordlen = 6
+    kmer_index = KmerIndex(path=':memory:', alphabet=A, wordlen=wordlen,
+                           num_shards=num_shards)
+    S = A.parse('AAAAAA' + 'CCCCCC' + 'AAACAA' + 'AAGGAA')
+    seqid = kmer_index.index_kmers(S)
+    kmer = kmer_as_int(A.parse('AAAAAA').contents, A)
+    assert kmer_index.hits_within(kmer, max_mismatches=0) == \
+        kmer_index.hits(kmer), \
+        'exact neighborhood queries should be the same as hits()'
+    for max_mismatches in [1, 2]:
+        expected = [(seqid, pos) for pos in range(len(S) - wordlen + 1)
+                    if sum(S[pos + i] != 0 for i in range(wordlen)) <=
+                    max_mismatches]
+        hits = kmer_index.hits_within(kmer, max_mismatches=max_mismatches)
+        assert sorted(hits) == expected, \
+            'hits of kmers within Hamming distance should be found'
+
+
 def test_kmer_cache():
     A = Alphabet('ACGT')
     S = rand_seq(A, 50)
@@ -104,3 +483,44 @@ def test_kmer_cache():
         'kmer cache must produce same results as as_kmer_seq()'
     assert len(cache.cached_seqs()) == 1, \
         'cache must be populated'
+
+
+def test_kmer_index_concurrent_connections():
+    A = Alphabet('ACGT')
+    wordlen = 5
+    S = rand_seq(A, 200)
+    with NamedTemporaryFile() as f:
+        kmer_index = KmerIndex(path=f.name, alphabet=A, wordlen=wordlen,
+                               mmap_size=2 ** 20, cache_size=-1024)
+        kmer_index.index_kmers(S)
+        kmers = kmer_index.kmers()
+        expected = {kmer: kmer_index.hits(kmer) for kmer in kmers}
+
+        with kmer_index.connection() as conn:
+            mode = list(conn.cursor().execute('PRAGMA journal_mode'))[0][0]
+            assert mode == 'wal', 'on-disk indices should use WAL journaling'
+
+        with pytest.raises(apsw.ReadOnlyError):
+            with kmer_index.connection(readonly=True) as conn:
+                conn.cursor().execute('DELETE FROM %s' %
+                                      kmer_index.kmers_table)
+
+        main_conn = kmer_index.connection(readonly=True)
+        results, reused = {}, {}
+
+        def _query(idx):
+            conn = kmer_index.connection(readonly=True)
+            reused[idx] = conn is kmer_index.connection(readonly=True) and \
+                conn is not main_conn
+            results[idx] = {kmer: kmer_index.hits(kmer) for kmer in kmers}
+
+        threads = [Thread(target=_query, args=(idx,)) for idx in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert all(reused.values()), \
+            'each thread should consistently get its own connection'
+        assert all(res == expected for res in results.values()), \
+            'concurrent readers should see the same hits'
@@ -1,10 +1,19 @@
 # -*- coding: utf-8 -*-
 import pytest
+import time
+import apsw
+import numpy as np
 
 from tempfile import NamedTemporaryFile
 from biseqt.stochastics import rand_seq
 from biseqt.sequence import Alphabet
-from biseqt.seeds import SeedIndex, SeedIndexMultiple
+from biseqt.kmers import as_kmer_arrays
+from biseqt.seeds import SeedIndex, SeedIndexMultiple, kmer_seeds, seed_volume
+from biseqt.seeds import RectangleCounter, RunCounter, SeedHitLists
+from biseqt.seeds import seed_runs, expand_seed_runs, split_seed_runs
+from biseqt.seeds import run_seed_counts
+from biseqt.seeds import create_seeds_table, check_seeds_table
+from biseqt.seeds import record_seeds_table
 
 
 def test_coordinate_change():
@@ -86,13 +95,84 @@ def test_index_integrity(in_memory, wordlen):
             _tests(f.name)
 
 
+def test_index_reuse():
+    A = Alphabet('ACGT')
+    S, T = rand_seq(A, 200), rand_seq(A, 200)
+    with NamedTemporaryFile() as f:
+        kw = {'alphabet': A, 'path': f.name}
+        seeds = list(SeedIndex(S, T, wordlen=4, **kw).seeds())
+        _index_seeds = SeedIndex._index_seeds
+
+        def _fail(self):
+            raise AssertionError('seeds should not be indexed again')
+
+        SeedIndex._index_seeds = _fail
+        try:
+            assert list(SeedIndex(S, T, wordlen=4, **kw).seeds()) == seeds, \
+                'seeds of the same parameters should be reused'
+        finally:
+            SeedIndex._index_seeds = _index_seeds
+
+        for params in [{'wordlen': 5}, {'wordlen': 4, 'mask': [{0}]}]:
+            seed_index = SeedIndex(S, T, **dict(kw, **params))
+            fresh = SeedIndex(S, T, **dict(params, alphabet=A))
+            assert list(seed_index.seeds()) == list(fresh.seeds()), \
+                'seeds of other parameters should be indexed again'
+
+        seed_index = SeedIndex(S, T, wordlen=4, **kw)
+        with seed_index.connection() as conn:
+            conn.cursor().execute('DELETE FROM seeds_meta')
+        assert list(SeedIndex(S, T, wordlen=4, **kw).seeds()) == seeds, \
+            'seeds tables without metadata should be indexed again'
+
+
+def test_index_seeds_transaction(monkeypatch):
+    A = Alphabet('ACGT')
+    S, T = rand_seq(A, 200), rand_seq(A, 200)
+    with NamedTemporaryFile() as f:
+        kw = {'alphabet': A, 'path': f.name, 'wordlen': 4}
+        _insert_seeds = SeedIndex._insert_seeds
+
+        def _fail(self, cursor, records):
+            _insert_seeds(self, cursor, records)
+            raise RuntimeError('interrupted')
+
+        monkeypatch.setattr(SeedIndex, '_insert_seeds', _fail)
+        with pytest.raises(RuntimeError):
+            SeedIndex(S, T, **kw)
+        monkeypatch.undo()
+        conn = apsw.Connection(f.name)
+        tables = [row[0] for row in conn.cursor().execute(
+            "SELECT name FROM sqlite_master WHERE name LIKE 'seeds_%';")]
+        assert not tables, \
+            'interrupted indexing should leave no partial seeds table'
+        seed_index = SeedIndex(S, T, **kw)
+        assert list(seed_index.seeds()) == \
+            list(SeedIndex(S, T, alphabet=A, wordlen=4).seeds()), \
+            'seeds should be indexed again after interrupted indexing'
+
+        # a table being built by another connection is invisible until done
+        builder, checker = apsw.Connection(f.name), apsw.Connection(f.name)
+        cursor = builder.cursor()
+        cursor.execute('BEGIN IMMEDIATE;')
+        create_seeds_table(cursor, 'seeds_building', ['d'])
+        cursor.execute('INSERT INTO seeds_building VALUES (1, 1);')
+        assert not check_seeds_table(checker.cursor(), 'seeds_building', 'x')
+        record_seeds_table(cursor, 'seeds_building', 'x')
+        cursor.execute('COMMIT;')
+        assert check_seeds_table(checker.cursor(), 'seeds_building', 'x'), \
+            'seeds tables being built should not be dropped'
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
 @pytest.mark.parametrize('in_memory', [True, False],
                          ids=['in memory', 'on disk'])
 @pytest.mark.parametrize('wordlen', [5, 15], ids=['k=5', 'k=15'])
-def test_index_seeds(in_memory, wordlen):
+def test_index_seeds(in_memory, wordlen, backend):
     def _tests(path):
         A = Alphabet('ACGT')
-        kw = {'alphabet': A, 'wordlen': wordlen, 'path': path}
+        kw = {'alphabet': A, 'wordlen': wordlen, 'path': path,
+              'backend': backend}
 
         S = A.parse('G' * wordlen)
         T = A.parse('TC' + str(S))
@@ -119,10 +199,12 @@ def test_index_seeds(in_memory, wordlen):
             _tests(f.name)
 
 
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
 @pytest.mark.parametrize('wordlen', [5, 15], ids=['k=5', 'k=15'])
-def test_seed_counts(wordlen):
+def test_seed_counts(wordlen, backend):
     A = Alphabet('ACGT')
-    kw = {'alphabet': A, 'wordlen': wordlen, 'path': ':memory:'}
+    kw = {'alphabet': A, 'wordlen': wordlen, 'path': ':memory:',
+          'backend': backend}
 
     S = rand_seq(A, 5 * wordlen)
     T = rand_seq(A, 5 * wordlen)
@@ -169,11 +251,403 @@ def test_seed_counts(wordlen):
         '%s and %s have no seeds' % (S, T)
 
 
+@pytest.mark.parametrize('self_comp', [True, False],
+                         ids=['self comparison', 'pairwise'])
+def test_kmer_seeds(self_comp):
+    A = Alphabet('ACGT')
+    wordlen = 3
+    S = rand_seq(A, 100) + A.parse('A' * 10)
+    T = S if self_comp else rand_seq(A, 80) + A.parse('A' * 5)
+    kmers_S = as_kmer_arrays(S, [wordlen], mask=[set([1])])[wordlen]
+    kmers_T = as_kmer_arrays(T, [wordlen])[wordlen]
+    if self_comp:
+        kmers_T = kmers_S
+    expected = sorted(
+        SeedIndex.to_diagonal_coordinates(i, j)
+        for i, kmer_S in enumerate(kmers_S)
+        for j, kmer_T in enumerate(kmers_T)
+        if kmer_S == kmer_T and kmer_S >= 0 and (not self_comp or i <= j)
+    )
+    ds, as_ = kmer_seeds(kmers_S, None if self_comp else kmers_T)
+    assert zip(ds.tolist(), as_.tolist()) == expected, \
+        'sort-merge join should find all seeds sorted by diagonal'
+
+
+@pytest.mark.parametrize('self_comp', [True, False],
+                         ids=['self comparison', 'pairwise'])
+def test_seed_backends(self_comp):
+    A = Alphabet('ACGT')
+    kw = {'alphabet': A, 'wordlen': 4, 'path': ':memory:'}
+    S = rand_seq(A, 300)
+    T = S if self_comp else rand_seq(A, 200)
+    sqlite_index = SeedIndex(S, T, backend='sqlite', **kw)
+    memory_index = SeedIndex(S, T, backend='memory', **kw)
+    assert list(sqlite_index.seeds()) == list(memory_index.seeds()), \
+        'seed backends should give the same seeds in the same order'
+    d_band, a_band = (-50.5, 20), (100, 300)
+    for backend_index in [sqlite_index, memory_index]:
+        ds, as_ = backend_index.seed_coordinates(d_band=d_band, a_band=a_band)
+        assert backend_index.seed_count(d_band=d_band, a_band=a_band) == \
+            len(ds) == memory_index.seed_count(d_band=d_band, a_band=a_band), \
+            'seed backends should agree on seed counts'
+        assert np.all(np.diff(ds) >= 0), \
+            'seed coordinates should be sorted by diagonal'
+
+    auto_index = SeedIndex(S, T, backend='auto', **kw)
+    assert auto_index.backend == 'memory', \
+        'few seeds should be stored in memory by the auto backend'
+    kmers_S, kmers_T = [as_kmer_arrays(seq, [4])[4] for seq in [S, T]]
+    volume = seed_volume(kmers_S, None if self_comp else kmers_T)
+    assert volume['memory_bytes'] == 8 * volume['seeds'] + \
+        memory_index._counter.nbytes, \
+        'memory estimate should include the rectangle counter'
+    allowed_memory = volume['memory_bytes'] / 2. ** 30
+    auto_index = SeedIndex(S, T, backend='auto',
+                           allowed_memory=allowed_memory, **kw)
+    assert auto_index.backend == 'memory', \
+        'seeds and their counter within budget should be stored in memory'
+    auto_index = SeedIndex(S, T, backend='auto',
+                           allowed_memory=.99 * allowed_memory, **kw)
+    assert auto_index.backend == 'sqlite', \
+        'many seeds should be stored in SQLite by the auto backend'
+
+
+@pytest.mark.parametrize('self_comp', [True, False],
+                         ids=['self', 'non-self'])
+def test_seed_volume(self_comp):
+    A = Alphabet('ACGT')
+    wordlen = 3
+    kw = {'alphabet': A, 'wordlen': wordlen, 'path': ':memory:'}
+    S = rand_seq(A, 200)
+    T = S if self_comp else rand_seq(A, 200)
+    kmers_S, kmers_T = [as_kmer_arrays(seq, [wordlen])[wordlen]
+                        for seq in [S, T]]
+    kmers_T = None if self_comp else kmers_T
+    num_seeds = len(kmer_seeds(kmers_S, kmers_T)[0])
+    volume = seed_volume(kmers_S, kmers_T)
+    assert volume['seeds'] == num_seeds, \
+        'number of seeds should be correctly estimated from kmer spectra'
+    assert seed_volume(kmers_S, kmers_T, rtree=True)['sqlite_bytes'] > \
+        volume['sqlite_bytes'] > 0
+    assert volume['memory_bytes'] > 8 * num_seeds, \
+        'memory estimate should include more than the seed arrays'
+
+    with pytest.raises(MemoryError):
+        SeedIndex(S, T, max_seeds=num_seeds - 1, **kw)
+    assert SeedIndex(S, T, max_seeds=num_seeds, **kw).seed_count() == \
+        num_seeds, 'seeds within budget should be indexed'
+    max_seeds = num_seeds // 2
+    index = SeedIndex(S, T, max_seeds=max_seeds, on_excess='mask', **kw)
+    assert 0 < index.seed_count() <= max_seeds, \
+        'repetitive kmers should be masked to stay within budget'
+    assert set(index.seeds()) < set(SeedIndex(S, T, **kw).seeds()), \
+        'masking kmers should only drop seeds'
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+@pytest.mark.parametrize('self_comp', [True, False],
+                         ids=['self', 'non-self'])
+def test_seed_arrays(backend, self_comp):
+    A = Alphabet('ACGT')
+    kw = {'alphabet': A, 'wordlen': 3, 'path': ':memory:', 'backend': backend}
+    S = rand_seq(A, 100)
+    T = S if self_comp else rand_seq(A, 100)
+    seed_index = SeedIndex(S, T, **kw)
+    for exclude_trivial in [True, False]:
+        for d_band in [None, (-20, 10)]:
+            chunks = list(seed_index.seed_arrays(
+                d_band=d_band, exclude_trivial=exclude_trivial, chunk_size=7))
+            assert all(len(ds) <= 14 for ds, _ in chunks), \
+                'blocks should not exceed chunk size'
+            seeds = [SeedIndex.to_ij_coordinates(d, a) for ds, as_ in chunks
+                     for d, a in zip(ds.tolist(), as_.tolist())]
+            assert seeds == list(seed_index.seeds(
+                d_band=d_band, exclude_trivial=exclude_trivial)), \
+                'seed arrays should agree with seeds()'
+
+
+def test_seed_runs():
+    A = Alphabet('ACGT')
+    S = rand_seq(A, 300)
+    T = A.parse(str(S[:150]) + 'A' + str(S[151:]))
+    kmers = as_kmer_arrays(S, [8])[8], as_kmer_arrays(T, [8])[8]
+    ds, as_ = kmer_seeds(*kmers)
+    runs = seed_runs(ds, as_)
+    assert len(runs[0]) < len(ds) / 10, \
+        'long exact matches should be compressed'
+    for d_, a_ in zip((ds, as_), expand_seed_runs(*runs)):
+        assert np.all(d_ == a_), 'runs should expand to the original seeds'
+    pieces = split_seed_runs(*runs, max_len=3)
+    assert pieces[2].max() <= 3, 'pieces should not exceed maximum length'
+    for d_, a_ in zip((ds, as_), expand_seed_runs(*pieces)):
+        assert np.all(d_ == a_), 'pieces should expand to the original seeds'
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+@pytest.mark.parametrize('self_comp', [True, False],
+                         ids=['self', 'non-self'])
+def test_seed_index_runs(backend, self_comp):
+    A = Alphabet('ACGT')
+    kw = {'alphabet': A, 'wordlen': 3, 'path': ':memory:', 'backend': backend}
+    S = rand_seq(A, 200)
+    T = S if self_comp else A.parse(str(S[:120]) + str(rand_seq(A, 80)))
+    seed_index = SeedIndex(S, T, **kw)
+    runs_index = SeedIndex(S, T, runs=True, **kw)
+    for exclude_trivial in [True, False]:
+        for d_band in [None, (-20, 10)]:
+            assert list(runs_index.seeds(
+                d_band=d_band, exclude_trivial=exclude_trivial)) == \
+                list(seed_index.seeds(d_band=d_band,
+                                      exclude_trivial=exclude_trivial)), \
+                'runs of seeds should expand to the same seeds'
+    for x, y in zip(runs_index.seed_coordinates((-30, 30), (50, 250)),
+                    seed_index.seed_coordinates((-30, 30), (50, 250))):
+        assert np.all(x == y), 'seed coordinates should be the same'
+
+    d_bands = np.sort(np.random.randint(-210, 210, size=(50, 2)), axis=1)
+    a_bands = np.sort(np.random.randint(-10, 410, size=(50, 2)), axis=1)
+    assert runs_index.seed_count() == seed_index.seed_count(), \
+        'runs of seeds should count as the seeds they contain'
+    for d_band, a_band in zip(d_bands[:10], a_bands[:10]):
+        d_band, a_band = tuple(d_band), tuple(a_band)
+        assert runs_index.seed_count(d_band=d_band, a_band=a_band) == \
+            seed_index.seed_count(d_band=d_band, a_band=a_band), \
+            'runs of seeds should count as the seeds they contain'
+    if backend == 'memory':
+        assert isinstance(runs_index._counter, RunCounter), \
+            'runs of seeds in memory should be counted by a run counter'
+    for bands in [{'d_bands': d_bands}, {'a_bands': a_bands},
+                  {'d_bands': d_bands, 'a_bands': a_bands}]:
+        assert np.all(runs_index.seed_count_many(**bands) ==
+                      seed_index.seed_count_many(**bands)), \
+            'runs of seeds should count as the seeds they contain'
+    if backend == 'sqlite':
+        count, cond = runs_index._count_sql('100', '200')
+        plan = list(runs_index._query(
+            'EXPLAIN QUERY PLAN SELECT %s FROM %s WHERE d = 0 AND %s' %
+            (count, runs_index.seeds_table, cond)))
+        assert 'a_end>?' in plan[0][-1], \
+            'runs reaching antidiagonal bands should be found in the index'
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+@pytest.mark.parametrize('self_comp', [True, False],
+                         ids=['self', 'non-self'])
+@pytest.mark.parametrize('runs', [True, False], ids=['runs', 'no-runs'])
+def test_diagonal_counts(backend, self_comp, runs):
+    A = Alphabet('ACGT')
+    S = rand_seq(A, 200)
+    T = S if self_comp else rand_seq(A, 150)
+    with NamedTemporaryFile() as f:
+        kw = {'alphabet': A, 'wordlen': 3, 'path': f.name, 'runs': runs,
+              'backend': backend}
+        seed_index = SeedIndex(S, T, **kw)
+        # seeds tables that are reused count diagonals upon first use
+        reused_index = SeedIndex(S, T, **kw) if backend == 'sqlite' else \
+            seed_index
+        for exclude_trivial in [True, False]:
+            seeds = np.array(list(seed_index.seeds(
+                exclude_trivial=exclude_trivial))).reshape(-1, 2)
+            ds = seeds[:, 0] - seeds[:, 1]
+            expected = np.bincount(ds + len(T), minlength=len(S) + len(T) + 1)
+            for index in [seed_index, reused_index]:
+                counts = index.diagonal_counts(exclude_trivial=exclude_trivial)
+                assert np.all(counts == expected), \
+                    'diagonal counts should match seeds'
+
+        stored = seed_index.seed_arrays(exclude_trivial=False)
+        ds = np.concatenate([chunk[0] for chunk in stored] + [[]])
+        # seed counts are of stored seeds, i.e not mirrored
+        ds = ds[ds <= 0] if self_comp else ds
+        d_bands = np.sort(np.random.randint(-210, 210, size=(50, 2)), axis=1)
+        d_bands = np.vstack([d_bands, [[-1e3, 1e3], [10.7, 20.2]]])
+        expected = [np.count_nonzero((ds >= int(d_min)) & (ds <= int(d_max)))
+                    for d_min, d_max in d_bands]
+        for index in [seed_index, reused_index]:
+            assert index.seed_count() == len(ds)
+            assert np.all(index.seed_count_many(d_bands=d_bands) == expected),\
+                'diagonal band counts should match seeds'
+            assert [index.seed_count(d_band=tuple(band))
+                    for band in d_bands] == expected, \
+                'diagonal band counts should match seeds'
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+@pytest.mark.parametrize('self_comp', [True, False],
+                         ids=['self', 'non-self'])
+def test_seed_index_both_strands(backend, self_comp):
+    A = Alphabet('ACGT')
+    S = rand_seq(A, 200)
+    T = S if self_comp else rand_seq(A, 150)
+    T_rc = T.reverse().transform(mappings=['AT', 'CG'])
+    kw = {'alphabet': A, 'wordlen': 3, 'path': ':memory:', 'backend': backend}
+    seed_index = SeedIndex(S, T, both_strands=True, **kw)
+    assert list(seed_index.seeds()) == list(SeedIndex(S, T, **kw).seeds()), \
+        'forward strand seeds should not be affected by reverse strand'
+    assert seed_index.reverse.T == T_rc and seed_index.reverse.S == S
+    assert list(seed_index.reverse.seeds()) == \
+        list(SeedIndex(S, T_rc, **kw).seeds()), \
+        'reverse strand seeds should be those of the reverse complement'
+    assert SeedIndex(S, T, **kw).reverse is None
+
+
+@pytest.mark.parametrize('num_seeds', [0, 7, 1000], ids=lambda n: 'n=%d' % n)
+def test_rectangle_counter(num_seeds):
+    seeds = np.random.randint(0, 100, size=(num_seeds, 2))
+    counter = RectangleCounter.from_seeds(seeds, leaf_size=4)
+    ds, as_ = seeds[:, 0] - seeds[:, 1], seeds[:, 0] + seeds[:, 1]
+    assert counter.count() == num_seeds, 'all seeds should be counted'
+    for _ in range(200):
+        d_band = tuple(sorted(np.random.randint(-110, 110, size=2)))
+        a_band = tuple(sorted(np.random.randint(-10, 210, size=2)))
+        expected = np.count_nonzero((ds >= d_band[0]) & (ds <= d_band[1]) &
+                                    (as_ >= a_band[0]) & (as_ <= a_band[1]))
+        assert counter.count(d_band=d_band, a_band=a_band) == expected, \
+            'number of seeds in rectangles should be correctly counted'
+
+    d_bands = np.sort(np.random.randint(-110, 110, size=(200, 2)), axis=1)
+    a_bands = np.sort(np.random.randint(-10, 210, size=(200, 2)), axis=1)
+    expected = [counter.count(d_band=db, a_band=ab)
+                for db, ab in zip(d_bands, a_bands)]
+    assert list(counter.count_many(d_bands=d_bands, a_bands=a_bands)) == \
+        expected, 'bulk and individual counts should agree'
+
+
+def test_run_counter():
+    num_runs = 1000
+    ds = np.sort(np.random.randint(-100, 100, size=num_runs))
+    # the first seed of a run has the same parity as its diagonal
+    as_ = np.random.randint(0, 200, size=num_runs)
+    as_ += (as_ - ds) % 2
+    ns = np.random.randint(1, 20, size=num_runs)
+    counter = RunCounter(ds, as_, ns, block_size=4)
+    d_bands = np.sort(np.random.randint(-110, 110, size=(200, 2)), axis=1)
+    a_bands = np.sort(np.random.randint(-10, 250, size=(200, 2)), axis=1)
+    expected = []
+    for (d_min, d_max), (a_min, a_max) in zip(d_bands, a_bands):
+        keep = (ds >= d_min) & (ds <= d_max)
+        expected.append(
+            run_seed_counts(as_[keep], ns[keep], a_min, a_max).sum())
+    assert list(counter.count_many(d_bands=d_bands, a_bands=a_bands)) == \
+        expected, 'seeds of runs in rectangles should be correctly counted'
+    expected = [ns[(ds >= d_min) & (ds <= d_max)].sum()
+                for d_min, d_max in d_bands]
+    assert list(counter.count_many(d_bands=d_bands)) == expected, \
+        'seeds of runs in diagonal bands should be correctly counted'
+    assert counter.nbytes == RunCounter.estimate_nbytes(num_runs), \
+        'memory of run counters should be correctly estimated'
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+def test_seed_count_many(backend):
+    A = Alphabet('ACGT')
+    kw = {'alphabet': A, 'wordlen': 3, 'path': ':memory:', 'backend': backend}
+    S, T = rand_seq(A, 200), rand_seq(A, 200)
+    seed_index = SeedIndex(S, T, **kw)
+    # more rectangles than fit in a single SQL query
+    d_bands = np.sort(np.random.randint(-200, 200, size=(500, 2)), axis=1)
+    a_bands = np.sort(np.random.randint(0, 400, size=(500, 2)), axis=1)
+    d_bands, a_bands = d_bands.tolist(), a_bands.tolist()
+    expected = [seed_index.seed_count(d_band=tuple(d_band),
+                                      a_band=tuple(a_band))
+                for d_band, a_band in zip(d_bands, a_bands)]
+    counts = seed_index.seed_count_many(d_bands=d_bands, a_bands=a_bands)
+    assert list(counts) == expected, 'bulk and individual counts should agree'
+
+    expected = [seed_index.seed_count(d_band=tuple(d_band))
+                for d_band in d_bands]
+    assert list(seed_index.seed_count_many(d_bands=d_bands)) == expected, \
+        'bulk and individual counts should agree on diagonal bands'
+
+
+def test_seeds_rtree():
+    A = Alphabet('ACGT')
+    kw = {'alphabet': A, 'wordlen': 3, 'path': ':memory:'}
+    S, T = rand_seq(A, 100), rand_seq(A, 100)
+    plain = SeedIndex(S, T, **kw)
+    rtree = SeedIndex(S, T, rtree=True, **kw)
+    assert list(plain.seeds()) == list(rtree.seeds()), \
+        'R*Tree and plain seed tables should hold the same seeds'
+    d_bands = np.sort(np.random.randint(-100, 100, size=(50, 2)), axis=1)
+    a_bands = np.sort(np.random.randint(0, 200, size=(50, 2)), axis=1)
+    for d_band, a_band in zip(d_bands.tolist(), a_bands.tolist()):
+        d_band, a_band = tuple(d_band), tuple(a_band)
+        assert list(plain.seeds(d_band=d_band)) == \
+            list(rtree.seeds(d_band=d_band)), \
+            'R*Tree and plain seed tables should agree on diagonal bands'
+        assert plain.seed_count(d_band=d_band, a_band=a_band) == \
+            rtree.seed_count(d_band=d_band, a_band=a_band), \
+            'R*Tree and plain seed tables should agree on rectangles'
+    assert list(plain.seed_count_many(d_bands, a_bands)) == \
+        list(rtree.seed_count_many(d_bands, a_bands)), \
+        'R*Tree and plain seed tables should agree on bulk counts'
+
+    seqs = [S + rand_seq(A, 20) for _ in range(4)]
+    plain = SeedIndexMultiple(*seqs, **kw)
+    rtree = SeedIndexMultiple(*seqs, rtree=True, **kw)
+    assert sorted(plain.seeds()) == sorted(rtree.seeds()), \
+        'R*Tree and plain seed tables should hold the same seeds'
+    ds_band, a_band = [(-2, 2)] * 3, (0, 200)
+    assert plain.seed_count(ds_band=ds_band, a_band=a_band) == \
+        rtree.seed_count(ds_band=ds_band, a_band=a_band), \
+        'R*Tree and plain seed tables should agree on hyper-rectangles'
+
+
+def test_seeds_with_quality():
+    A = Alphabet('ACGT')
+    wordlen = 5
+    kw = {'alphabet': A, 'wordlen': wordlen, 'path': ':memory:'}
+    S = rand_seq(A, 100)
+    T = S + 'A'
+    quals_S = np.array([40] * len(S))
+    quals_T = np.array([40] * len(T))
+    quals_T[50:60] = 2  # a low quality stretch in T
+
+    index = SeedIndex(S, T, quals=(quals_S, quals_T), min_qual=20, **kw)
+    seeds = list(index.seeds())
+    assert seeds, 'high quality seeds should be found'
+    assert all(not 50 - wordlen < j < 60 for _, j in seeds), \
+        'seeds covering low quality bases should be skipped'
+    plain_index = SeedIndex(S, T, **kw)
+    assert plain_index.seed_count() > index.seed_count(), \
+        'quality filtering should reduce the number of seeds'
+
+
+@pytest.mark.parametrize('wordlen', [5, 10], ids=['k=5', 'k=10'])
+def test_seeds_with_mismatches(wordlen):
+    A = Alphabet('ACGT')
+    kw = {'alphabet': A, 'wordlen': wordlen, 'path': ':memory:'}
+
+    S = rand_seq(A, 5 * wordlen)
+    # a single substitution in the middle of T
+    mid = len(S) / 2
+    T = S[:mid] + A.parse(A[(S[mid] + 1) % len(A)]) + S[mid + 1:]
+    n_kmers = len(S) - wordlen + 1
+    exact_index = SeedIndex(S, T, **kw)
+    index = SeedIndex(S, T, max_mismatches=1, **kw)
+    n_exact = exact_index.seed_count(d_band=(0, 0))
+    assert n_exact == n_kmers - wordlen, \
+        'substitution should break exactly matching kmers'
+    assert index.seed_count(d_band=(0, 0)) == n_kmers, \
+        'seeds with one mismatch should cover the substitution'
+    assert set(exact_index.seeds()) <= set(index.seeds()), \
+        'exactly matching seeds should also be found with mismatches allowed'
+
+    index = SeedIndex(S, S, max_mismatches=1, **kw)
+    seeds = list(index.seeds())
+    assert len(seeds) == len(set(seeds)), \
+        'self comparison with mismatches should not duplicate seeds'
+    assert set((i, i) for i in range(n_kmers)) <= set(seeds), \
+        'self comparison with mismatches should find trivial seeds'
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
 @pytest.mark.parametrize('n_seqs', [5, 15], ids=['n=5', 'n=15'])
 @pytest.mark.parametrize('wordlen', [5, 15], ids=['k=5', 'k=15'])
-def test_seed_counts_multiple(n_seqs, wordlen):
+def test_seed_counts_multiple(n_seqs, wordlen, backend):
     A = Alphabet('ACGT')
-    kw = {'alphabet': A, 'wordlen': wordlen, 'path': ':memory:'}
+    kw = {'alphabet': A, 'wordlen': wordlen, 'path': ':memory:',
+          'backend': backend}
 
     S = rand_seq(A, 5 * wordlen)
     seqs = [S + rand_seq(A, 5 * wordlen) for _ in range(n_seqs)]
@@ -183,3 +657,63 @@ def test_seed_counts_multiple(n_seqs, wordlen):
     n_seeds = seed_index.seed_count(a_band=a_band, ds_band=ds_band)
     assert n_seeds == len(S) - wordlen + 1, \
         'number of seeds for multiple sequences should be correct'
+    counts = seed_index.seed_count_many([ds_band, ds_band], [a_band, (0, 0)])
+    assert list(counts) == [n_seeds, seed_index.seed_count(
+        a_band=(0, 0), ds_band=ds_band)], \
+        'bulk and individual counts should agree for multiple sequences'
+
+
+def test_seed_hit_lists():
+    A = Alphabet('ACGT')
+    wordlen = 2
+    seqs = [rand_seq(A, 30) for _ in range(3)]
+    kmer_arrays = [as_kmer_arrays(seq, [wordlen])[wordlen] for seq in seqs]
+    seed_hits = SeedHitLists.from_kmer_arrays(kmer_arrays)
+    kw = {'alphabet': A, 'wordlen': wordlen, 'path': ':memory:'}
+    expected = sorted(SeedIndexMultiple(*seqs, **kw).seeds())
+    assert sorted(seed_hits.seeds()) == expected, \
+        'hit lists should give the same seeds as the seeds table'
+    assert len(seed_hits) == len(expected), \
+        'hit lists should count all seeds'
+
+    seeds = np.array([ds + [a] for ds, a in expected])
+    for _ in range(100):
+        bands = np.sort(np.random.randint(-30, 30, size=(3, 2)), axis=1)
+        ds_band = [tuple(band) for band in bands[:2]]
+        if np.random.rand() < .3:
+            ds_band[1] = None
+        a_band = tuple(np.sort(np.random.randint(0, 90, size=2)))
+        inside = (seeds[:, 2] >= a_band[0]) & (seeds[:, 2] <= a_band[1])
+        for k, band in enumerate(ds_band):
+            if band is not None:
+                inside &= (seeds[:, k] >= band[0]) & (seeds[:, k] <= band[1])
+        assert seed_hits.count(ds_band=ds_band, a_band=a_band) == \
+            np.count_nonzero(inside), \
+            'seeds in hyper-rectangles should be correctly counted'
+
+
+def test_seed_hit_lists_straddling_band():
+    # a single kmer with many hits in every sequence gives anchors all of
+    # whose seeds straddle the antidiagonal band
+    n_seqs, n_hits = 4, 15
+    hits = [np.sort(np.random.choice(10000, n_hits, replace=False))
+            for _ in range(n_seqs)]
+    seed_hits = SeedHitLists.from_hit_lists([hits], n_seqs)
+    sums = hits[0]
+    for pos in hits[1:]:
+        sums = (sums[:, None] + pos[None, :]).ravel()
+    a_band = (15000, 25000)
+    assert seed_hits.count(a_band=a_band) == \
+        np.count_nonzero((sums >= a_band[0]) & (sums <= a_band[1])), \
+        'seeds straddling the antidiagonal band should be correctly counted'
+
+    n_seqs, n_hits = 5, 50
+    hits = [np.sort(np.random.choice(10000, n_hits, replace=False))
+            for _ in range(n_seqs)]
+    seed_hits = SeedHitLists.from_hit_lists([hits], n_seqs)
+    start = time.time()
+    count = seed_hits.count(a_band=(20000, 30000))
+    assert time.time() - start < .5, \
+        'seeds straddling the antidiagonal band should not be enumerated'
+    assert 0 < count < n_hits ** n_seqs, \
+        'seeds straddling the antidiagonal band should be partially counted'
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import pytest
-from biseqt.sequence import Alphabet, Sequence
+from StringIO import StringIO
+from biseqt.sequence import Alphabet, Sequence, read_fastq
 
 
 def test_alphabet():
@@ -78,3 +79,23 @@ def test_sequence_parsing():
     S = A.parse('001011')
     assert len(S) == 3 and S == Sequence(A, [0, 2, 3]), \
         'alphabets with > 1 long letters should be able to parse strings'
+
+
+def test_read_fastq():
+    A = Alphabet('ACGT')
+    f = StringIO('@read_1 some description\nACGT\n+\nII#5\n\n'
+                 '@read_2\nGG\n+read_2\n!!\n')
+    records = list(read_fastq(f, A))
+    assert [name for _, name, _ in records] == \
+        ['read_1 some description', 'read_2'], \
+        'names of all records should be read'
+    assert [seq for seq, _, _ in records] == \
+        [A.parse('ACGT'), A.parse('GG')], \
+        'sequences of all records should be read'
+    assert list(records[0][2]) == [40, 40, 2, 20] and \
+        list(records[1][2]) == [0, 0], \
+        'quality strings should be translated to Phred scores'
+
+    f.seek(0)
+    assert len(list(read_fastq(f, A, num_seqs=1))) == 1, \
+        'number of records read should be limited by num_seqs'
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import pytest
+import warnings
+import numpy as np
+
+from biseqt.stochastics import rand_seq
+from biseqt.sequence import Alphabet
+from biseqt.kmers import as_kmer_seq
+from biseqt.sketches import hash_kmers, MinHashSketch, SketchIndex
+
+
+def test_hash_kmers():
+    kmers = range(1000)
+    hashes = hash_kmers(kmers)
+    assert hashes.dtype == np.uint64 and len(hashes) == len(kmers), \
+        'each kmer should get a 64-bit hash'
+    assert len(set(hashes.tolist())) == len(kmers), \
+        'hash function should not collide on small inputs'
+    assert np.all(hashes == hash_kmers(kmers)), \
+        'hash function should be deterministic'
+    assert not np.any(hashes == hash_kmers(kmers, seed=1)), \
+        'hash function should depend on the seed'
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        hash_kmers(kmers, seed=5)
+
+
+@pytest.mark.parametrize('sketch_size', [100, 500],
+                         ids=['s=100', 's=500'])
+def test_minhash_estimates(sketch_size):
+    A = Alphabet('ACGT')
+    wordlen = 10
+    S = rand_seq(A, 3000)
+    T = S[1000:]
+
+    def _kmers(seq):
+        return set(as_kmer_seq(seq, wordlen))
+
+    sk_S = MinHashSketch(_kmers(S), sketch_size)
+    sk_T = MinHashSketch(_kmers(T), sketch_size)
+    assert len(sk_S.hashes) == sketch_size and \
+        sk_S.cardinality == len(_kmers(S)), \
+        'sketches should keep the right number of hashes'
+    assert sk_S.jaccard(sk_S) == 1, \
+        'Jaccard similarity of a set with itself should be 1'
+
+    true_J = 1. * len(_kmers(S) & _kmers(T)) / len(_kmers(S) | _kmers(T))
+    assert abs(sk_S.jaccard(sk_T) - true_J) < .15, \
+        'Jaccard estimate should be close to the truth'
+    assert sk_T.containment(sk_S) > .8, \
+        'a substring should be almost contained in its superstring'
+    assert sk_S.containment(sk_T) < sk_T.containment(sk_S), \
+        'containment should be asymmetric'
+
+    sk_U = MinHashSketch(_kmers(rand_seq(A, 3000)), sketch_size)
+    assert sk_S.jaccard(sk_U) < .05, \
+        'unrelated sequences should have small Jaccard estimates'
+
+
+def test_sketch_index_candidate_pairs():
+    A = Alphabet('ACGT')
+    S = rand_seq(A, 5000)
+    # overlapping windows of S followed by unrelated sequences
+    reads = [S[i: i + 1000] for i in range(0, 4001, 500)]
+    reads += [rand_seq(A, 1000) for _ in range(5)]
+    sketch_index = SketchIndex(alphabet=A, wordlen=12, sketch_size=200)
+    ids = [sketch_index.add(read) for read in reads]
+    assert ids == range(len(reads)), 'sequence ids should be sequential'
+    assert sketch_index.add(reads[0]) == 0, \
+        'same sequence should not be indexed twice'
+
+    pairs = list(sketch_index.candidate_pairs(.2))
+    found = set((id0, id1) for id0, id1, _ in pairs)
+    expected = set((i, i + 1) for i in range(8))
+    assert found == expected, \
+        'exactly the overlapping pairs of reads should be candidates'
+    assert all(id0 < id1 and score >= .2 for id0, id1, score in pairs), \
+        'candidate pairs should be ordered and above threshold'
+
+    pairs = list(sketch_index.candidate_pairs(.4, measure='containment'))
+    assert set((id0, id1) for id0, id1, _ in pairs) == expected, \
+        'containment should find the overlapping pairs of reads'
+    with pytest.raises(ValueError):
+        sketch_index.similarity(0, 1, measure='foo')